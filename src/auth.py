@@ -1,13 +1,8 @@
 import click
 
-from rich.console import Console
-
 from rflow import rf
 from rflow._exceptions import AuthenticationError, ConflictError
-from utils import readable_time
-
-console = Console()
-print = console.print
+from utils import print, readable_time
 
 
 @click.group()
@@ -52,7 +47,7 @@ def me():
         return
     print(f"Logged in as: {me.username}")
     print(f"User ID: {me.id}")
-    console.print(f"Created at: {readable_time(me.created_at)}")
+    print(f"Created at: {readable_time(me.created_at)}")
 
 
 def confirm_action(prompt: str = "Do you want to continue?"):
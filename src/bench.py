@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import statistics
+import subprocess
+import click
+
+from typing import Any, Callable, Optional
+
+from utils import get_console
+
+
+def print(*objects: Any, **kwargs: Any):
+    get_console(stderr=True).print(*objects, **kwargs)
+
+
+def synthetic_payload(size: int, seed: int = 0) -> dict[str, Any]:
+    """Builds a webhook-like body whose JSON encoding is roughly `size` bytes."""
+    rng = random.Random(seed)
+    items: list[dict[str, Any]] = []
+    body: dict[str, Any] = {'event': 'synthetic', 'items': items}
+    used = 40
+    while used < size:
+        item = {
+            'id': rng.randrange(1 << 30),
+            'name': ''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=12)),
+            'price': round(rng.random() * 100, 2),
+            'tags': [rng.choice(['a', 'b', 'c']) for _ in range(3)],
+            'active': rng.random() > 0.5
+        }
+        items.append(item)
+        used += len(json.dumps(item)) + 2
+    return body
+
+
+def measure(fn: Callable[[], Any], repeat: int, warmup: int = 1,
+            setup: Optional[Callable[[], Any]] = None) -> dict[str, Any]:
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+
+    times: list[float] = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    return {
+        'runs': repeat,
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.fmean(times),
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0
+    }
+
+
+def _sandbox_benchmarks(repeat: int) -> dict[str, Callable[[], dict[str, Any]]]:
+    """Returns the benchmarks by name. Payloads and the shared sandbox are only built by the ones that run."""
+    from luasb import LuaSandbox
+    from luasb.convert import lua_to_python
+
+    sizes = {'1kb': 1024, '1mb': 1024 ** 2, '10mb': 10 * 1024 ** 2}
+    shared: list[LuaSandbox] = []
+
+    def sandbox() -> LuaSandbox:
+        if not shared:
+            shared.append(LuaSandbox(max_memory=512 * 1024 * 1024))
+        return shared[0]
+
+    def inject(name: str) -> Callable[[], dict[str, Any]]:
+        def run():
+            sb = sandbox()
+            values = {'body': synthetic_payload(sizes[name]), 'headers': {}, 'params': {}, 'env': {}}
+            return measure(lambda: sb.inject_values(values),
+                           max(3, repeat // 10 if name != '1kb' else repeat),
+                           setup=sb.reset)
+        return run
+
+    result_code = 'for i = 1, 10000 do Result[i] = { id = i, name = "item" .. i, tags = { "a", "b" } } end'
+
+    def convert():
+        sb = sandbox()
+        sb.reset()
+        sb.execute(result_code)
+        table = sb.lua_globals.Result
+        return measure(lambda: lua_to_python(table, sb.result_limits), repeat)
+
+    def execute():
+        sb = sandbox()
+        return measure(lambda: sb.execute('local x = 0 for i = 1, 1000 do x = x + i end Result.x = x'),
+                       repeat, setup=sb.reset)
+
+    def prints():
+        sb = sandbox()
+        code = 'for i = 1, 10000 do print("line", i, "of output") end'
+        return measure(lambda: sb.execute(code), max(3, repeat // 10), setup=sb.reset)
+
+    benchmarks: dict[str, Callable[[], dict[str, Any]]] = {
+        'sandbox.construct': lambda: measure(lambda: LuaSandbox(), repeat),
+        'sandbox.execute': execute,
+        'sandbox.result_to_python': convert,
+        'sandbox.print_10k_lines': prints,
+    }
+    for name in sizes:
+        benchmarks[f'sandbox.inject_values.{name}'] = inject(name)
+
+    return benchmarks
+
+
+def _client_benchmarks(repeat: int) -> dict[str, Callable[[], dict[str, Any]]]:
+    from rflow import RewriteFlow
+    from stubserver import StubServer, FakeAPI
+
+    def request(path: str) -> Callable[[], dict[str, Any]]:
+        def run():
+            with StubServer() as server:
+                FakeAPI(server, flow_count=200)
+                rf = RewriteFlow(server.url)
+                return measure(lambda: rf._request('get', path), repeat, warmup=3)
+        return run
+
+    return {
+        'client.request.me': request('/auth/me'),
+        'client.request.list_200_flows': request('/flows/list'),
+    }
+
+
+def environment() -> dict[str, Any]:
+    from importlib.metadata import version, PackageNotFoundError
+    try:
+        rflow_version = version('rewriteflow')
+    except PackageNotFoundError:
+        rflow_version = 'unknown'
+
+    info: dict[str, Any] = {
+        'rflow': rflow_version,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+    try:
+        import lupa  # type: ignore
+        info['lupa'] = lupa.__version__
+        info['lua'] = lupa.LuaRuntime().eval('_VERSION')
+    except ImportError:
+        pass
+    return info
+
+
+@click.group()
+def bench(): pass
+
+
+@bench.command()
+@click.option('-k', '--filter', 'pattern', default='', help="Only run benchmarks whose name contains this")
+@click.option('-n', '--repeat', type=int, default=50, show_default=True)
+@click.option('-o', '--output', type=click.Path(dir_okay=False), help="Write JSON results here instead of stdout")
+@click.option('--compare', type=click.Path(exists=True, dir_okay=False), help="Earlier JSON results to compare against")
+def run(pattern: str, repeat: int, output: str | None, compare: str | None):
+    """Runs the sandbox and client benchmarks and reports timings as JSON."""
+    import luasb
+    if not luasb.modules.modules_dir:
+        luasb.modules.modules_dir = 'lua_modules' if os.path.isdir('lua_modules') else '.'
+
+    benchmarks = {**_sandbox_benchmarks(repeat), **_client_benchmarks(repeat)}
+    selected = {name: benchmark for name, benchmark in benchmarks.items() if pattern in name}
+    results: dict[str, Any] = {}
+    for name, benchmark in selected.items():
+        print(f"Running {name}...")
+        results[name] = benchmark()
+
+    report = {'environment': environment(), 'results': results}
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text + '\n')
+
+    if compare:
+        with open(compare, 'r') as f:
+            baseline = json.load(f)['results']
+        print_comparison(baseline, results)
+
+
+def print_comparison(baseline: dict[str, Any], results: dict[str, Any]):
+    from rich.table import Table
+
+    table = Table(title="Median time vs. baseline")
+    table.add_column('Benchmark')
+    table.add_column('Baseline', justify='right')
+    table.add_column('Current', justify='right')
+    table.add_column('Change', justify='right')
+
+    for name, current in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['median'], current['median']
+        change = (after - before) / before * 100 if before else 0.0
+        colour = 'red' if change > 5 else 'green' if change < -5 else 'white'
+        table.add_row(name, f"{before * 1000:.3f} ms", f"{after * 1000:.3f} ms",
+                      f"[{colour}]{change:+.1f}%[/{colour}]")
+
+    print(table)
+
+
+# Modules that no command should pay for before it actually needs them.
+heavy_modules = ['httpx', 'pydantic', 'rich', 'lupa', 'toml']
+
+startup_commands = [
+    ['--help'],
+    ['flows', '--help'],
+    ['flows', 'url', '-i', 'example'],
+]
+
+_startup_probe = """
+import sys, runpy
+sys.argv = ['rflow', *sys.argv[1:]]
+try:
+    runpy.run_module('main', run_name='__main__')
+except SystemExit:
+    pass
+heavy = [m for m in {heavy} if m in sys.modules]
+sys.stderr.write('\\nRFLOW_HEAVY=' + ','.join(heavy) + '\\n')
+"""
+
+
+def _median_runtime(cmd: list[str], env: dict[str, str], repeat: int) -> tuple[float, str]:
+    times: list[float] = []
+    stderr = ''
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        times.append(time.perf_counter() - start)
+        stderr = proc.stderr
+    return statistics.median(times) * 1000, stderr
+
+
+@bench.command()
+@click.option('-n', '--repeat', type=int, default=10, show_default=True)
+@click.option('--max-ms', type=float, default=100.0, show_default=True,
+              help="Fail if a command takes this much longer than starting a bare interpreter")
+def startup(repeat: int, max_ms: float):
+    """Checks that short commands start quickly and import no heavy dependencies."""
+    src = os.path.dirname(os.path.abspath(__file__))
+    probe = _startup_probe.format(heavy=heavy_modules)
+    env = {**os.environ, 'PYTHONPATH': src}
+
+    baseline, _ = _median_runtime([sys.executable, '-c', 'pass'], env, repeat)
+    failures: list[str] = []
+    results: dict[str, Any] = {'python -c pass': {'median_ms': baseline}}
+    for args in startup_commands:
+        name = ' '.join(args)
+        median, stderr = _median_runtime([sys.executable, '-c', probe, *args], env, repeat)
+        heavy = stderr.rsplit('RFLOW_HEAVY=', 1)[-1].strip()
+
+        overhead = median - baseline
+        results[name] = {'median_ms': median, 'overhead_ms': overhead,
+                         'heavy_imports': heavy.split(',') if heavy else []}
+        if overhead > max_ms:
+            failures.append(f"'rflow {name}' took {overhead:.0f} ms over bare startup (limit {max_ms:.0f} ms)")
+        if heavy:
+            failures.append(f"'rflow {name}' imported {heavy}")
+
+    sys.stdout.write(json.dumps(results, indent=2) + '\n')
+    for failure in failures:
+        print(f"[red]{failure}[/red]")
+    if failures:
+        exit(1)
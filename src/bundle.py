@@ -0,0 +1,244 @@
+import os
+import re
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional
+
+# Token kinds
+SPACE, COMMENT, NAME, NUMBER, STRING, OP = 'space', 'comment', 'name', 'number', 'string', 'op'
+
+_space = re.compile(r'[ \t\r\n\f\v]+')
+_name = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_number = re.compile(
+    r'0[xX](?:[0-9a-fA-F]*\.?[0-9a-fA-F]*)(?:[pP][+-]?\d+)?'
+    r'|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?')
+_short_string = re.compile(r'"(?:[^"\\\n]|\\z\s*|\\.|\\\n)*"|\'(?:[^\'\\\n]|\\z\s*|\\.|\\\n)*\'', re.S)
+_long_open = re.compile(r'\[(=*)\[')
+_line_comment = re.compile(r'--[^\n]*')
+_ops = ('...', '..', '==', '~=', '<=', '>=', '//', '::', '<<', '>>')
+
+Token = tuple[str, str]
+
+
+class BundleError(ValueError):
+    def __init__(self, message: str) -> None:
+        self.message = message
+        super().__init__(message)
+
+
+def _long_bracket(source: str, pos: int) -> Optional[int]:
+    """The end of a long bracket (`[==[ ... ]==]`) starting at `pos`, or None if there is none."""
+    match = _long_open.match(source, pos)
+    if not match:
+        return None
+    close = f']{match.group(1)}]'
+    end = source.find(close, match.end())
+    if end < 0:
+        raise BundleError(f'Unfinished long string or comment at offset {pos}')
+    return end + len(close)
+
+
+def tokenize(source: str) -> list[Token]:
+    """Splits Lua source into tokens, keeping whitespace and comments so the source can be rebuilt."""
+    tokens: list[Token] = []
+    pos = 0
+    if source.startswith('#'):  # shebang line
+        pos = source.find('\n') if '\n' in source else len(source)
+        tokens.append((COMMENT, source[:pos]))
+
+    length = len(source)
+    while pos < length:
+        char = source[pos]
+        if char in ' \t\r\n\f\v':
+            match = _space.match(source, pos)
+            kind = SPACE
+        elif source.startswith('--', pos):
+            end = _long_bracket(source, pos + 2)
+            if end is not None:
+                tokens.append((COMMENT, source[pos:end]))
+                pos = end
+                continue
+            match = _line_comment.match(source, pos)
+            kind = COMMENT
+        elif char.isalpha() or char == '_':
+            match = _name.match(source, pos)
+            kind = NAME
+        elif char.isdigit() or (char == '.' and source[pos + 1:pos + 2].isdigit()):
+            match = _number.match(source, pos)
+            kind = NUMBER
+        elif char in '"\'':
+            match = _short_string.match(source, pos)
+            if not match:
+                raise BundleError(f'Unfinished string at offset {pos}')
+            kind = STRING
+        elif char == '[' and _long_open.match(source, pos):
+            end = _long_bracket(source, pos)
+            tokens.append((STRING, source[pos:end]))
+            pos = end  # type: ignore
+            continue
+        else:
+            op = next((op for op in _ops if source.startswith(op, pos)), char)
+            tokens.append((OP, op))
+            pos += len(op)
+            continue
+
+        assert match is not None
+        tokens.append((kind, match.group()))
+        pos = match.end()
+    return tokens
+
+
+def _word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+
+@lru_cache(maxsize=4096)
+def _needs_space(left: str, right: str) -> bool:
+    """Whether writing `left` and `right` side by side would lex as something else."""
+    if left[-1] in '({,;' or right[0] in ')]},;':
+        return False
+    if _word_char(left[-1]) and _word_char(right[0]):
+        return True  # Lua reads `1end` as one malformed number
+    try:
+        joined = [t for t in tokenize(left + right) if t[0] != SPACE]
+    except BundleError:
+        return True
+    return [t[1] for t in joined] != [left, right]
+
+
+def minify(source: str) -> str:
+    """Drops comments and all whitespace the Lua lexer doesn't need."""
+    out: list[str] = []
+    previous = ''
+    for kind, text in tokenize(source):
+        if kind in (SPACE, COMMENT):
+            continue
+        if previous and _needs_space(previous, text):
+            out.append(' ')
+        out.append(text)
+        previous = text
+    return ''.join(out)
+
+
+def _string_value(token: str) -> Optional[str]:
+    """The value of a plain string literal, or None if it has escapes or is a long string."""
+    if token[0] in '"\'' and '\\' not in token:
+        return token[1:-1]
+    match = _long_open.match(token)
+    if match:
+        return token[match.end():-len(match.group(1)) - 2].removeprefix('\n')
+    return None
+
+
+def find_requires(source: str) -> tuple[list[str], int]:
+    """Module names required with a literal, and how many `require` uses aren't literal calls."""
+    tokens = [t for t in tokenize(source) if t[0] not in (SPACE, COMMENT)]
+    names: list[str] = []
+    dynamic = 0
+    for index, (kind, text) in enumerate(tokens):
+        if kind != NAME or text != 'require':
+            continue
+        if index and tokens[index - 1][1] in ('.', ':'):
+            continue  # a field called require, not the global
+        rest = tokens[index + 1:index + 4]
+        name = None
+        if rest and rest[0][0] == STRING:
+            name = _string_value(rest[0][1])
+        elif len(rest) == 3 and rest[0][1] == '(' and rest[1][0] == STRING and rest[2][1] == ')':
+            name = _string_value(rest[1][1])
+        if name is None:
+            dynamic += 1
+        elif name not in names:
+            names.append(name)
+    return names, dynamic
+
+
+@dataclass
+class Bundle:
+    code: str
+    modules: list[str] = field(default_factory=list)  # inlined, in dependency order
+    unused: list[str] = field(default_factory=list)  # in lua_modules but never required
+    external: list[str] = field(default_factory=list)  # left to the runtime's require
+    warnings: list[str] = field(default_factory=list)
+    source_bytes: int = 0  # main.lua plus every inlined module
+    modules_bytes: int = 0  # everything in lua_modules
+
+
+def module_file(modules_dir: str, name: str) -> str:
+    return os.path.join(modules_dir, *name.split('.')) + '.lua'
+
+
+# Prepended to bundles. Inlined modules are looked up before falling back to
+# the sandbox's require, and each one runs once, as with package.loaded.
+_prelude = """local __modules, __loaded, __require = {}, {}, require
+local function require(name)
+    local loaded = __loaded[name]
+    if loaded ~= nil then return loaded end
+    local module = __modules[name]
+    if not module then return __require(name) end
+    loaded = module(name)
+    if loaded == nil then loaded = true end
+    __loaded[name] = loaded
+    return loaded
+end
+"""
+
+
+def bundle(code: str, modules_dir: str, minified: bool = True) -> Bundle:
+    """
+    Resolves the `require` graph of `code` against `modules_dir` and returns a
+    single chunk with every required module inlined. Modules that aren't files
+    there (like `math`) are left to the runtime.
+    """
+    result = Bundle('', source_bytes=len(code.encode()))
+    if os.path.isdir(modules_dir):
+        for dirpath, _, filenames in os.walk(modules_dir):
+            for filename in filenames:
+                if filename.endswith('.lua'):
+                    result.modules_bytes += os.path.getsize(os.path.join(dirpath, filename))
+
+    sources: dict[str, str] = {}
+    order: list[str] = []
+    visiting: set[str] = set()
+    any_dynamic = False
+
+    def visit(name: str, source: str, origin: str):
+        nonlocal any_dynamic
+        requires, dynamic = find_requires(source)
+        if dynamic:
+            any_dynamic = True
+            result.warnings.append(f'{origin} uses require without a literal module name; '
+                                   f'those modules are resolved at runtime')
+        visiting.add(name)
+        for required in requires:
+            if required in sources or required in visiting or required in result.external:
+                continue
+            path = module_file(modules_dir, required)
+            if not os.path.isfile(path):
+                result.external.append(required)
+                continue
+            with open(path, 'r') as f:
+                sources[required] = f.read()
+            visit(required, sources[required], os.path.relpath(path))
+            order.append(required)
+        visiting.discard(name)
+
+    try:
+        visit('', code, 'main.lua')
+    except BundleError as e:
+        raise BundleError(f'Could not parse: {e.message}')
+
+    result.modules = order
+    result.source_bytes += sum(len(sources[name].encode()) for name in order)
+    if os.path.isdir(modules_dir) and not any_dynamic:
+        available = sorted(os.path.splitext(f)[0] for f in os.listdir(modules_dir) if f.endswith('.lua'))
+        result.unused = [name for name in available if name not in sources]
+
+    parts = [_prelude]
+    for name in order:
+        parts.append(f'__modules[{name!r}] = function(...)\n{sources[name]}\nend\n')
+    parts.append(code)
+    bundled = ''.join(parts)
+    result.code = minify(bundled) if minified else bundled
+    return result
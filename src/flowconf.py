@@ -0,0 +1,91 @@
+import os
+import re
+import json
+import hashlib
+
+from typing import Any, Optional
+
+config_file = 'rflow.config.toml'
+script_file = 'main.lua'
+
+env_value_pattern = re.compile(r'^[\w\s\-\/:.@,=+_(){};\'"]+$')
+env_key_pattern = re.compile(r'^[a-zA-Z_][a-zA-Z0-9_]*$')
+
+
+class FlowConfigError(ValueError):
+    def __init__(self, message: str) -> None:
+        self.message = message
+        super().__init__(message)
+
+
+def read_flow_config(path: str = '.') -> dict[str, Any]:
+    import toml
+
+    with open(os.path.join(path, config_file), 'r') as f:
+        return toml.load(f)
+
+
+def parse_flow_config(fconf: dict[str, Any]) -> tuple[str, dict[Any, Any], Optional[str]]:
+    """Returns the flow's name, raw env table and remote id (None if never published)."""
+    try:
+        name = fconf['name']
+        renv: dict[Any, Any] = fconf['env'] if 'env' in fconf else {}
+        id = fconf['_rf']['id'] if '_rf' in fconf else None
+
+        if type(renv) != dict:
+            raise ValueError('renv')
+
+    except KeyError as e:
+        raise FlowConfigError(
+            f"rflow.config.toml is missing required key (or) incorrect type: '{e}'")
+    except ValueError as e:
+        raise FlowConfigError(f"rflow.config.toml is having wrong value: '{e}'")
+
+    return name, renv, id
+
+
+def validate_env(renv: dict[Any, Any]) -> tuple[dict[str, str], list[str]]:
+    """Checks env entries against the API's rules. Returns the env and any warnings."""
+    env: dict[str, str] = {}
+    warnings: list[str] = []
+    for name, value in renv.items():
+        if len(value) > 2048:
+            raise FlowConfigError(
+                f"Invalid environment variable: {name}. Value is too long, max is 2048 characters.")
+        if len(name) > 100:
+            raise FlowConfigError(
+                f"Invalid environment variable: {name}. Name is too long, max is 100 characters.")
+        if not name.strip() or not value.strip():
+            raise FlowConfigError(
+                f"Invalid environment variable: {name}. Name or value is empty.")
+
+        if not env_key_pattern.match(name):
+            raise FlowConfigError(
+                f"Invalid environment variable: {name}. Name contains invalid characters.")
+        if not env_value_pattern.match(str(value)):
+            raise FlowConfigError(
+                f"Invalid environment variable: {name}. Value contains invalid characters.")
+
+        if type(value) != str:
+            warnings.append(
+                f"WARNING: Invalid type for environment variable: {name}. Value must be a string")
+        env[name] = str(value)
+    return env, warnings
+
+
+def digest(data: Any) -> str:
+    """Stable sha256 of a string or of JSON-compatible data."""
+    if not isinstance(data, str):
+        data = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def find_flow_dirs(root: str) -> list[str]:
+    """Lists every directory under `root` holding an rflow.config.toml, skipping hidden and module dirs."""
+    found: list[str] = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames
+                             if not d.startswith('.') and d != 'lua_modules')
+        if config_file in filenames:
+            found.append(dirpath)
+    return found
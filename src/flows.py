@@ -1,27 +1,30 @@
 import os
-import re
-import toml
-import httpx
 import click
 
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator, TYPE_CHECKING
 
-import luasb
-from luasb._exceptions import LuaRuntimeError
 from rflow import rf
-from luasb.sandbox import LuaSandbox, variable
-from rich.table import Table
-from rich.console import Console
 from rflow._exceptions import AuthenticationError, NotFoundError
 
-from utils import get_readme, get_rewrite_helper_code, readable_time
+from flowconf import FlowConfigError, parse_flow_config, read_flow_config, validate_env
+from tracing import span
+from utils import get_console, get_readme, print, readable_time, rewrite_helper_url
 
-console = Console()
-print = console.print
+if TYPE_CHECKING:
+    from luasb.limits import ExecutionMetrics
+    from rflow._models import Flow
+    from stats import FlowStats, Totals
+    from loadtest import LoadReport
+    from luasb.profile import Profile
+
+# Commands import the sandbox, rich tables and the HTTP clients themselves, so
+# loading this module (for --help, or for a cheap command) stays fast.
 
 
 def scaffold_flow_directory(target_path: str, name: str):
+    import toml
+
     path = Path(target_path)
     path.mkdir(parents=True, exist_ok=True)
 
@@ -42,21 +45,17 @@ def scaffold_flow_directory(target_path: str, name: str):
 
     (path / "README.md").write_text(get_readme())
 
-    for mod in lmods:
-        name = os.path.basename(mod)
-        print(f"\tFetching module {os.path.splitext(name)[0]}...")
-        response = httpx.get(mod)
-
-        try:
-            response.raise_for_status()
-        except httpx.HTTPError:
-            print(f"Failed to download module '{name}'")
-            exit(1)
-
-        (path / "lua_modules" / f"{name}").write_bytes(response.content)
+    targets = {mod: str(path / "lua_modules" / os.path.basename(mod))
+               for mod in lmods}
+    targets[rewrite_helper_url] = str(path / "rewrite.lua")
 
-    print("Fetching helper module")
-    (path / "rewrite.lua").write_text(get_rewrite_helper_code())
+    print(f"Fetching {len(lmods)} modules and the helper module...")
+    from modcache import fetch_modules
+    failed = fetch_modules(targets)
+    for mod, error in failed.items():
+        print(f"Failed to download module '{os.path.basename(mod)}': {error}")
+    if failed:
+        exit(1)
 
 
 @click.group()
@@ -64,8 +63,45 @@ def flows(): pass
 
 
 @flows.command()
-def show():
-    console = Console()
+@click.option('-s', '--search', help="Only show flows whose name contains this text")
+@click.option('--sort', type=click.Choice(['name', 'created', 'modified', 'calls']),
+              help="Sort flows on the server by this field")
+@click.option('--desc', is_flag=True, help="Sort in descending order")
+@click.option('--json', 'as_json', is_flag=True, help="Print flows as a JSON array")
+@click.option('--ids-only', is_flag=True, help="Print one flow ID per line")
+@click.option('--page-size', type=int, default=500, show_default=True,
+              help="Flows fetched per request")
+def show(search: str | None, sort: str | None, desc: bool, as_json: bool,
+         ids_only: bool, page_size: int):
+    flows = rf.iter_my_flows(page_size=page_size, sort=sort,
+                             descending=desc, search=search)
+    try:
+        if ids_only:
+            for flow in flows:
+                click.echo(flow.id)
+        elif as_json:
+            show_json(flows)
+        else:
+            show_table(flows)
+    except AuthenticationError:
+        print("Authentication error. Please make sure you are logged in.")
+        exit(1)
+
+
+def show_json(flows: 'Iterator[Flow]'):
+    out = click.get_text_stream('stdout')
+    out.write('[')
+    for index, flow in enumerate(flows):
+        out.write(',\n' if index else '\n')
+        out.write(flow.model_dump_json())
+    out.write('\n]\n')
+
+
+def show_table(flows: 'Iterator[Flow]'):
+    from rich.live import Live
+    from rich.table import Table
+    from rich.markup import escape
+
     table = Table(title="Your flows")
 
     table.add_column('ID')
@@ -73,12 +109,13 @@ def show():
     table.add_column('Created At')
     table.add_column('Analytics')
 
-    flows = rf.get_my_flows()
-    for flow in flows:
-        table.add_row(flow.id, flow.name, readable_time(
-            flow.created_at), str(flow.analytics))
-
-    console.print(table)
+    console = get_console()
+    # Rows appear as pages arrive; redirected output gets the table once.
+    with Live(table, console=console, refresh_per_second=8,
+              vertical_overflow='visible', auto_refresh=console.is_terminal):
+        for flow in flows:
+            table.add_row(flow.id, escape(flow.name), readable_time(
+                flow.created_at), str(flow.analytics))
 
 
 @flows.command()
@@ -90,81 +127,63 @@ def create():
     print(f"Flow '{name}' created successfully at '{path}'")
 
 
-env_value_pattern = re.compile(r'^[\w\s\-\/:.@,=+_(){};\'"]+$')
-env_key_pattern = re.compile(r'^[a-zA-Z_][a-zA-Z0-9_]*$')
-
-
 @flows.command()
-def publish():
+@click.option('--workspace', 'root', type=click.Path(exists=True, file_okay=False),
+              help="Publish every flow under this directory that changed since the last publish")
+@click.option('--workers', type=int, default=8, show_default=True,
+              help="Flows published concurrently with --workspace")
+@click.option('--force', is_flag=True, help="With --workspace, publish flows even if unchanged")
+@click.option('--bundle/--no-bundle', 'bundled', default=None,
+              help="Publish main.lua bundled with its modules (defaults to the config's 'bundle' key)")
+def publish(root: str | None, workers: int, force: bool, bundled: bool | None):
+    if root:
+        publish_all(root, workers, force, bundled)
+        return
+
+    import toml
+
     req_paths = ['rflow.config.toml', 'main.lua']
     if not all([os.path.exists(p) for p in req_paths]):
         print("One or two required files missing: ", ', '.join(req_paths))
         print("Are you sure you are in the correct directory?")
         exit(1)
 
-    with open('rflow.config.toml', 'r') as f:
-        fconf = toml.load(f)
-
-    try:
-        name = fconf['name']
-        renv: dict[Any, Any] = fconf['env'] if 'env' in fconf else {}
-        id = fconf['_rf']['id'] if '_rf' in fconf else None
-
-        if type(renv) != dict:
-            raise ValueError('renv')
-
-    except KeyError as e:
-        print(
-            f"rflow.config.toml is missing required key (or) incorrect type: '{e}'")
-        exit(1)
-    except ValueError as e:
-        print(f"rflow.config.toml is having wrong value: '{e}'")
-        exit(1)
+    with span('config.read'):
+        fconf = read_flow_config()
+        try:
+            name, renv, id = parse_flow_config(fconf)
+        except FlowConfigError as e:
+            print(e.message)
+            exit(1)
 
-    with open('main.lua', 'r') as f:
-        code = f.read()
+        with open('main.lua', 'r') as f:
+            code = f.read()
+    if fconf.get('bundle', False) if bundled is None else bundled:
+        with span('bundle'):
+            code = bundle_code(code)
 
     print(f"Publishing flow {name}...")
-    env: dict[str, str] = {}
-    for name, value in renv.items():
-        if len(value) > 2048:
-            print(
-                f"Invalid environment variable: {name}. Value is too long, max is 2048 characters.")
-            exit(1)
-        if len(name) > 100:
-            print(
-                f"Invalid environment variable: {name}. Name is too long, max is 100 characters.")
-            exit(1)
-        if not name.strip() or not value.strip():
-            print(
-                f"Invalid environment variable: {name}. Name or value is empty.")
-            exit(1)
-
-        if not env_key_pattern.match(name):
-            print(
-                f"Invalid environment variable: {name}. Name contains invalid characters.")
-            exit(1)
-        if not env_value_pattern.match(str(value)):
-            print(
-                f"Invalid environment variable: {name}. Value contains invalid characters.")
-            exit(1)
+    try:
+        with span('env.validate', keys=len(renv)):
+            env, warnings = validate_env(renv)
+    except FlowConfigError as e:
+        print(e.message)
+        exit(1)
+    for warning in warnings:
+        print(warning)
 
-        if type(value) != str:
-            print(
-                f"WARNING: Invalid type for environment variable: {name}. Value must be a string")
-        env[name] = str(value)
     if id:
+        print("Updating environment and code...")
         try:
-            flow = rf.get_my_flow(id)
+            rf.update_flow_info(id, name, env)
         except NotFoundError:
             print(f"Flow '{id}' not found.")
             exit(1)
-
-        print("Updating environment and code...")
-        flow.env = env
-        flow.name = name
-        rf.update_flow(flow)
-        rf.set_my_code(id, code)
+        mode = rf.set_my_code(id, code)
+        if mode == 'unchanged':
+            print("Code unchanged, nothing uploaded")
+        elif mode == 'delta':
+            print("Uploaded code as a delta")
     else:
         print("Creating flow...")
         flow = rf.create_flow(name, env, code)
@@ -173,15 +192,73 @@ def publish():
             'id': flow.id
         }
 
-        with open('rflow.config.toml', 'w') as f:
+        with span('config.write'), open('rflow.config.toml', 'w') as f:
             toml.dump(fconf, f)
 
+    print_request_stats()
     print("Done!")
 
 
+def publish_all(root: str, workers: int, force: bool, bundled: bool | None):
+    from rich.table import Table
+    from rich.markup import escape
+    from rflow import AsyncRewriteFlow
+    from workspace import plan_workspace, run_publish_workspace
+
+    with span('workspace.plan'):
+        plans, state = plan_workspace(root, force, bundled)
+    changed = [plan for plan in plans if plan.actions and not plan.error]
+    print(f"Found {len(plans)} flows, {len(changed)} to publish")
+
+    arf = AsyncRewriteFlow.from_client(rf, max_concurrency=workers)
+    with span('workspace.publish', flows=len(changed)):
+        run_publish_workspace(arf, root, plans, state)
+
+    table = Table(title="Workspace publish")
+    table.add_column('Flow')
+    table.add_column('Path')
+    table.add_column('Changes')
+    table.add_column('Result')
+
+    failed = 0
+    for plan in plans:
+        if plan.error:
+            failed += 1
+            result = f"[red]{escape(plan.error)}[/red]"
+        elif plan.actions:
+            result = "[green]published[/green]"
+        else:
+            result = "[dim]unchanged[/dim]"
+        table.add_row(escape(plan.name), escape(plan.path),
+                      ', '.join(plan.actions) or '-', result)
+    get_console().print(table)
+    print_request_stats()
+
+    if failed:
+        print(f"{failed} flows failed")
+        exit(1)
+
+
 @flows.command()
 @click.option('-i', '--id')
-def pull(id: str):
+@click.option('--all', 'pull_all', is_flag=True,
+              help="Mirror every flow into subdirectories, fetching only flows that changed")
+@click.option('--into', 'root', default='.', show_default=True,
+              type=click.Path(file_okay=False), help="Directory to mirror into with --all")
+@click.option('--workers', type=int, default=16, show_default=True,
+              help="Flows fetched concurrently with --all")
+@click.option('--force', is_flag=True,
+              help="With --all, refetch every flow and overwrite local edits")
+def pull(id: str | None, pull_all: bool, root: str, workers: int, force: bool):
+    if pull_all:
+        mirror_all(root, workers, force)
+        return
+    if not id:
+        print("Pass a flow with --id, or --all to mirror every flow")
+        exit(1)
+
+    import toml
+
     try:
         flow = rf.get_my_flow(id)
     except NotFoundError:
@@ -213,8 +290,156 @@ def pull(id: str):
     print("Done!")
 
 
+def mirror_all(root: str, workers: int, force: bool):
+    from rich.table import Table
+    from rich.markup import escape
+    from rflow import AsyncRewriteFlow
+    from mirror import load_manifest, plan_mirror, run_mirror
+
+    manifest = load_manifest(root)
+    try:
+        with span('mirror.plan'):
+            entries = plan_mirror(root, rf.iter_my_flows(), manifest, force)
+    except AuthenticationError:
+        print("Authentication error. Please make sure you are logged in.")
+        exit(1)
+
+    pending = [e for e in entries if e.status in ('new', 'updated')]
+    print(f"Found {len(entries)} flows, {len(pending)} to fetch")
+    # Code must come from the API, not from a cached copy that predates the change.
+    arf = AsyncRewriteFlow.from_client(rf, cache=None, max_concurrency=workers)
+    with span('mirror.fetch', flows=len(pending)):
+        run_mirror(arf, root, entries, manifest)
+
+    counts: dict[str, int] = {}
+    table = Table(title="Flows not mirrored")
+    table.add_column('Flow')
+    table.add_column('Path')
+    table.add_column('Problem')
+    for entry in entries:
+        status = 'failed' if entry.error else entry.status
+        counts[status] = counts.get(status, 0) + 1
+        if entry.error:
+            table.add_row(escape(entry.flow.name), escape(entry.path),
+                          f"[red]{escape(entry.error)}[/red]")
+        elif entry.status == 'conflict':
+            table.add_row(escape(entry.flow.name), escape(entry.path),
+                          "[yellow]edited locally, skipped (--force overwrites)[/yellow]")
+    if table.row_count:
+        get_console().print(table)
+    print(', '.join(f"{count} {status}" for status, count in sorted(counts.items())))
+
+    listed = {entry.flow.id for entry in entries}
+    gone = [flow_id for flow_id in manifest if flow_id not in listed]
+    if gone:
+        print(f"{len(gone)} mirrored flows no longer exist remotely; their directories were kept")
+    print_request_stats()
+    if counts.get('failed'):
+        exit(1)
+
+
+def print_request_stats():
+    """Says how much retrying it took to get through, if the API gave any trouble."""
+    stats = rf.policy.stats
+    if not (stats.retries or stats.hedges or stats.short_circuited):
+        return
+    print(f"[dim]{stats.requests} API requests: {stats.retries} retried, "
+          f"{stats.timeouts} timed out, {stats.hedges} hedged ({stats.hedge_wins} won), "
+          f"{stats.breaker_trips} breaker trips[/dim]")
+
+
+def bundle_code(code: str, minified: bool = True, quiet: bool = True) -> str:
+    from bundle import BundleError, bundle
+
+    try:
+        result = bundle(code, 'lua_modules', minified)
+    except BundleError as e:
+        print(f"Could not bundle main.lua: {e.message}")
+        exit(1)
+    for warning in result.warnings:
+        print(f"[yellow]{warning}[/yellow]")
+
+    size = len(result.code.encode())
+    if quiet:
+        print(f"Bundled {len(result.modules)} modules: {result.source_bytes:,} -> {size:,} bytes")
+        return result.code
+
+    print(f"Inlined modules: {', '.join(result.modules) or 'none'}")
+    if result.unused:
+        print(f"Unused modules left out: {', '.join(result.unused)}")
+    if result.external:
+        print(f"Left to the runtime: {', '.join(result.external)}")
+    saved = 1 - size / result.source_bytes if result.source_bytes else 0
+    print(f"main.lua and its modules: {result.source_bytes:,} bytes "
+          f"(all of lua_modules: {result.modules_bytes:,} bytes)")
+    print(f"Bundle: {size:,} bytes, {saved * 100:.0f}% smaller")
+    return result.code
+
+
 @flows.command()
-def test():
+@click.option('-o', '--output', default=os.path.join('.rflow', 'bundle.lua'), show_default=True,
+              help="Where to write the bundle")
+@click.option('--no-minify', is_flag=True, help="Inline modules without stripping comments and whitespace")
+def bundle(output: str, no_minify: bool):
+    """Inline the modules main.lua requires into one chunk."""
+    if not os.path.exists('main.lua'):
+        print("main.lua is missing. Are you sure you are in the correct directory?")
+        exit(1)
+    with open('main.lua', 'r') as f:
+        code = f.read()
+
+    bundled = bundle_code(code, not no_minify, quiet=False)
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        f.write(bundled)
+    print(f"Written to {output}")
+
+
+
+
+@flows.command()
+@click.option('--batch', 'batch_path', type=click.Path(exists=True),
+              help="Directory of payload files or a JSONL corpus to replay")
+@click.option('--workers', type=int, default=None,
+              help="Worker processes for --batch (defaults to the CPU count)")
+@click.option('--max-instructions', type=int, default=None,
+              help="Stop the script after this many Lua instructions")
+@click.option('--timeout', type=float, default=10.0, show_default=True,
+              help="Stop the script after this many seconds")
+@click.option('--raw-output', is_flag=True,
+              help="Write script output straight to stdout, without rich formatting")
+@click.option('--max-output-bytes', type=int, default=None,
+              help="Truncate script output after this many bytes")
+@click.option('--watch', is_flag=True,
+              help="Rerun whenever the script, payload, config or lua_modules change")
+@click.option('--profile', 'profile_path', is_flag=False, flag_value='.rflow/profile.folded',
+              default=None, help="Profile the run and write folded stacks to this file "
+              "(.rflow/profile.folded if no file is given)")
+@click.option('--profile-interval', type=int, default=1000, show_default=True,
+              help="Instructions between profiler samples")
+@click.option('--bundle/--no-bundle', 'bundled', default=None,
+              help="Run main.lua bundled with its modules (defaults to the config's 'bundle' key)")
+@click.option('--fork', is_flag=True,
+              help="Run each payload in a process forked from a warm sandbox, so no state carries over")
+@click.option('--cpu-limit', type=float, default=None,
+              help="With --fork, kill a run after this many seconds of CPU time")
+@click.option('--memory-limit', type=int, default=None,
+              help="With --fork, cap each run's memory at this many MiB above the warm sandbox")
+def test(batch_path: str | None, workers: int | None,
+         max_instructions: int | None, timeout: float,
+         raw_output: bool, max_output_bytes: int | None, watch: bool,
+         profile_path: str | None, profile_interval: int, bundled: bool | None,
+         fork: bool, cpu_limit: float | None, memory_limit: int | None):
+    with span('import'):
+        import toml
+        import luasb
+        from luasb import LuaSandbox, ForkServer
+        from luasb.bytecode import ChunkCache, default_cache_dir
+        from luasb.output import RawSink
+        from luasb._exceptions import LuaRuntimeError
+        from runner import build_payload
+
     print("Starting sandbox...")
     luasb.modules.modules_dir = 'lua_modules'
 
@@ -225,10 +450,11 @@ def test():
         print("Are you sure you are in the correct directory?")
         exit(1)
 
-    with open('rflow.config.toml', 'r') as f:
-        fconf = toml.load(f)
-    with open('main.lua', 'r') as f:
-        code = f.read()
+    with span('config.read'):
+        with open('rflow.config.toml', 'r') as f:
+            fconf = toml.load(f)
+        with open('main.lua', 'r') as f:
+            code = f.read()
 
     try:
         renv: dict[Any, Any] = fconf['env'] if 'env' in fconf else {}
@@ -244,32 +470,359 @@ def test():
         print(f"rflow.config.toml is having wrong value: '{e}'")
         exit(1)
 
-    if os.path.exists('payload.toml'):
-        with open('payload.toml', 'r') as f:
-            rpayload = toml.load(f)
+    limits: dict[str, Any] = {
+        'max_instructions': max_instructions,
+        'timeout': timeout,
+        'max_output_bytes': max_output_bytes
+    }
+
+    if profile_path and (batch_path or watch):
+        print("--profile can't be combined with --batch or --watch")
+        exit(1)
+    if (cpu_limit is not None or memory_limit is not None) and not fork:
+        print("--cpu-limit and --memory-limit need --fork")
+        exit(1)
+    if fork and watch:
+        print("--fork can't be combined with --watch")
+        exit(1)
+    fork_options: dict[str, Any] | None = None
+    if fork:
+        fork_options = {
+            'cpu_seconds': cpu_limit,
+            'memory_bytes': memory_limit * 1024 * 1024 if memory_limit is not None else None,
+            'kill_after': timeout + 1 if timeout else None,  # in case the sandbox's own timeout can't fire
+        }
+    if fconf.get('bundle', False) if bundled is None else bundled:
+        if watch:
+            print("--watch runs main.lua as is; it can't be combined with --bundle")
+            exit(1)
+        with span('bundle'):
+            code = bundle_code(code)
+    if batch_path:
+        test_batch(batch_path, code, renv, workers, limits, fork_options)
+        return
+    if watch:
+        test_watch(limits, raw_output)
+        return
+
+    with span('payload.build'):
+        if os.path.exists('payload.toml'):
+            with open('payload.toml', 'r') as f:
+                rpayload = toml.load(f)
+        else:
+            rpayload = {}
+        payload = build_payload(rpayload, renv)
+
+    if raw_output:
+        output: dict[str, Any] = {'output_sinks': [RawSink()]}
+    else:
+        output = {'print_fn': print}
+    options: dict[str, Any] = {
+        'chunk_cache': ChunkCache(default_cache_dir),
+        'profile': bool(profile_path),
+        'profile_interval': profile_interval,
+        **output,
+        **limits
+    }
+    if fork_options is not None:
+        with span('forkserver.start', 'sandbox'):
+            server = ForkServer(code, **fork_options, **options)
+        with span('forkserver.run', 'sandbox'):
+            run = server.run(payload)
+        error, metrics, profile = run.error, run.metrics, run.profile
+    else:
+        sb = LuaSandbox(payload, **options)
+        error = None
+        try:
+            sb.execute(code)
+        except LuaRuntimeError as e:
+            error = e.message
+        metrics, profile = sb.metrics, sb.last_profile()
+
+    if error is not None:
+        print(f"Lua runtime error occurred: {error}")
+    print_metrics(metrics)
+    if profile_path:
+        print_profile(profile, profile_path)  # type: ignore
+    if error is not None:
+        exit(1)
 
-        payload: dict[str, variable] = {}
 
-        payload['body'] = rpayload['body'] if 'body' in rpayload else {}
-        payload['headers'] = rpayload['headers'] if 'headers' in rpayload else {}
-        payload['params'] = rpayload['params'] if 'params' in rpayload else {}
-        payload['env'] = renv
+def print_metrics(metrics: 'ExecutionMetrics'):
+    print(f"[dim]{metrics.instructions_label} instructions, "
+          f"{metrics.peak_memory / 1024:.0f} KiB peak memory, "
+          f"{metrics.wall_time * 1000:.2f} ms, "
+          f"{metrics.output_bytes} bytes of output[/dim]")
+
+
+def print_profile(profile: 'Profile', path: str, top: int = 15):
+    from rich.table import Table
+    from rich.markup import escape
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        profile.write_folded(f)
+
+    samples = profile.samples or 1
+    for title, sites, has_total in (("Hottest functions", profile.functions, True),
+                                    ("Hottest lines", profile.lines, False)):
+        table = Table(title=title)
+        table.add_column('Function' if has_total else 'Line')
+        table.add_column('Self instr.', justify='right')
+        if has_total:
+            table.add_column('Total instr.', justify='right')
+        table.add_column('Self %', justify='right')
+        table.add_column('CPU ms', justify='right')
+        table.add_column('Heap growth', justify='right')
+        for site in sites[:top]:
+            row = [escape(site.site), f"{site.samples * profile.interval:,}"]
+            if has_total:
+                row.append(f"{site.total * profile.interval:,}")
+            row += [f"{site.samples / samples * 100:.1f}%", f"{site.time * 1000:.2f}",
+                    f"{site.alloc:.0f} KiB"]
+            table.add_row(*row)
+        get_console().print(table)
+
+    print(f"[dim]{profile.samples} samples every {profile.interval} instructions, "
+          f"folded stacks written to {path}[/dim]")
+
+
+def test_watch(limits: dict[str, Any], raw_output: bool):
+    import time
+    from rich.markup import escape
+    from luasb.output import RawSink
+    from watch import FlowWatcher, WatchSession
+
+    if raw_output:
+        session = WatchSession('.', {**limits, 'output_sinks': [RawSink()]})
     else:
-        payload = {}
-        payload['body'] = {}
-        payload['headers'] = {}
-        payload['params'] = {}
-        payload['env'] = renv
+        session = WatchSession('.', limits, print_fn=print)
+    watcher = FlowWatcher('.')
+
+    print("Watching for changes, press Ctrl+C to stop")
+    try:
+        while True:
+            changes = watcher.poll()
+            if changes:
+                print(f"[bold]{time.strftime('%H:%M:%S')}[/bold] changed: {', '.join(sorted(changes))}")
+                result, diff, elapsed, error = session.run(changes)
+                if error:
+                    print(f"[red]{escape(error)}[/red]")
+                else:
+                    print(f"Result: {escape(str(result))}")
+                    for line in diff:
+                        print(f"  {escape(line)}")
+                if session.sandbox:
+                    print_metrics(session.sandbox.metrics)
+                print(f"[dim]run took {elapsed * 1000:.2f} ms[/dim]")
+            time.sleep(0.25)
+    except KeyboardInterrupt:
+        pass
+
+
+def test_batch(path: str, code: str, env: dict[str, Any], workers: int | None,
+               limits: dict[str, Any], fork_options: dict[str, Any] | None = None):
+    from rich.table import Table
+    from rich.markup import escape
+    from luasb.bytecode import default_cache_dir
+    from runner import load_cases, run_batch
+
+    with span('batch.load_cases'):
+        cases = load_cases(path)
+    if not cases:
+        print(f"No payloads found in '{path}'")
+        exit(1)
+
+    print(f"Running {len(cases)} payloads...")
+    with span('batch.run', cases=len(cases), fork=fork_options is not None):
+        results, elapsed = run_batch(cases, code, env, 'lua_modules',
+                                     workers=workers, cache_dir=default_cache_dir,
+                                     sandbox_options=limits, fork_options=fork_options)
+
+    table = Table(title="Failed payloads")
+    table.add_column('Payload')
+    table.add_column('Error / Result diff')
+
+    failed = [r for r in results if not r.ok]
+    for result in failed:
+        table.add_row(escape(result.name),
+                      escape(result.error or '\n'.join(result.diff)))
+    if failed:
+        get_console().print(table)
+
+    print(f"{len(results) - len(failed)} passed, {len(failed)} failed "
+          f"in {elapsed:.2f}s ({len(results) / elapsed:.1f} payloads/s)")
+    if failed:
+        exit(1)
+
 
-    sb = LuaSandbox(payload, print_fn=print)
+@flows.command()
+@click.option('--top', type=int, default=10, show_default=True,
+              help="Flows to list; 0 lists all of them")
+@click.option('--by', type=click.Choice(['calls', 'failures', 'failure-rate', 'new-calls', 'new-failures']),
+              default='calls', show_default=True, help="What to rank flows by")
+@click.option('--min-calls', type=int, default=10, show_default=True,
+              help="Calls a flow needs before it is ranked by failure rate")
+@click.option('--format', 'fmt', type=click.Choice(['table', 'json', 'csv']),
+              default='table', show_default=True)
+@click.option('--no-snapshot', is_flag=True,
+              help="Compare with the last snapshot without saving a new one")
+def stats(top: int, by: str, min_calls: int, fmt: str, no_snapshot: bool):
+    import time
+    from stats import SnapshotStore, collect, rank, write_csv, write_json
+
+    store = SnapshotStore(str(rf.client.base_url))
+    previous = store.latest()
+    now = time.time()
     try:
-        sb.execute(code)
-    except LuaRuntimeError as e:
-        print(f"Lua runtime error occurred: {e}")
+        all_stats, totals = collect(rf.iter_my_flows(), previous, now)
+    except AuthenticationError:
+        print("Authentication error. Please make sure you are logged in.")
         exit(1)
+    if not no_snapshot:
+        store.save(all_stats, now)
+
+    ranked = rank(all_stats, by, top, min_calls)
+    out = click.get_text_stream('stdout')
+    if fmt == 'json':
+        write_json(ranked, totals, out)
+    elif fmt == 'csv':
+        write_csv(ranked, out)
+    else:
+        print_stats(ranked, totals, by)
+
+
+def print_stats(ranked: 'list[FlowStats]', totals: 'Totals', by: str):
+    from rich.table import Table
+    from rich.markup import escape
+    from stats import percent
+
+    print(f"{totals.flows} flows, {totals.calls} calls, "
+          f"{percent(totals.success_rate)} successful, {totals.failure} failures")
+    if totals.since is not None:
+        print(f"Since {readable_time(int(totals.since))}: "
+              f"{totals.new_calls} calls, {totals.new_failures} failures")
+
+    table = Table(title=f"Top flows by {by}")
+    table.add_column('ID')
+    table.add_column('Name')
+    table.add_column('Calls', justify='right')
+    table.add_column('Success', justify='right')
+    table.add_column('Failures', justify='right')
+    if totals.since is not None:
+        table.add_column('New calls', justify='right')
+        table.add_column('New failures', justify='right')
+        table.add_column('Calls/min', justify='right')
+
+    for s in ranked:
+        row = [s.id, escape(s.name), str(s.calls), percent(s.success_rate), str(s.failure)]
+        if totals.since is not None:
+            rate = '-' if s.calls_per_minute is None else f'{s.calls_per_minute:.1f}'
+            row += [str(s.new_calls), str(s.new_failures), rate]
+        table.add_row(*row)
+    get_console().print(table)
+
+
+@flows.command()
+@click.option('-i', '--id', help="Flow to call; defaults to the flow in the current directory")
+@click.option('--url', 'hook_url', help="Call this URL instead of the flow's hook, e.g. a local stub")
+@click.option('--payloads', 'payload_path', type=click.Path(exists=True),
+              help="Payload file, JSONL corpus or directory of them (defaults to payload.toml)")
+@click.option('--rate', type=float, default=None,
+              help="Requests per second; as fast as --concurrency allows if not set")
+@click.option('-c', '--concurrency', type=int, default=20, show_default=True,
+              help="Requests in flight at once")
+@click.option('-d', '--duration', type=float, default=10.0, show_default=True,
+              help="Seconds to send requests for")
+@click.option('-n', '--requests', type=int, default=None, help="Stop after this many requests")
+@click.option('-X', '--method', default='POST', show_default=True)
+@click.option('--timeout', type=float, default=10.0, show_default=True,
+              help="Seconds before a request counts as timed out")
+@click.option('--json', 'as_json', is_flag=True, help="Print the report as JSON")
+def loadtest(id: str | None, hook_url: str | None, payload_path: str | None,
+             rate: float | None, concurrency: int, duration: float, requests: int | None,
+             method: str, timeout: float, as_json: bool):
+    import json
+    import asyncio
+    from runner import PayloadCase, load_cases
+    from loadtest import run_load
+
+    if not hook_url:
+        if not id and os.path.exists('rflow.config.toml'):
+            try:
+                _, _, id = parse_flow_config(read_flow_config())
+            except FlowConfigError as e:
+                print(e.message)
+                exit(1)
+        if not id:
+            print("Pass a flow with --id or --url, or run this in a published flow's directory")
+            exit(1)
+        hook_url = rf.get_hook_url(id)
+
+    if payload_path:
+        cases = load_cases(payload_path)
+    elif os.path.exists('payload.toml'):
+        cases = load_cases('payload.toml')
+    else:
+        cases = [PayloadCase('empty')]
+    if not cases:
+        print(f"No payloads found in '{payload_path}'")
+        exit(1)
+
+    if not as_json:
+        pace = f"{rate:g} req/s" if rate else "max rate"
+        print(f"Calling {hook_url} at {pace}, {concurrency} concurrent, "
+              f"for {duration:g}s with {len(cases)} payloads...")
+    report = asyncio.run(run_load(hook_url, cases, rate, concurrency, duration,
+                                  requests, method.upper(), timeout))
+
+    if as_json:
+        click.echo(json.dumps(report.as_dict(), indent=2))
+    else:
+        print_load_report(report)
+    if report.ok == 0:
+        exit(1)
+
+
+def print_load_report(report: 'LoadReport'):
+    from rich.table import Table
+
+    def ms(seconds: float | None) -> str:
+        return '-' if seconds is None else f"{seconds * 1000:.1f} ms"
+
+    failed = sum(report.errors.values())
+    print(f"{report.sent} requests in {report.elapsed:.2f}s, "
+          f"{report.throughput:.1f} req/s, {report.ok} ok, {failed} failed")
+    if report.late:
+        print(f"[yellow]{report.late} requests started late: "
+              f"the target could not keep up with the requested rate[/yellow]")
+    print("Latency: " + ", ".join(f"p{p} {ms(report.percentile(p))}" for p in (50, 95, 99))
+          + f", max {ms(max(report.latencies, default=None))}")
+
+    table = Table(title="Latency histogram")
+    table.add_column('Up to', justify='right')
+    table.add_column('Requests', justify='right')
+    table.add_column('')
+    histogram = report.histogram()
+    peak = max((count for _, count in histogram), default=0)
+    for bound, count in histogram:
+        if count:
+            bar = '#' * max(1, round(count / peak * 40))
+            table.add_row('slower' if bound == float('inf') else ms(bound), str(count), bar)
+    get_console().print(table)
+
+    if report.errors:
+        errors = Table(title="Errors")
+        errors.add_column('Error')
+        errors.add_column('Count', justify='right')
+        for error, count in report.errors.most_common():
+            errors.add_row(error, str(count))
+        get_console().print(errors)
 
 
 @flows.command()
 @click.option('-i', '--id')
 def url(id: str):
-    print(rf.get_hook_url(id))
+    click.echo(rf.get_hook_url(id))
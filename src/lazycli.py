@@ -0,0 +1,40 @@
+import importlib
+import click
+
+from typing import Any, Optional
+
+
+class LazyGroup(click.Group):
+    """
+    A click group whose subcommands are imported only when invoked.
+
+    `lazy_commands` maps a command name to `('module:attribute', short_help)`;
+    the help listing uses the short help so `--help` imports nothing.
+    """
+
+    def __init__(self, *args: Any, lazy_commands: Optional[dict[str, tuple[str, str]]] = None,
+                 **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        return sorted([*super().list_commands(ctx), *self.lazy_commands])
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        if cmd_name in self.lazy_commands:
+            module, attr = self.lazy_commands[cmd_name][0].split(':')
+            return getattr(importlib.import_module(module), attr)
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(self, ctx: click.Context, formatter: click.HelpFormatter):
+        rows: list[tuple[str, str]] = []
+        for name in self.list_commands(ctx):
+            if name in self.lazy_commands:
+                rows.append((name, self.lazy_commands[name][1]))
+                continue
+            command = super().get_command(ctx, name)
+            if command is not None and not command.hidden:
+                rows.append((name, command.get_short_help_str()))
+        if rows:
+            with formatter.section('Commands'):
+                formatter.write_dl(rows)
@@ -0,0 +1,139 @@
+import time
+import asyncio
+import httpx
+
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from runner import PayloadCase
+
+# Upper bounds of the latency histogram buckets, in seconds.
+histogram_buckets = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+
+@dataclass
+class LoadReport:
+    url: str
+    sent: int = 0
+    ok: int = 0
+    elapsed: float = 0
+    latencies: list[float] = field(default_factory=list)
+    errors: Counter[str] = field(default_factory=Counter)
+    # Requests that went out later than scheduled because every slot was busy.
+    late: int = 0
+
+    @property
+    def throughput(self) -> float:
+        return len(self.latencies) / self.elapsed if self.elapsed else 0
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+    def histogram(self) -> list[tuple[float, int]]:
+        """Counts per bucket of `histogram_buckets`; the last bound is infinity."""
+        counts = [0] * (len(histogram_buckets) + 1)
+        for latency in self.latencies:
+            for index, bound in enumerate(histogram_buckets):
+                if latency <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+        return list(zip(histogram_buckets + (float('inf'),), counts))
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            'url': self.url,
+            'sent': self.sent,
+            'ok': self.ok,
+            'failed': sum(self.errors.values()),
+            'late': self.late,
+            'elapsed': self.elapsed,
+            'throughput': self.throughput,
+            'latency': {f'p{p}': self.percentile(p) for p in (50, 90, 95, 99)},
+            'max_latency': max(self.latencies, default=None),
+            'errors': dict(self.errors),
+            # The open-ended last bucket has no bound; JSON has no Infinity.
+            'histogram': [[bound if bound != float('inf') else None, count]
+                          for bound, count in self.histogram()],
+        }
+
+
+async def _send(client: httpx.AsyncClient, method: str, url: str, case: PayloadCase,
+                scheduled: float, report: LoadReport):
+    try:
+        response = await client.request(method, url, json=case.body,
+                                        headers=case.headers, params=case.params)
+    except httpx.TimeoutException:
+        report.errors['timeout'] += 1
+        return
+    except httpx.HTTPError as e:
+        report.errors[type(e).__name__] += 1
+        return
+    # Measured from when the request was due, so a backed-up client shows up
+    # as latency instead of being hidden by a lower send rate.
+    report.latencies.append(time.perf_counter() - scheduled)
+    if response.is_success:
+        report.ok += 1
+    else:
+        report.errors[f'HTTP {response.status_code}'] += 1
+
+
+async def run_load(
+    url: str,
+    cases: list[PayloadCase],
+    rate: Optional[float] = None,
+    concurrency: int = 20,
+    duration: float = 10.0,
+    requests: Optional[int] = None,
+    method: str = 'POST',
+    timeout: float = 10.0
+) -> LoadReport:
+    """
+    Sends `cases` to `url` in turn, `rate` requests a second (as fast as
+    `concurrency` allows when None), until `duration` seconds or `requests`
+    requests have gone out. Waits for the ones in flight before returning.
+    """
+    report = LoadReport(url)
+    slots = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def one(case: PayloadCase, scheduled: float):
+        try:
+            await _send(client, method, url, case, scheduled, report)
+        finally:
+            slots.release()
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        tasks: set[asyncio.Task[None]] = set()
+        start = time.perf_counter()
+        deadline = start + duration
+        index = 0
+        while requests is None or index < requests:
+            scheduled = start + index / rate if rate else time.perf_counter()
+            if scheduled >= deadline:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            if rate and slots.locked():
+                report.late += 1
+            await slots.acquire()
+            if not rate:
+                scheduled = time.perf_counter()
+
+            task = asyncio.create_task(one(cases[index % len(cases)], scheduled))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            index += 1
+            report.sent += 1
+
+        if tasks:
+            await asyncio.wait(tasks)
+        report.elapsed = time.perf_counter() - start
+    return report
@@ -1,2 +1,4 @@
 from .modules import load_modules # type: ignore
 from .sandbox import LuaSandbox, LuaRuntimeError # type: ignore
+from .pool import SandboxPool, PoolStats # type: ignore
+from .forkserver import ForkServer, ForkResult # type: ignore
@@ -2,3 +2,13 @@ class LuaRuntimeError(RuntimeError):
     def __init__(self, message: str) -> None:
         self.message = message
         super().__init__(message)
+
+
+class ResultTooLargeError(LuaRuntimeError):
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+
+
+class ExecutionLimitError(LuaRuntimeError):
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
@@ -0,0 +1,207 @@
+import os
+import hmac
+import hashlib
+import threading
+
+from lupa import LuaRuntime  # type: ignore
+from typing import Optional
+
+from ._exceptions import LuaRuntimeError
+
+# Per-user, outside any flow directory: a flow can be cloned from anywhere,
+# and bytecode from it would be loaded without the checks source goes through.
+default_cache_dir = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'rflow', 'bytecode')
+
+_key_file = 'key'
+_mac_size = hashlib.sha256().digest_size
+
+_compile_code = """
+function(source, chunkname)
+    local fn, err = load(source, chunkname, 't')
+    if not fn then error(err, 0) end
+    return string.dump(fn)
+end
+"""
+
+
+class ChunkCache:
+    """
+    Compiled Lua chunks keyed by a hash of their source.
+
+    Compilation happens in a private runtime that never runs user code, so the
+    sandboxes only ever see bytecode produced here. Entries live in memory and,
+    when `path` is given, on disk so the next process starts warm.
+
+    Crafted bytecode can escape the Lua VM, so the disk cache has to prove
+    each entry came from here: `path` must be a directory only this user can
+    access, and every entry is signed with a random key kept in it. Entries
+    that fail the check are ignored and compiled again. Beyond `max_entries`
+    the least recently used entries are deleted.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 1000) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0  # disk entries that failed the signature check
+
+        self._lock = threading.Lock()
+        self._chunks: dict[str, bytes] = {}
+        self._files: dict[tuple[str, int, int], str] = {}
+
+        self._runtime = LuaRuntime(encoding=None)
+        self._compile = self._runtime.eval(_compile_code)
+        self._version: bytes = self._runtime.eval('_VERSION')
+
+        self._secret: Optional[bytes] = None
+        self._writes = 0
+        if path:
+            self._secret = _open_store(path)
+            if self._secret is None:
+                self.path = None  # not private to us; keep to memory
+            else:
+                self._prune()
+
+    def key(self, source: str | bytes, chunkname: str) -> str:
+        if isinstance(source, str):
+            source = source.encode()
+        digest = hashlib.sha256(self._version)
+        digest.update(chunkname.encode() + b'\0')
+        digest.update(source)
+        return digest.hexdigest()
+
+    def get(self, source: str | bytes, chunkname: str) -> tuple[str, bytes]:
+        """Returns the cache key and bytecode for `source`, compiling it if needed."""
+        key = self.key(source, chunkname)
+        return key, self._lookup(key, source, chunkname)
+
+    def get_file(self, filename: str, chunkname: str) -> tuple[str, bytes]:
+        """Like `get`, but skips re-hashing files whose size and mtime did not change."""
+        st = os.stat(filename)
+        ident = (os.path.abspath(filename), st.st_mtime_ns, st.st_size)
+
+        key = self._files.get(ident)
+        if key is not None and key in self._chunks:
+            self.hits += 1
+            return key, self._chunks[key]
+
+        with open(filename, 'rb') as f:
+            source = f.read()
+        key, chunk = self.get(source, chunkname)
+        self._files[ident] = key
+        return key, chunk
+
+    def _lookup(self, key: str, source: str | bytes, chunkname: str) -> bytes:
+        chunk = self._chunks.get(key)
+        if chunk is None and self.path:
+            chunk = self._read(key)
+            if chunk is not None:
+                self._chunks[key] = chunk
+        if chunk is not None:
+            self.hits += 1
+            return chunk
+
+        self.misses += 1
+        with self._lock:
+            try:
+                if isinstance(source, str):
+                    source = source.encode()
+                chunk = self._compile(source, chunkname.encode())
+            except Exception as e:
+                message = str(e).splitlines()[0]
+                raise LuaRuntimeError(
+                    f'Error compiling {chunkname.lstrip("=@")}: {message}')
+        self._chunks[key] = chunk
+        if self.path:
+            self._write(key, chunk)
+        return chunk
+
+    def _sign(self, key: str, chunk: bytes) -> bytes:
+        # Covers the key too, so a valid entry can't be renamed to stand in for other source.
+        return hmac.new(self._secret, key.encode() + b'\0' + chunk, hashlib.sha256).digest()  # type: ignore
+
+    def _read(self, key: str) -> Optional[bytes]:
+        file = os.path.join(self.path, f'{key}.luac')  # type: ignore
+        try:
+            with open(file, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        mac, chunk = data[:_mac_size], data[_mac_size:]
+        if len(mac) != _mac_size or not hmac.compare_digest(mac, self._sign(key, chunk)):
+            self.rejected += 1
+            return None
+        try:
+            os.utime(file)  # recently used, for pruning
+        except OSError:
+            pass
+        return chunk
+
+    def _write(self, key: str, chunk: bytes):
+        target = os.path.join(self.path, f'{key}.luac')  # type: ignore
+        tmp = f'{target}.{os.getpid()}.tmp'
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self._sign(key, chunk) + chunk)
+            os.replace(tmp, target)
+        except OSError:
+            return
+        self._writes += 1
+        if self._writes % 50 == 0:
+            self._prune()
+
+    def _prune(self):
+        """Deletes the least recently used entries beyond `max_entries`."""
+        entries: list[tuple[int, str]] = []
+        try:
+            with os.scandir(self.path) as it:  # type: ignore
+                for entry in it:
+                    if entry.name.endswith('.luac'):
+                        try:
+                            entries.append((entry.stat().st_mtime_ns, entry.path))
+                        except OSError:
+                            pass
+        except OSError:
+            return
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, file in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(file)
+            except OSError:
+                pass
+
+
+def _open_store(path: str) -> Optional[bytes]:
+    """
+    Makes `path` a directory only this user can access and returns the key
+    entries there are signed with, creating it if needed. Returns None when
+    the directory can't be made private, e.g. because someone else owns it.
+    """
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.stat(path)
+        if hasattr(os, 'getuid'):
+            if st.st_uid != os.getuid():
+                return None
+            if st.st_mode & 0o077:
+                os.chmod(path, 0o700)
+
+        file = os.path.join(path, _key_file)
+        try:
+            fd = os.open(file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            with open(file, 'rb') as f:
+                secret = f.read()
+            return secret if len(secret) >= 32 else None
+        with os.fdopen(fd, 'wb') as f:
+            secret = os.urandom(32)
+            f.write(secret)
+        return secret
+    except OSError:
+        return None
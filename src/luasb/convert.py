@@ -0,0 +1,222 @@
+import json
+import lupa  # type: ignore
+
+from itertools import islice
+
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, Optional, TextIO
+
+from ._exceptions import ResultTooLargeError
+
+_scalar_types = (str, int, float, bool, type(None))
+
+
+@dataclass
+class ResultLimits:
+    max_depth: int = 64
+    max_nodes: int = 100_000
+    max_bytes: int = 10 * 1024 * 1024  # 10mb
+
+
+class _Budget:
+    def __init__(self, limits: ResultLimits) -> None:
+        self.limits = limits
+        self.nodes = 0
+        self.bytes = 0
+
+    def node(self, depth: int, count: int = 1):
+        self.nodes += count
+        if self.nodes > self.limits.max_nodes:
+            raise ResultTooLargeError(
+                f'Result has more than {self.limits.max_nodes} values')
+        if depth > self.limits.max_depth:
+            raise ResultTooLargeError(
+                f'Result is nested deeper than {self.limits.max_depth} levels')
+
+    def size(self, value: Any):
+        if isinstance(value, (str, bytes)):
+            self.bytes += len(value)
+        else:
+            self.bytes += 8
+        self.check_bytes()
+
+    def remaining(self) -> int:
+        return self.limits.max_nodes - self.nodes
+
+    def check_bytes(self):
+        if self.bytes > self.limits.max_bytes:
+            raise ResultTooLargeError(
+                f'Result is larger than {self.limits.max_bytes} bytes')
+
+
+def _is_table(value: Any) -> bool:
+    return lupa.lua_type(value) == 'table'
+
+
+def _scalar(value: Any) -> Any:
+    if isinstance(value, _scalar_types):
+        return value
+    if isinstance(value, bytes):
+        return value.decode(errors='replace')
+    return str(value)
+
+
+def _entries(
+    table: Any,
+    materialize: Optional[Callable[[Any], None]],
+    limit: int
+) -> tuple[bool, list[tuple[Any, Any]]]:
+    """
+    Returns whether `table` is a sequence (keys 1..n) and its entries, in
+    order for sequences. Stops listing after `limit + 1` entries, which is
+    already over budget, so a huge table is never copied out whole.
+    """
+    if materialize:
+        materialize(table)
+    items = list(islice(table.items(), limit + 1))
+    if not items:
+        return False, items
+
+    for key, _ in items:
+        if type(key) is not int or not 1 <= key <= len(items):
+            return False, items
+    # n distinct integer keys, all within 1..n: a proper sequence.
+    items.sort(key=lambda item: item[0])
+    return True, items
+
+
+def lua_to_python(
+    table: Any,
+    limits: Optional[ResultLimits] = None,
+    materialize: Optional[Callable[[Any], None]] = None
+) -> Any:
+    """
+    Converts a Lua table to dicts and lists without recursing in Python.
+
+    Sequences become lists; everything else becomes a dict. Raises
+    `ResultTooLargeError` as soon as one of the limits is exceeded.
+    """
+    if not _is_table(table):
+        return {}
+    budget = _Budget(limits or ResultLimits())
+    root: Any = None
+    # Children are only listed once popped, after their depth is checked,
+    # and never past what's left of the node budget.
+    stack: list[tuple[Any, int, Any, Any]] = [(table, 0, None, None)]
+    max_bytes = budget.limits.max_bytes
+    # Hot loop: limits are charged per table and sizes summed inline.
+    while stack:
+        table, depth, parent, parent_key = stack.pop()
+        budget.node(depth + 1, 0)
+        is_list, items = _entries(table, materialize, budget.remaining())
+        budget.node(depth + 1, len(items))
+        target: Any = [None] * len(items) if is_list else {}
+        if parent is None:
+            root = target
+        else:
+            parent[parent_key] = target
+        size = 0
+        for index, (key, value) in enumerate(items):
+            if is_list:
+                key = index
+            elif type(key) is str:
+                size += len(key)
+            else:
+                size += 8
+                key = _scalar(key)
+
+            if type(value) is str:
+                size += len(value)
+                target[key] = value
+            elif isinstance(value, _scalar_types):
+                size += 8
+                target[key] = value
+            elif _is_table(value):
+                target[key] = None
+                stack.append((value, depth + 1, target, key))
+            else:
+                value = _scalar(value)
+                size += len(value)
+                target[key] = value
+
+            if size > max_bytes:
+                break
+        budget.bytes += size
+        budget.check_bytes()
+    return root
+
+
+def iter_json(
+    table: Any,
+    limits: Optional[ResultLimits] = None,
+    materialize: Optional[Callable[[Any], None]] = None
+) -> Iterator[str]:
+    """Yields a Lua table as JSON text fragments, with the same shape and limits as `lua_to_python`."""
+    if not _is_table(table):
+        yield '{}'
+        return
+    budget = _Budget(limits or ResultLimits())
+
+    def open_table(table: Any, depth: int) -> tuple[bool, Iterator[tuple[Any, Any]], int]:
+        budget.node(depth + 1, 0)
+        is_list, items = _entries(table, materialize, budget.remaining())
+        if len(items) > budget.remaining():
+            budget.node(depth + 1, len(items))
+        return is_list, iter(items), depth
+
+    frame = open_table(table, 0)
+    stack = [frame]
+    first = True
+    yield '[' if frame[0] else '{'
+    while stack:
+        is_list, items, depth = stack[-1]
+        entry = next(items, None)
+        if entry is None:
+            stack.pop()
+            first = False
+            yield ']' if is_list else '}'
+            continue
+
+        key, value = entry
+        budget.node(depth + 1)
+        if not first:
+            yield ','
+        first = False
+        if not is_list:
+            budget.size(key)
+            yield json.dumps(str(_scalar(key))) + ':'
+
+        if _is_table(value):
+            frame = open_table(value, depth + 1)
+            stack.append(frame)
+            first = True
+            yield '[' if frame[0] else '{'
+        else:
+            value = _scalar(value)
+            budget.size(value)
+            yield json.dumps(value)
+
+
+def write_json(
+    table: Any,
+    fp: TextIO,
+    limits: Optional[ResultLimits] = None,
+    materialize: Optional[Callable[[Any], None]] = None,
+    buffer_size: int = 64 * 1024
+) -> int:
+    """Streams a Lua table to `fp` as JSON in `buffer_size` writes. Returns the characters written."""
+    parts: list[str] = []
+    pending = 0
+    written = 0
+    for part in iter_json(table, limits, materialize):
+        parts.append(part)
+        pending += len(part)
+        if pending >= buffer_size:
+            fp.write(''.join(parts))
+            written += pending
+            parts.clear()
+            pending = 0
+    if parts:
+        fp.write(''.join(parts))
+        written += pending
+    return written
@@ -0,0 +1,226 @@
+import os
+import sys
+import time
+import pickle
+import signal
+import selectors
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from .sandbox import LuaSandbox, variable
+from .bytecode import ChunkCache
+from .limits import ExecutionMetrics
+from .profile import Profile
+from ._exceptions import LuaRuntimeError
+
+try:
+    import resource
+except ImportError:  # not on Windows, where fork isn't either
+    resource = None  # type: ignore
+
+
+@dataclass
+class ForkResult:
+    ok: bool
+    result: Any = None
+    error: Optional[str] = None
+    metrics: ExecutionMetrics = field(default_factory=ExecutionMetrics)
+    output: list[str] = field(default_factory=list)
+    profile: Optional[Profile] = None
+    elapsed: float = 0.0  # wall time from fork to result, in the parent
+
+
+def _address_space() -> Optional[int]:
+    """Bytes of address space this process maps now, where /proc tells us."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def _signal_error(status: int) -> str:
+    if os.WIFSIGNALED(status):
+        signum = os.WTERMSIG(status)
+        if signum == signal.SIGXCPU:
+            return 'Script stopped: CPU time limit exceeded'
+        return f'Script process killed by {signal.Signals(signum).name}'
+    return f'Script process exited with status {os.WEXITSTATUS(status)}'
+
+
+class ForkServer:
+    """
+    Runs each execution in a forked copy of a warm, hardened template sandbox.
+
+    The template is built once in this process: modules preloaded, globals
+    hardened and the script compiled. Every run forks it, so the child starts
+    with all of that copy-on-write and is thrown away afterwards. Nothing one
+    run does can leak into the next. `cpu_seconds` and `memory_bytes` cap
+    each child with rlimits; `memory_bytes` is headroom above what the
+    template already maps. `kill_after` is a wall-clock backstop enforced
+    from the parent.
+
+    Needs `os.fork`; call from a process without other threads running.
+    """
+
+    def __init__(
+        self,
+        code: str,
+        cpu_seconds: Optional[float] = None,
+        memory_bytes: Optional[int] = None,
+        kill_after: Optional[float] = None,
+        print_fn: Optional[Callable[[str], None]] = None,
+        **sandbox_options: Any
+    ) -> None:
+        if not hasattr(os, 'fork'):
+            raise RuntimeError('Fork-server mode needs os.fork, which this platform lacks')
+
+        self.code = code
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.kill_after = kill_after
+        self.forks = 0
+
+        sandbox_options.setdefault('preload_modules', True)
+        if sandbox_options.get('chunk_cache') is None:
+            sandbox_options['chunk_cache'] = ChunkCache()  # in memory; needed to keep the compiled chunk
+        self.template = LuaSandbox(print_fn=print_fn, **sandbox_options)
+        # Compiled here so children find the function already loaded.
+        self.template.load_chunk(code)
+        self._base_address_space = _address_space()
+
+    def _limit(self):
+        if resource is None:
+            return
+        if self.cpu_seconds is not None:
+            used = resource.getrusage(resource.RUSAGE_SELF)
+            seconds = int(used.ru_utime + used.ru_stime + self.cpu_seconds) + 1
+            resource.setrlimit(resource.RLIMIT_CPU, (seconds, seconds + 1))
+        if self.memory_bytes is not None and self._base_address_space is not None:
+            # Only the soft limit, so it can be lifted again to send the reply.
+            _, hard = resource.getrlimit(resource.RLIMIT_AS)
+            resource.setrlimit(resource.RLIMIT_AS, (self._base_address_space + self.memory_bytes, hard))
+
+    def _unlimit_memory(self):
+        if resource is not None and self.memory_bytes is not None:
+            _, hard = resource.getrlimit(resource.RLIMIT_AS)
+            resource.setrlimit(resource.RLIMIT_AS, (hard, hard))
+
+    def _child(self, values: dict[str, variable], write_fd: int):
+        status = 0
+        try:
+            self._limit()
+            sb = self.template
+            sb.inject_values(values)
+            try:
+                sb.execute(self.code)
+                reply = ForkResult(True, sb.Result)
+            except LuaRuntimeError as e:
+                error = e.message
+                if isinstance(e.__context__, MemoryError) and self.memory_bytes is not None:
+                    error = 'Script stopped: memory limit exceeded'
+                reply = ForkResult(False, error=error)
+            self._unlimit_memory()
+            reply.metrics = sb.metrics
+            reply.output = sb.output
+            reply.profile = sb.last_profile()
+            sys.stdout.flush()
+            data = pickle.dumps(reply)
+        except MemoryError:
+            self._unlimit_memory()
+            data = pickle.dumps(ForkResult(False, error='Script stopped: memory limit exceeded'))
+        except BaseException as e:
+            data = pickle.dumps(ForkResult(False, error=f'{type(e).__name__}: {e}'))
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(write_fd, view):]
+        except BaseException:
+            status = 1
+        os._exit(status)
+
+    def _fork(self, values: dict[str, variable]) -> tuple[int, int]:
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            self._child(values, write_fd)
+        os.close(write_fd)
+        self.forks += 1
+        return pid, read_fd
+
+    def run(self, values: dict[str, variable]) -> ForkResult:
+        """Runs the script once in a fresh child with `values` injected."""
+        for _, result in self.map([values], 1):
+            return result
+        raise AssertionError('map yields one result per item')
+
+    def map(self, items: Iterable[dict[str, variable]], concurrency: int = 1) -> Iterator[tuple[int, ForkResult]]:
+        """Runs the script once per item, `concurrency` children at a time. Yields `(index, result)` as runs finish."""
+        pending = iter(enumerate(items))
+        running: dict[int, tuple[int, int, float, list[bytes]]] = {}  # fd -> pid, index, start, chunks
+        selector = selectors.DefaultSelector()
+        try:
+            while True:
+                while len(running) < concurrency:
+                    item = next(pending, None)
+                    if item is None:
+                        break
+                    index, values = item
+                    start = time.perf_counter()
+                    pid, fd = self._fork(values)
+                    running[fd] = (pid, index, start, [])
+                    selector.register(fd, selectors.EVENT_READ)
+                if not running:
+                    return
+
+                timeout = None
+                if self.kill_after is not None:
+                    oldest = min(start for _, _, start, _ in running.values())
+                    timeout = max(0.0, oldest + self.kill_after - time.perf_counter())
+                events = selector.select(timeout)
+                if not events:
+                    self._kill_overdue(running)
+                    continue
+
+                for key, _ in events:
+                    fd = key.fd
+                    chunk = os.read(fd, 1 << 16)
+                    if chunk:
+                        running[fd][3].append(chunk)
+                        continue
+                    selector.unregister(fd)
+                    os.close(fd)
+                    pid, index, start, chunks = running.pop(fd)
+                    yield index, self._collect(pid, start, b''.join(chunks))
+        finally:
+            for fd, (pid, *_) in running.items():
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                os.close(fd)
+            selector.close()
+
+    def _kill_overdue(self, running: dict[int, tuple[int, int, float, list[bytes]]]):
+        now = time.perf_counter()
+        for pid, _, start, _ in running.values():
+            if now - start >= self.kill_after:  # type: ignore
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def _collect(self, pid: int, start: float, data: bytes) -> ForkResult:
+        _, status = os.waitpid(pid, 0)
+        elapsed = time.perf_counter() - start
+        if data:
+            try:
+                result: ForkResult = pickle.loads(data)
+                result.elapsed = elapsed
+                return result
+            except Exception:
+                pass
+        if os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGKILL and \
+                self.kill_after is not None and elapsed >= self.kill_after:
+            return ForkResult(False, error='Script stopped: wall time limit exceeded', elapsed=elapsed)
+        return ForkResult(False, error=_signal_error(status), elapsed=elapsed)
@@ -0,0 +1,137 @@
+import time
+
+from dataclasses import dataclass, asdict
+from typing import Any, Optional
+
+
+# Built before `debug` is removed from the globals. The count hook charges
+# `interval` instructions per call, samples the heap, feeds the profiler when
+# one is attached and, every few calls, asks Python whether the deadline passed. Once a limit trips, the hook fires on
+# every instruction so a script cannot pcall its way past it. Coroutines get
+# the hook too, since debug.sethook only applies to one thread.
+_hook_code = """
+local sethook, gc, error = debug.sethook, collectgarbage, error
+local create, resume, pack, unpack = coroutine.create, coroutine.resume, table.pack, table.unpack
+local state = { count = 0, limit = 0, interval = 1000, peak = 0, ticks = 0, every = 10 }
+local hook
+
+hook = function()
+    local s = state
+    s.count = s.count + s.interval
+    local mem = gc('count')
+    if mem > s.peak then s.peak = mem end
+    if s.sample then s.sample() end
+
+    if s.tripped then
+        error(s.tripped, 0)
+    end
+    if s.limit > 0 and s.count > s.limit then
+        s.tripped = 'instruction limit exceeded'
+    elseif s.check then
+        s.ticks = s.ticks + 1
+        if s.ticks >= s.every then
+            s.ticks = 0
+            if s.check() then s.tripped = 'time limit exceeded' end
+        end
+    end
+    if s.tripped then
+        sethook(hook, '', 1)
+        error(s.tripped, 0)
+    end
+end
+
+local function arm(limit, interval, check)
+    state.count, state.limit, state.interval = 0, limit, interval
+    state.peak, state.ticks, state.tripped, state.check = gc('count'), 0, nil, check
+    state.active = true
+    sethook(hook, '', interval)
+end
+
+
+local function hooked_create(f)
+    local co = create(f)
+    if state.active then sethook(co, hook, '', state.interval) end
+    return co
+end
+
+coroutine.create = hooked_create
+coroutine.wrap = function(f)
+    local co = hooked_create(f)
+    return function(...)
+        local r = pack(resume(co, ...))
+        if not r[1] then error(r[2], 0) end
+        return unpack(r, 2, r.n)
+    end
+end
+
+return arm, sethook, state
+"""
+
+
+@dataclass
+class ExecutionMetrics:
+    instructions: int = 0  # a lower bound, counted in whole steps of `instruction_step`
+    instruction_step: int = 0
+    peak_memory: int = 0  # bytes
+    wall_time: float = 0.0  # seconds
+    output_bytes: int = 0
+
+    @property
+    def instructions_label(self) -> str:
+        """The count for display. The hook can't see the last, partial step, so it's shown as a bound."""
+        if self.instruction_step <= 1:
+            return str(self.instructions)
+        if self.instructions == 0:
+            return f'<{self.instruction_step}'
+        return f'≥{self.instructions}'
+
+    def as_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class Meter:
+    """Instruction/time budget and accounting for one runtime, installed from trusted code."""
+
+    def __init__(
+        self,
+        runtime: Any,
+        max_instructions: Optional[int] = None,
+        timeout: Optional[float] = None,
+        interval: int = 1000
+    ) -> None:
+        self.max_instructions = max_instructions
+        self.timeout = timeout
+        self.interval = interval
+        # Stopping goes through the C function and plain table reads: once a
+        # limit tripped, any Lua function we called would trip it again.
+        self._arm, self._sethook, self._state = runtime.execute(_hook_code)
+        self._collectgarbage = runtime.globals().collectgarbage
+        self._deadline = 0.0
+        self._start = 0.0
+
+    def set_sampler(self, sample: Any):
+        """Has the hook also call `sample`, a trusted Lua function, on every tick."""
+        self._state.sample = sample
+
+    def _past_deadline(self) -> bool:
+        return time.monotonic() > self._deadline
+
+    def start(self):
+        self._start = time.perf_counter()
+        check = None
+        if self.timeout is not None:
+            self._deadline = time.monotonic() + self.timeout
+            check = self._past_deadline
+        self._arm(self.max_instructions or 0, self.interval, check)
+
+    def stop(self, metrics: ExecutionMetrics) -> Optional[str]:
+        """Removes the hook, fills in `metrics` and returns the limit that tripped, if any."""
+        self._sethook()
+        self._state.active = False
+        count, peak, tripped = self._state.count, self._state.peak, self._state.tripped
+        peak = max(peak, self._collectgarbage('count'))
+        metrics.wall_time = time.perf_counter() - self._start
+        metrics.instructions = int(count)
+        metrics.instruction_step = self.interval
+        metrics.peak_memory = int(peak * 1024)
+        return tripped
@@ -0,0 +1,193 @@
+from typing import Any
+
+_scalar_types = (str, int, float, bool, bytes, type(None))
+
+# Proxies are empty tables whose metatable pulls children out of Python on
+# first access and keeps them in a side cache. Anything that needs the real
+# contents (a write, pairs, `#` on a dict, or `materialize` itself) copies
+# them in with rawset and drops the metamethods' state, so from then on the
+# proxy is an ordinary table. `install` swaps in versions of next and the raw*
+# functions that materialize a proxy before looking at it raw, so scripts can't
+# tell it from an eager table.
+_proxy_code = """
+local setmetatable, rawget, rawset, rawlen, next, ipairs = setmetatable, rawget, rawset, rawlen, next, ipairs
+local proxies = setmetatable({}, { __mode = 'k' })
+
+local function materialize(t)
+    local state = proxies[t]
+    if not state then return end
+    proxies[t] = nil
+    local cache, fetch = state.cache, state.fetch
+    for _, k in ipairs(state.keys()) do
+        local v = cache[k]
+        if v == nil then v = fetch(k) end
+        rawset(t, k, v)
+    end
+end
+
+-- `length` is only known up front for lists without holes; otherwise `#`
+-- gives the border of the materialized table, like an eager one.
+local function make_proxy(fetch, keys, length)
+    local cache = {}
+    local t = setmetatable({}, {
+        __index = function(t, k)
+            if not proxies[t] then return nil end
+            local v = cache[k]
+            if v == nil then
+                v = fetch(k)
+                cache[k] = v
+            end
+            return v
+        end,
+        __newindex = function(t, k, v)
+            materialize(t)
+            rawset(t, k, v)
+        end,
+        __len = function(t)
+            if length and proxies[t] then return length end
+            materialize(t)
+            return rawlen(t)
+        end,
+        __pairs = function(t)
+            materialize(t)
+            return next, t, nil
+        end,
+    })
+    proxies[t] = { fetch = fetch, keys = keys, cache = cache }
+    return t
+end
+
+local function install(G)
+    G.next = function(t, k)
+        if proxies[t] then materialize(t) end
+        return next(t, k)
+    end
+    G.rawget = function(t, k)
+        if proxies[t] then materialize(t) end
+        return rawget(t, k)
+    end
+    G.rawlen = function(t)
+        if proxies[t] then materialize(t) end
+        return rawlen(t)
+    end
+    G.rawset = function(t, k, v)
+        if proxies[t] then materialize(t) end
+        return rawset(t, k, v)
+    end
+end
+
+return make_proxy, materialize, install
+"""
+
+
+def _scalar(value: Any) -> Any:
+    if isinstance(value, _scalar_types):
+        return value
+    # Anything else (TOML datetimes and the like) reaches scripts as text,
+    # never as a Python object.
+    return str(value)
+
+
+def _is_flat(value: dict[Any, Any] | list[Any] | tuple[Any, ...]) -> bool:
+    values = value.values() if isinstance(value, dict) else value
+    return all(isinstance(v, _scalar_types) for v in values)
+
+
+# lupa's recursive table_from recurses in C with no depth check.
+_max_native_depth = 64
+
+
+def _native_safe(value: Any) -> bool:
+    """Whether `value` only holds plain scalars and is shallow enough for `table_from`."""
+    stack = [(value, 1)]
+    while stack:
+        container, depth = stack.pop()
+        if depth > _max_native_depth:
+            return False
+        values = container.values() if isinstance(container, dict) else container
+        for item in values:
+            if isinstance(item, (dict, list, tuple)):
+                stack.append((item, depth + 1))
+            elif not isinstance(item, _scalar_types):
+                return False
+    return True
+
+
+def to_lua(runtime: Any, value: Any) -> Any:
+    """
+    Builds Lua tables for a tree of Python dicts, lists and scalars.
+
+    Lists become 1-based sequences and None becomes nil, matching what
+    `json.decode` used to produce. Plain trees are converted by lupa in one
+    call; deep trees and odd scalars go through an iterative builder, so they
+    cannot exhaust the stack either.
+    """
+    if not isinstance(value, (dict, list, tuple)):
+        return _scalar(value)
+
+    if _native_safe(value):
+        try:
+            return runtime.table_from(value, recursive=True)
+        except TypeError:
+            pass  # lupa < 2.1 has no recursive mode
+
+    root = runtime.table()
+    stack = [(value, root)]
+    while stack:
+        source, target = stack.pop()
+        items = source.items() if isinstance(source, dict) else enumerate(source, 1)
+        for key, item in items:
+            if isinstance(item, (dict, list, tuple)):
+                if _is_flat(item):
+                    target[key] = runtime.table_from(item)
+                    continue
+                child = runtime.table()
+                target[key] = child
+                stack.append((item, child))
+            elif item is not None:
+                target[key] = _scalar(item)
+    return root
+
+
+class LazyMarshaller:
+    """
+    Hands Python containers to Lua as proxies that convert sub-trees on first
+    access. `install` must run on the globals before scripts see a proxy.
+    """
+
+    def __init__(self, runtime: Any) -> None:
+        self.runtime = runtime
+        self.make_proxy, self.materialize, self.install = runtime.execute(_proxy_code)
+
+    def to_lua(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return self._dict_proxy(value)
+        if isinstance(value, (list, tuple)):
+            return self._list_proxy(value)
+        return _scalar(value)
+
+    def _dict_proxy(self, value: dict[Any, Any]) -> Any:
+        def fetch(key: Any) -> Any:
+            if key not in value:
+                return None
+            return self.to_lua(value[key])
+
+        def keys() -> Any:
+            return self.runtime.table_from(list(value.keys()))
+
+        return self.make_proxy(fetch, keys, None)
+
+    def _list_proxy(self, value: list[Any] | tuple[Any, ...]) -> Any:
+        def fetch(key: Any) -> Any:
+            if not isinstance(key, (int, float)) or key != int(key):
+                return None
+            index = int(key) - 1
+            if not 0 <= index < len(value):
+                return None
+            return self.to_lua(value[index])
+
+        def keys() -> Any:
+            return self.runtime.table_from(range(1, len(value) + 1))
+
+        holes = any(item is None for item in value)
+        return self.make_proxy(fetch, keys, None if holes else len(value))
@@ -0,0 +1,120 @@
+import sys
+
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Callable, Optional, TextIO
+
+
+def truncation_marker(limit: int) -> str:
+    return f'--- output truncated after {limit} bytes ---'
+
+
+class OutputSink(ABC):
+    """Receives every line a script prints."""
+
+    @abstractmethod
+    def write(self, line: str):
+        ...
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class RingBufferSink(OutputSink):
+    """Keeps the last `max_lines` lines in memory."""
+
+    def __init__(self, max_lines: int = 1000) -> None:
+        self.buffer: deque[str] = deque(maxlen=max_lines)
+
+    def write(self, line: str):
+        self.buffer.append(line)
+
+    @property
+    def lines(self) -> list[str]:
+        return list(self.buffer)
+
+    def clear(self):
+        self.buffer.clear()
+
+
+class StreamSink(OutputSink):
+    """Writes lines to a file or pipe, batching them into one write per `flush_bytes`."""
+
+    def __init__(self, fp: TextIO, flush_bytes: int = 64 * 1024) -> None:
+        self.fp = fp
+        self.flush_bytes = flush_bytes
+        self._pending: list[str] = []
+        self._size = 0
+
+    def write(self, line: str):
+        self._pending.append(line)
+        self._size += len(line) + 1
+        if self._size >= self.flush_bytes:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self.fp.write('\n'.join(self._pending) + '\n')
+            self._pending.clear()
+            self._size = 0
+        self.fp.flush()
+
+
+class RawSink(StreamSink):
+    """Plain stdout output: no rich markup parsing, no per-line formatting."""
+
+    def __init__(self, flush_bytes: int = 8 * 1024) -> None:
+        super().__init__(sys.stdout, flush_bytes)
+
+
+class CallbackSink(OutputSink):
+    """Hands each line to a function, e.g. a rich console's print."""
+
+    def __init__(self, fn: Callable[[str], None]) -> None:
+        self.fn = fn
+
+    def write(self, line: str):
+        self.fn(line)
+
+
+class OutputCapture:
+    """Fans script output out to sinks and stops after `max_bytes` with a marker line."""
+
+    def __init__(
+        self,
+        sinks: Optional[list[OutputSink]] = None,
+        max_bytes: Optional[int] = None,
+        max_lines: int = 1000
+    ) -> None:
+        self.buffer = RingBufferSink(max_lines)
+        self.sinks = sinks or []
+        self.max_bytes = max_bytes
+        self.written = 0
+        self.truncated = False
+
+    def write(self, line: str) -> Optional[str]:
+        """Writes one line. Returns what was emitted: the line, the marker, or None once truncated."""
+        self.written += len(line.encode()) + 1
+        if self.truncated:
+            return None
+
+        if self.max_bytes is not None and self.written > self.max_bytes:
+            self.truncated = True
+            line = truncation_marker(self.max_bytes)
+
+        self.buffer.write(line)
+        for sink in self.sinks:
+            sink.write(line)
+        return line
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def reset(self):
+        self.buffer.clear()
+        self.written = 0
+        self.truncated = False
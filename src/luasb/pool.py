@@ -0,0 +1,137 @@
+import time
+import threading
+
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Iterator, Optional
+
+from .sandbox import LuaSandbox, variable
+
+
+@dataclass
+class PoolStats:
+    created: int = 0
+    recycled: int = 0
+    checkouts: int = 0
+    reuses: int = 0
+    checkout_time: float = 0.0
+    max_checkout_time: float = 0.0
+
+    @property
+    def avg_checkout_time(self) -> float:
+        return self.checkout_time / self.checkouts if self.checkouts else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        data = asdict(self)
+        data['avg_checkout_time'] = self.avg_checkout_time
+        return data
+
+
+class SandboxPool:
+    """
+    Keeps hardened `LuaSandbox` runtimes warm and hands them out one run at a time.
+
+    Runtimes are reset to their post-hardening snapshot when returned, and
+    replaced once they have served `max_uses` runs or hold more than
+    `max_memory_used` bytes.
+    """
+
+    def __init__(
+        self,
+        size: int = 4,
+        max_uses: int = 100,
+        max_memory_used: Optional[int] = None,
+        prewarm: bool = True,
+        **sandbox_options: Any
+    ) -> None:
+        self.size = size
+        self.max_uses = max_uses
+        self.max_memory_used = max_memory_used
+        self.sandbox_options = sandbox_options
+        self.sandbox_options.setdefault('preload_modules', True)
+
+        self.stats = PoolStats()
+        self._idle: list[LuaSandbox] = []
+        self._total = 0
+        self._cond = threading.Condition()
+
+        if prewarm:
+            for _ in range(size):
+                self._idle.append(self._create())
+
+    def _create(self) -> LuaSandbox:
+        sb = LuaSandbox(**self.sandbox_options)
+        with self._cond:
+            self._total += 1
+            self.stats.created += 1
+        return sb
+
+    def acquire(
+        self,
+        values: Optional[dict[str, variable]] = None,
+        print_fn: Optional[Callable[[str], None]] = None
+    ) -> LuaSandbox:
+        start = time.perf_counter()
+        with self._cond:
+            while not self._idle and self._total >= self.size:
+                self._cond.wait()
+            sb = self._idle.pop() if self._idle else None
+
+        if sb is None:
+            sb = self._create()
+
+        sb.print_fn = print_fn
+        if values:
+            sb.inject_values(values)
+
+        elapsed = time.perf_counter() - start
+        with self._cond:
+            self.stats.checkouts += 1
+            if sb.uses:
+                self.stats.reuses += 1
+            self.stats.checkout_time += elapsed
+            self.stats.max_checkout_time = max(
+                self.stats.max_checkout_time, elapsed)
+        return sb
+
+    def release(self, sb: LuaSandbox):
+        if self._should_recycle(sb):
+            with self._cond:
+                self._total -= 1
+                self.stats.recycled += 1
+            # Build the replacement now so the next checkout finds it warm.
+            replacement = self._create()
+            with self._cond:
+                self._idle.append(replacement)
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._idle.append(sb)
+            self._cond.notify()
+
+    def _should_recycle(self, sb: LuaSandbox) -> bool:
+        if sb.uses >= self.max_uses:
+            return True
+        try:
+            sb.reset()
+        except Exception:
+            return True
+        return self.max_memory_used is not None and sb.memory_used() > self.max_memory_used
+
+    @contextmanager
+    def checkout(
+        self,
+        values: Optional[dict[str, variable]] = None,
+        print_fn: Optional[Callable[[str], None]] = None
+    ) -> Iterator[LuaSandbox]:
+        sb = self.acquire(values, print_fn)
+        try:
+            yield sb
+        finally:
+            self.release(sb)
+
+    def close(self):
+        with self._cond:
+            self._total -= len(self._idle)
+            self._idle.clear()
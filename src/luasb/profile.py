@@ -0,0 +1,142 @@
+from dataclasses import dataclass, field
+from typing import Any, TextIO
+
+# Built before `debug` and `os` are removed from the globals. The meter's count
+# hook calls `sample` on every tick; it walks the stack of the running code and
+# charges the tick, the CPU time and the heap growth since the last tick to the
+# innermost function and line.
+_profile_code = """
+local getinfo, gc, clock, concat = debug.getinfo, collectgarbage, os.clock, table.concat
+local labels = setmetatable({}, { __mode = 'k' })
+local data, last_clock, last_mem
+
+local function label(info)
+    local l = labels[info.func]
+    if l then return l end
+    if info.what == 'C' then
+        l = '[C] ' .. (info.name or '?')
+    elseif info.what == 'main' then
+        l = 'main chunk (' .. info.short_src .. ')'
+    else
+        l = (info.name or '?') .. ' (' .. info.short_src .. ':' .. info.linedefined .. ')'
+    end
+    labels[info.func] = l
+    return l
+end
+
+local function add(t, k, v) t[k] = (t[k] or 0) + v end
+
+local function sample()
+    local now, mem = clock(), gc('count')
+    local dt, dm = now - last_clock, mem - last_mem
+    last_clock, last_mem = now, mem
+
+    -- Level 1 is this function and level 2 the meter's hook.
+    local frames, seen, n, site = {}, {}, 0, nil
+    local level = 3
+    while true do
+        local info = getinfo(level, 'Slnf')
+        if not info then break end
+        local l = label(info)
+        n = n + 1
+        frames[n] = l
+        if not site then
+            site = info.short_src .. ':' .. (info.currentline or 0)
+        end
+        if not seen[l] then
+            seen[l] = true
+            add(data.total, l, 1)
+        end
+        level = level + 1
+    end
+    if n == 0 then return end
+
+    -- Folded stacks go from the outermost frame in.
+    local stack = {}
+    for i = n, 1, -1 do stack[n - i + 1] = frames[i] end
+    add(data.stacks, concat(stack, ';'), 1)
+
+    local leaf = frames[1]
+    add(data.self, leaf, 1)
+    add(data.time, leaf, dt)
+    add(data.lines, site, 1)
+    add(data.line_time, site, dt)
+    if dm > 0 then
+        add(data.alloc, leaf, dm)
+        add(data.line_alloc, site, dm)
+    end
+    data.samples = data.samples + 1
+end
+
+local function start()
+    data = { stacks = {}, self = {}, total = {}, time = {}, alloc = {},
+             lines = {}, line_time = {}, line_alloc = {}, samples = 0 }
+    last_clock, last_mem = clock(), gc('count')
+end
+
+local function result() return data end
+
+start()
+return sample, start, result
+"""
+
+
+@dataclass
+class SiteStats:
+    site: str
+    samples: int = 0  # ticks where this was the innermost function or line
+    total: int = 0  # ticks where this function was anywhere on the stack
+    time: float = 0.0  # CPU seconds
+    alloc: float = 0.0  # KiB of heap growth
+
+
+@dataclass
+class Profile:
+    interval: int  # instructions per sample
+    samples: int = 0
+    stacks: dict[str, int] = field(default_factory=dict)
+    functions: list[SiteStats] = field(default_factory=list)
+    lines: list[SiteStats] = field(default_factory=list)
+
+    def write_folded(self, fp: TextIO):
+        """Writes the stacks in the folded format flamegraph.pl and speedscope read, weighted by instructions."""
+        for stack, count in sorted(self.stacks.items()):
+            fp.write(f'{stack} {count * self.interval}\n')
+
+
+def _table(table: Any) -> dict[Any, Any]:
+    return dict(table.items()) if table is not None else {}
+
+
+class Profiler:
+    """Samples a runtime through its `Meter`'s hook; see `LuaSandbox(profile=True)`."""
+
+    def __init__(self, runtime: Any, meter: Any) -> None:
+        self.interval = meter.interval
+        sample, self._start, self._result = runtime.execute(_profile_code)
+        meter.set_sampler(sample)
+
+    def start(self):
+        self._start()
+
+    def profile(self) -> Profile:
+        data = self._result()
+        profile = Profile(self.interval, int(data.samples), _table(data.stacks))
+
+        own, total = _table(data.self), _table(data.total)
+        time, alloc = _table(data.time), _table(data.alloc)
+        for name, count in own.items():
+            profile.functions.append(SiteStats(name, count, total.get(name, count),
+                                               time.get(name, 0.0), alloc.get(name, 0.0)))
+        for name, count in total.items():
+            if name not in own:
+                profile.functions.append(SiteStats(name, 0, count))
+
+        line_time, line_alloc = _table(data.line_time), _table(data.line_alloc)
+        for site, count in _table(data.lines).items():
+            profile.lines.append(SiteStats(site, count, count,
+                                           line_time.get(site, 0.0), line_alloc.get(site, 0.0)))
+
+        profile.functions.sort(key=lambda s: (s.samples, s.total), reverse=True)
+        profile.lines.sort(key=lambda s: s.samples, reverse=True)
+        return profile
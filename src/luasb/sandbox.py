@@ -1,12 +1,16 @@
 import os
-import lupa  # type: ignore
-import json
-
 from lupa import LuaRuntime  # type: ignore
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Optional, TextIO
 
+import tracing
 from . import modules as lmods
-from ._exceptions import LuaRuntimeError
+from .bytecode import ChunkCache
+from .marshal import LazyMarshaller, to_lua
+from .convert import ResultLimits, lua_to_python, write_json
+from .limits import ExecutionMetrics, Meter
+from .profile import Profile, Profiler
+from .output import OutputCapture, OutputSink
+from ._exceptions import LuaRuntimeError, ResultTooLargeError, ExecutionLimitError
 
 default_blocked_globals = [
     'require',
@@ -24,6 +28,49 @@ variable = dict[str, Any] | str
 
 _default_max_memory = 50 * 1024 * 1024  # 50mb
 
+# Built before the globals are hardened, so it can close over the real library
+# tables and `debug`. Calling the returned function puts the globals (and one
+# level of every library table, the string metatable and package.loaded) back
+# the way they were when the snapshot was taken, along with the metatables of
+# all of those tables.
+_snapshot_code = """
+local next, type, rawset = next, type, rawset
+local getmetatable, setmetatable = debug.getmetatable, debug.setmetatable
+local function copy(t)
+    local c = {}
+    for k, v in next, t do c[k] = v end
+    return c
+end
+return function(G, loaded)
+    local base, libs, mts = copy(G), {}, {}
+    for _, v in next, base do
+        if type(v) == 'table' and v ~= G then libs[v] = copy(v) end
+    end
+    local string_mt = getmetatable('')
+    if string_mt then libs[string_mt] = copy(string_mt) end
+    libs[loaded] = copy(loaded)
+    for _, v in next, loaded do
+        if type(v) == 'table' and v ~= G and not libs[v] then libs[v] = copy(v) end
+    end
+    for t in next, libs do mts[t] = getmetatable(t) or false end
+    local G_mt = getmetatable(G)
+    return function()
+        for k in next, G do
+            if base[k] == nil then rawset(G, k, nil) end
+        end
+        for k, v in next, base do rawset(G, k, v) end
+        for t, saved in next, libs do
+            for k in next, t do
+                if saved[k] == nil then rawset(t, k, nil) end
+            end
+            for k, v in next, saved do rawset(t, k, v) end
+            if getmetatable(t) ~= (mts[t] or nil) then setmetatable(t, mts[t] or nil) end
+        end
+        setmetatable(G, G_mt)
+    end
+end
+"""
+
 
 class LuaSandbox:
     def __init__(
@@ -31,13 +78,26 @@ class LuaSandbox:
         values: Optional[dict[str, variable]] = None,
         max_memory: int = _default_max_memory,
         blocked_globals: list[str] = default_blocked_globals,
-        print_fn: Optional[Callable[[str], None]] = None
+        print_fn: Optional[Callable[[str], None]] = None,
+        preload_modules: bool = False,
+        chunk_cache: Optional[ChunkCache] = None,
+        lazy_values: bool = False,
+        result_limits: Optional[ResultLimits] = None,
+        max_instructions: Optional[int] = None,
+        timeout: Optional[float] = None,
+        output_sinks: Optional[list[OutputSink]] = None,
+        max_output_bytes: Optional[int] = None,
+        output_lines: int = 1000,
+        profile: bool = False,
+        profile_interval: int = 1000,
+        modules_dir: Optional[str] = None
     ) -> None:
-        self.modules_path = f'{lmods.modules_dir}/?.lua'
+        self.modules_dir = modules_dir or lmods.modules_dir
+        self.modules_path = f'{self.modules_dir}/?.lua'
         self.blocked_globals = blocked_globals
 
         self.allowed_modules: list[str] = [os.path.splitext(
-            x)[0] for x in os.listdir(lmods.modules_dir)]
+            x)[0] for x in os.listdir(self.modules_dir)]
         self.allowed_modules.extend(["math", "utf8", "table"]) # TODO: Allow user customizations
 
         self.runtime = LuaRuntime(
@@ -46,14 +106,45 @@ class LuaSandbox:
             attribute_filter=self._filter_attr_access
         )
 
+        self.uses = 0
+        self.chunk_cache = chunk_cache
+        self.lazy_values = lazy_values
+        self.result_limits = result_limits or ResultLimits()
+        self.max_instructions = max_instructions
+        self.timeout = timeout
+        self.profile = profile
+        self.profile_interval = profile_interval
+        self.metrics = ExecutionMetrics()
+        self._output = OutputCapture(output_sinks, max_output_bytes, output_lines)
+        self._functions: dict[str, Any] = {}
+
         self.set_globals()
+        if preload_modules:
+            self.preload_modules()
+        self.snapshot()
+
         if values:
             self.inject_values(values)
-        
+
         self.print_fn = print_fn
 
     def set_globals(self):
         self._old_require = self.runtime.globals().require
+        self._loaded = self.runtime.eval('package.loaded')
+        self._preload = self.runtime.eval('package.preload')
+        self._load = self.runtime.globals().load
+        self._collectgarbage = self.runtime.globals().collectgarbage
+        self._make_snapshot = self.runtime.execute(_snapshot_code)
+        self._lazy = LazyMarshaller(self.runtime)
+        if self.lazy_values:
+            self._lazy.install(self.runtime.globals())
+        if self.profile:
+            self._meter = Meter(self.runtime, self.max_instructions, self.timeout,
+                                self.profile_interval)
+            self._profiler: Optional[Profiler] = Profiler(self.runtime, self._meter)
+        else:
+            self._meter = Meter(self.runtime, self.max_instructions, self.timeout)
+            self._profiler = None
 
         self.runtime.execute(
             f"package.path = '{self.modules_path};'")
@@ -64,59 +155,159 @@ class LuaSandbox:
 
         self.lua_globals = self.runtime.globals()
 
-        self.lua_globals.Result = {}
+        self.lua_globals.Result = self.runtime.table()
         self.Result = {}
-        self.output: list[str] = []
         self.lua_globals.print = self._print
         self.lua_globals.require = self._require
 
-    def inject_values(self, values: dict[str, variable]):
-        self.runtime.execute('json = require("json")')
+    def preload_modules(self):
+        """Requires every file module up front so the snapshot keeps them loaded."""
+        for modname in self.allowed_modules:
+            self._require(modname)
+
+    def snapshot(self):
+        """Records the current globals as the state `reset` returns to."""
+        self._restore = self._make_snapshot(self.lua_globals, self._loaded)
+
+    def reset(self):
+        """Discards everything a previous run left behind in the runtime."""
+        self._restore()
+        self.lua_globals.Result = self.runtime.table()
+        self.Result = {}
+        self._output.reset()
+        self.metrics = ExecutionMetrics()
 
+    @property
+    def output(self) -> list[str]:
+        """The most recent lines the script printed (up to `output_lines`)."""
+        return self._output.buffer.lines
+
+    @property
+    def output_truncated(self) -> bool:
+        return self._output.truncated
+
+    def memory_used(self) -> int:
+        """Returns the memory currently held by the Lua state, in bytes."""
+        return int(self._collectgarbage('count') * 1024)
+
+    def inject_values(self, values: dict[str, variable], lazy: Optional[bool] = None):
+        """
+        Sets each value as a Lua global, converting containers to tables.
+
+        With `lazy` (defaults to the sandbox's `lazy_values`) containers are
+        handed over as proxies and only the parts the script reads are converted.
+        Proxies need the sandbox to be created with `lazy_values=True`.
+        """
+        lazy = self.lazy_values if lazy is None else lazy
+        if lazy and not self.lazy_values:
+            raise ValueError('lazy values need a sandbox created with lazy_values=True')
         for name, value in values.items():
             if isinstance(value, str):
                 self.lua_globals[name] = value
+            elif lazy:
+                self.lua_globals[name] = self._lazy.to_lua(value)
             else:
-                code = f'{name} = json.decode([[{json.dumps(value)}]]);'
-                self.runtime.execute(code)
+                self.lua_globals[name] = to_lua(self.runtime, value)
 
-        self.lua_globals.json = None
+    def load_chunk(self, code: str, name: str = 'main.lua') -> Any:
+        """Returns `code` as a callable Lua function, going through the chunk cache if set."""
+        if not self.chunk_cache:
+            return self._trusted_load(code, f'={name}', 't')
 
-    def execute(self, code: str):
+        key, chunk = self.chunk_cache.get(code, f'={name}')
+        if key not in self._functions:
+            self._functions[key] = self._trusted_load(chunk, f'={name}', 'b')
+        return self._functions[key]
+
+    def _trusted_load(self, source: str | bytes, chunkname: str, mode: str) -> Any:
+        result = self._load(source, chunkname, mode)
+        if isinstance(result, tuple):
+            raise LuaRuntimeError(f'Error loading {chunkname[1:]}: {result[1]}')
+        return result
+
+    def execute(self, code: str, name: str = 'main.lua'):
+        self.uses += 1
+        self.metrics = ExecutionMetrics()
         try:
-            self.runtime.execute(code)
+            fn = self.load_chunk(code, name)
         except Exception as e:
             raise LuaRuntimeError(f'Error executing script: {e}')
 
+        if self._profiler:
+            self._profiler.start()
+        self._meter.start()
         try:
-            self.Result = self._lua_table_to_dict(self.lua_globals.Result)
+            fn()
+        except Exception as e:
+            tripped = self._meter.stop(self.metrics)
+            if tripped:
+                raise ExecutionLimitError(f'Script stopped: {tripped}')
+            raise LuaRuntimeError(f'Error executing script: {e}')
+        finally:
+            self._output.flush()
+        tripped = self._meter.stop(self.metrics)
+        if tripped:
+            raise ExecutionLimitError(f'Script stopped: {tripped}')
+
+        self._convert_result()
+
+    def _convert_result(self):
+        try:
+            self.Result = lua_to_python(
+                self.lua_globals.Result, self.result_limits, self._materialize_fn())
+        except ResultTooLargeError:
+            raise
         except Exception as e:
             raise LuaRuntimeError(f'Error parsing result')
 
+    def last_profile(self) -> Optional[Profile]:
+        """Where the last run spent its instructions, time and memory, if created with `profile`."""
+        return self._profiler.profile() if self._profiler else None
+
+    def write_result(self, fp: TextIO) -> int:
+        """Streams the script's `Result` to `fp` as JSON without building it in Python first."""
+        return write_json(self.lua_globals.Result, fp, self.result_limits,
+                          self._materialize_fn())
+
+    def _materialize_fn(self) -> Optional[Callable[[Any], None]]:
+        return self._lazy.materialize if self.lazy_values else None
+
     def _require(self, modname: str):
         if modname in self.allowed_modules:
+            if self.chunk_cache and self._loaded[modname] is None:
+                self._preload_from_cache(modname)
             return self._old_require(modname)
         raise LuaRuntimeError(f'Cannot import {modname}')
 
+    def _preload_from_cache(self, modname: str):
+        path = os.path.join(self.modules_dir, f'{modname}.lua')
+        if not os.path.isfile(path):
+            return
+
+        key, chunk = self.chunk_cache.get_file(path, f'@{path}')  # type: ignore
+        if key not in self._functions:
+            self._functions[key] = self._trusted_load(chunk, f'@{path}', 'b')
+        self._preload[modname] = self._functions[key]
+
     def _filter_attr_access(self, _: object, attr: str, __: bool):
         if attr.startswith('_'):
             raise LuaRuntimeError(f'Cannot access or modify attribute {attr}')
 
-    def _lua_table_to_dict(self, table: Any) -> dict[str, Any]:
-        if not table:
-            return {}
-
-        python_dict: dict[str, Any] = {}
-        for key, value in table.items():
-            if lupa.lua_type(value) == 'table':
-                python_dict[key] = self._lua_table_to_dict(value)
-            else:
-                python_dict[key] = value
+    def _print(self, *args: Any):  # type: ignore
+        line = ' '.join([str(arg) for arg in args])
+        written = self._output.written
+        emitted = self._output.write(line)
+        self.metrics.output_bytes += self._output.written - written
+        if emitted is not None and self.print_fn:
+            self.print_fn(emitted)
 
-        return python_dict
 
-    def _print(self, *args: Any):  # type: ignore
-        sep = ' '
-        self.output.append(sep.join(str(arg) for arg in args))
-        if self.print_fn:
-            self.print_fn(sep.join(str(arg) for arg in args))
\ No newline at end of file
+tracing.instrument(LuaSandbox, {
+    '__init__': 'sandbox.create',
+    'set_globals': 'sandbox.harden',
+    'preload_modules': 'sandbox.preload_modules',
+    'inject_values': 'sandbox.inject_values',
+    'load_chunk': 'sandbox.load_chunk',
+    'execute': 'sandbox.execute',
+    '_convert_result': 'sandbox.result',
+}, 'sandbox')
@@ -1,16 +1,45 @@
+import os
+import sys
 import click
 
 __version__ = "0.1.0"
 
-from auth import auth
-from flows import flows
+import tracing
+from lazycli import LazyGroup
 
-@click.group()
-def cli(): pass
 
+@click.group(cls=LazyGroup, lazy_commands={
+    'auth': ('auth:auth', "Log in, register and manage your account"),
+    'flows': ('flows:flows', "Create, test and publish flows"),
+    'bench': ('bench:bench', "Benchmark the sandbox and API client"),
+    'serve': ('serve:serve', "Serve local flows at hook-compatible URLs"),
+})
+@click.option('--no-cache', is_flag=True, envvar='RFLOW_NO_CACHE',
+              help="Always ask the API instead of using cached responses")
+@click.option('--trace', is_flag=True, envvar='RFLOW_TRACE',
+              help="Time each phase of the command, write a Chrome trace and print a summary")
+@click.option('--trace-file', default=tracing.default_trace_file, show_default=True,
+              envvar='RFLOW_TRACE_FILE', help="Where --trace writes the trace")
+@click.pass_context
+def cli(ctx: click.Context, no_cache: bool, trace: bool, trace_file: str):
+    if no_cache:
+        # Read when the shared client is first built (and by any subprocess).
+        os.environ['RFLOW_NO_CACHE'] = '1'
+    if trace:
+        tracing.enable(trace_file)
+        ctx.with_resource(tracing.span(_command_name(ctx.invoked_subcommand)))
+
+
+def _command_name(subcommand: str | None) -> str:
+    """`rflow flows test`: the subcommand and, for groups, the word after it, which click hasn't parsed yet."""
+    words = ['rflow']
+    if subcommand:
+        words.append(subcommand)
+        rest = sys.argv[sys.argv.index(subcommand) + 1:] if subcommand in sys.argv else []
+        if rest and not rest[0].startswith('-'):
+            words.append(rest[0])
+    return ' '.join(words)
 
-cli.add_command(auth)
-cli.add_command(flows)
 
 if __name__ == "__main__":
     cli()
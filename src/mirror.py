@@ -0,0 +1,144 @@
+import os
+import re
+import json
+import asyncio
+import toml
+
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+from rflow import AsyncRewriteFlow
+from rflow._models import Flow
+from rflow._exceptions import RewriteFlowError
+from flowconf import config_file, digest, read_flow_config, script_file
+
+manifest_file = os.path.join('.rflow', 'mirror.json')
+
+
+@dataclass
+class MirrorEntry:
+    flow: Flow
+    path: str  # relative to the mirror root
+    status: str  # 'new', 'updated', 'unchanged' or 'conflict'
+    error: Optional[str] = None
+
+
+def load_manifest(root: str) -> dict[str, dict[str, Any]]:
+    try:
+        with open(os.path.join(root, manifest_file), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_atomic(path: str, text: str):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def save_manifest(root: str, manifest: dict[str, dict[str, Any]]):
+    write_atomic(os.path.join(root, manifest_file),
+                 json.dumps(manifest, indent=2, sort_keys=True))
+
+
+def _directory_name(root: str, flow: Flow, taken: set[str]) -> str:
+    """A directory for a new flow that neither the manifest nor anything already on disk uses."""
+    name = re.sub(r'[^\w.-]+', '-', flow.name).strip('-.') or flow.id
+    candidate, attempt = name, 1
+    while candidate in taken or os.path.lexists(os.path.join(root, candidate)):
+        candidate = f'{name}-{flow.id}' if attempt == 1 else f'{name}-{flow.id}-{attempt}'
+        attempt += 1
+    return candidate
+
+
+def _local_code_hash(path: str) -> Optional[str]:
+    try:
+        with open(os.path.join(path, script_file), 'r') as f:
+            return digest(f.read())
+    except OSError:
+        return None
+
+
+def plan_mirror(root: str, flows: Iterable[Flow], manifest: dict[str, dict[str, Any]],
+                force: bool = False) -> list[MirrorEntry]:
+    """
+    Works out which listed flows need their code fetched: new ones, and ones
+    whose `last_modified` moved since the manifest was written. A flow whose
+    main.lua was edited locally is a conflict, left alone unless `force`. New
+    flows never reuse a directory that already exists.
+    """
+    taken = {entry['path'] for entry in manifest.values()}
+    entries: list[MirrorEntry] = []
+    for flow in flows:
+        known = manifest.get(flow.id)
+        if not known:
+            path = _directory_name(root, flow, taken)
+            taken.add(path)
+            entries.append(MirrorEntry(flow, path, 'new'))
+            continue
+
+        path = known['path']
+        local_hash = _local_code_hash(os.path.join(root, path))
+        if force or local_hash is None:
+            status = 'updated'
+        elif local_hash != known['code']:
+            status = 'conflict'
+        elif known['last_modified'] != flow.last_modified:
+            status = 'updated'
+        else:
+            status = 'unchanged'
+        entries.append(MirrorEntry(flow, path, status))
+    return entries
+
+
+def _write_flow(root: str, entry: MirrorEntry, code: str):
+    path = os.path.join(root, entry.path)
+    try:
+        fconf = read_flow_config(path)
+    except (OSError, ValueError):
+        fconf = {}
+    fconf['name'] = entry.flow.name
+    fconf['env'] = entry.flow.env
+    fconf['_rf'] = {'id': entry.flow.id}
+
+    # The config goes last so an interrupted write leaves the old ID pointing
+    # at files that are still consistent with the manifest.
+    write_atomic(os.path.join(path, script_file), code)
+    write_atomic(os.path.join(path, config_file), toml.dumps(fconf))
+
+
+async def _fetch(arf: AsyncRewriteFlow, root: str, entry: MirrorEntry,
+                 manifest: dict[str, dict[str, Any]]):
+    try:
+        code = await arf.get_my_code(entry.flow.id)
+        _write_flow(root, entry, code)
+    except RewriteFlowError as e:
+        entry.error = getattr(e, 'message', str(e))
+        return
+    except Exception as e:
+        entry.error = f'{type(e).__name__}: {e}'
+        return
+    manifest[entry.flow.id] = {
+        'path': entry.path,
+        'last_modified': entry.flow.last_modified,
+        'code': digest(code),
+    }
+
+
+def run_mirror(arf: AsyncRewriteFlow, root: str, entries: list[MirrorEntry],
+               manifest: dict[str, dict[str, Any]]):
+    """Fetches every new or updated flow concurrently and saves the manifest, even if some fail."""
+    pending = [entry for entry in entries if entry.status in ('new', 'updated')]
+
+    async def run():
+        async with arf:
+            await arf.map(lambda entry: _fetch(arf, root, entry, manifest), pending)
+
+    try:
+        if pending:
+            asyncio.run(run())
+    finally:
+        save_manifest(root, manifest)
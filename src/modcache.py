@@ -0,0 +1,137 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import httpx
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+default_cache_dir = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'rflow', 'modules')
+
+
+class ModuleCache:
+    """
+    User-level, content-addressed store for downloaded Lua modules.
+
+    Blobs are stored by the sha256 of their contents; `index.json` maps each
+    URL to its blob along with the ETag/Last-Modified needed to revalidate it.
+    """
+
+    def __init__(self, path: str = default_cache_dir) -> None:
+        self.path = path
+        self.index_path = os.path.join(path, 'index.json')
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(path, 'blobs'), exist_ok=True)
+
+        try:
+            with open(self.index_path, 'r') as f:
+                self.index: dict[str, dict[str, Any]] = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.path, 'blobs', digest)
+
+    def fetch(self, client: httpx.Client, url: str) -> str:
+        """Returns the blob path for `url`, downloading or revalidating as needed."""
+        entry = self.index.get(url)
+        headers: dict[str, str] = {}
+        if entry and self._intact(entry['sha256']):
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        else:
+            entry = None
+
+        try:
+            response = client.get(url, headers=headers, follow_redirects=True)
+        except httpx.TransportError:
+            if entry:  # offline: the cached copy is better than nothing
+                return self.blob_path(entry['sha256'])
+            raise
+
+        if response.status_code == 304 and entry:
+            return self.blob_path(entry['sha256'])
+        response.raise_for_status()
+
+        digest = hashlib.sha256(response.content).hexdigest()
+        path = self.blob_path(digest)
+        if not self._intact(digest):  # missing, or damaged since it was stored
+            tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(response.content)
+            # Blobs are hardlinked into flow directories; read-only keeps an
+            # in-place edit there from corrupting the shared copy.
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, path)
+
+        with self._lock:
+            self.index[url] = {
+                'sha256': digest,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')
+            }
+        return path
+
+    def _intact(self, digest: str) -> bool:
+        try:
+            with open(self.blob_path(digest), 'rb') as f:
+                return hashlib.sha256(f.read()).hexdigest() == digest
+        except OSError:
+            return False
+
+    def save(self):
+        with self._lock:
+            tmp = f'{self.index_path}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self.index, f, indent=2)
+            os.replace(tmp, self.index_path)
+
+
+def link_or_copy(source: str, target: str):
+    """Hardlinks `source` to `target`, falling back to a copy across filesystems."""
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def fetch_modules(
+    urls: dict[str, str],
+    cache: Optional[ModuleCache] = None,
+    client: Optional[httpx.Client] = None,
+    workers: int = 8
+) -> dict[str, str]:
+    """
+    Downloads `{url: target_path}` concurrently over one pooled client and
+    places each file from the cache. Returns the urls that failed, with errors.
+    """
+    cache = cache or ModuleCache()
+    own_client = client is None
+    client = client or httpx.Client(
+        limits=httpx.Limits(max_connections=workers, max_keepalive_connections=workers),
+        timeout=30
+    )
+
+    def fetch(url: str) -> Optional[str]:
+        try:
+            link_or_copy(cache.fetch(client, url), urls[url])  # type: ignore
+        except (httpx.HTTPError, OSError) as e:
+            return str(e).splitlines()[0]
+        return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            errors = dict(zip(urls, executor.map(fetch, urls)))
+    finally:
+        if own_client:
+            client.close()
+        cache.save()
+
+    return {url: error for url, error in errors.items() if error}
@@ -0,0 +1,221 @@
+import asyncio
+import importlib.util
+import httpx
+
+from typing import Any, Awaitable, Callable, Iterable, Optional, TypeVar, TYPE_CHECKING
+from urllib.parse import urlencode
+
+from tracing import span
+from ._http import check_response, route_name
+from ._cache import ResponseCache
+from ._upload import CodeStore, code_uploads, encode_body
+from ._retry import RetryPolicy, hedged_async, is_idempotent
+from ._exceptions import PreconditionFailedError, RewriteFlowError
+from ._models import User, Flow, PublicFlow, flow_list
+
+if TYPE_CHECKING:
+    from ._client import RewriteFlow
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class AsyncRewriteFlow:
+    """
+    Asynchronous counterpart of `RewriteFlow` for driving many flows at once.
+
+    Requests share one pooled `httpx.AsyncClient`; `max_concurrency` bounds how
+    many are in flight through `map`.
+    """
+    client: httpx.AsyncClient
+    _auth: str | None
+
+    def __init__(
+        self,
+        api_base_url: str,
+        auth: Optional[str] = None,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 20,
+        max_concurrency: int = 10,
+        http2: bool = False,
+        timeout: float = 30.0,
+        cache: Optional[ResponseCache] = None,
+        code_store: Optional[CodeStore] = None,
+        policy: Optional[RetryPolicy] = None
+    ) -> None:
+        if http2 and importlib.util.find_spec('h2') is None:
+            raise ImportError('HTTP/2 support needs the h2 package: pip install "httpx[http2]"')
+
+        self.client = httpx.AsyncClient(
+            base_url=api_base_url,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections
+            ),
+            http2=http2,
+            timeout=timeout
+        )
+        self._auth = auth
+        self.cache = cache
+        self.code_store = code_store
+        self.policy = policy or RetryPolicy(default_timeout=timeout)
+        self._features: Optional[frozenset[str]] = None
+        if auth:
+            self.client.headers['Authorization'] = auth
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    @classmethod
+    def from_client(cls, rf: 'RewriteFlow', **options: Any) -> 'AsyncRewriteFlow':
+        """Builds an async client with the same API base, credentials, caches and retry policy as `rf`."""
+        options.setdefault('cache', rf.cache)
+        options.setdefault('code_store', rf.code_store)
+        options.setdefault('policy', rf.policy)
+        arf = cls(str(rf.client.base_url), rf._auth, **options)
+        arf._features = rf._features
+        return arf
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_: Any):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def map(
+        self,
+        fn: Callable[[T], Awaitable[R]],
+        items: Iterable[T],
+        return_exceptions: bool = False
+    ) -> list[R | BaseException]:
+        """Runs `fn` over `items` with at most `max_concurrency` calls in flight, keeping order."""
+        async def bounded(item: T) -> R:
+            async with self.semaphore:
+                return await fn(item)
+
+        return await asyncio.gather(*(bounded(item) for item in items),
+                                    return_exceptions=return_exceptions)
+
+    async def me(self):
+        response = await self._request('get', '/auth/me')
+        return User.model_validate(response.json())
+
+    async def get_flow(self, flow_id: str):
+        response = await self._request('get', f'/flows/flow/{flow_id}')
+        return PublicFlow.model_validate(response.json())
+
+    async def get_my_flow(self, flow_id: str):
+        response = await self._request('get', f'/flows/my/{flow_id}')
+        return Flow.model_validate(response.json())
+
+    async def get_my_flows(self):
+        response = await self._request('get', f'/flows/list')
+        return flow_list.validate_json(response.content)
+
+    async def get_my_code(self, flow_id: str):
+        response = await self._request('get', f'/flows/my/{flow_id}/code')
+        code = response.json()
+        if self.code_store:
+            self.code_store.put(str(self.client.base_url), flow_id, code)
+        return code
+
+    async def update_flow(self, flow: Flow):
+        await self.update_flow_info(flow.id, flow.name, flow.env)
+
+    async def update_flow_info(self, flow_id: str, name: str, env: dict[str, str]):
+        await self._request('patch', f'/flows/update_info/{flow_id}', json={
+            'env': env.copy(),
+            'name': name
+        }, idempotent=True)
+
+    async def set_my_code(self, flow_id: str, code: str) -> str:
+        base_url = str(self.client.base_url)
+        base = self.code_store.get(base_url, flow_id) if self.code_store else None
+        features = await self.features()
+
+        for mode, data in code_uploads(flow_id, code, base, features):
+            try:
+                await self._request('patch', f'/flows/update', json=data, compress=True, idempotent=True)
+            except PreconditionFailedError:
+                if mode == 'full':
+                    raise
+                continue
+            if self.code_store:
+                self.code_store.put(base_url, flow_id, code)
+            return mode
+        raise AssertionError('code_uploads always ends with a full upload')
+
+    async def create_flow(self, name: str, env: dict[str, str], code: str):
+        data = {'name': name, 'env': env, 'code': code}
+        response = await self._request('post', '/flows/new', json=data, compress=True)
+        flow = Flow.model_validate(response.json())
+        if self.code_store:
+            self.code_store.put(str(self.client.base_url), flow.id, code)
+        return flow
+
+    async def get_lua_config(self):
+        response = await self._request('get', '/misc/lua_config')
+        return response.json()
+
+    async def features(self) -> frozenset[str]:
+        if self._features is None:
+            try:
+                self._features = frozenset((await self.get_lua_config()).get('features', []))
+            except (httpx.HTTPError, RewriteFlowError, ValueError):
+                self._features = frozenset()
+        return self._features
+
+    def get_hook_url(self, flow_id: str):
+        return f"{self.client.base_url}/flows/call/{flow_id}"
+
+    async def _request(self, method: str, url: str, json: Optional[dict[str, Any]] = None,
+                       params: Optional[dict[str, Any]] = None, compress: bool = False,
+                       idempotent: Optional[bool] = None):
+        if params:
+            url = f'{url}?{urlencode(params)}'
+        with span(route_name(method, url), 'api', url=url) as traced:
+            hit, cached, headers = self.cache.before(method, url, self._auth) if self.cache else (None, None, {})
+            if hit:
+                traced.set(cache='hit')
+                return hit
+
+            if compress and json is not None:
+                content, content_headers = encode_body(json, await self.features())
+                kwargs: dict[str, Any] = {'content': content, 'headers': {**headers, **content_headers}}
+            else:
+                kwargs = {'json': json, 'headers': headers}
+            response = await self._send(method, url, is_idempotent(method, idempotent), kwargs)
+            traced.set(status=response.status_code, bytes=len(response.content))
+            if self.cache:
+                response = self.cache.after(method, url, json, self._auth, response, cached)
+            check_response(response, method, url)
+            return response
+
+    async def _send(self, method: str, url: str, idempotent: bool, kwargs: dict[str, Any]) -> httpx.Response:
+        policy = self.policy
+        policy.stats.requests += 1
+        kwargs['timeout'] = policy.timeout_for(url)
+        hedge = policy.hedge_delay(method)
+
+        def send() -> Awaitable[httpx.Response]:
+            return self.client.request(method, url, **kwargs)
+
+        attempt = 0
+        while True:
+            policy.begin()
+            try:
+                with span('api.attempt', 'api', attempt=attempt):
+                    response = await (hedged_async(policy, send, hedge) if hedge is not None else send())
+            except httpx.HTTPError as e:
+                delay = policy.after(method, idempotent, attempt, error=e)
+                if delay is None:
+                    raise
+            else:
+                delay = policy.after(method, idempotent, attempt, response=response)
+                if delay is None:
+                    return response
+                await response.aclose()
+            with span('api.backoff', 'api', seconds=round(delay, 3)):
+                await asyncio.sleep(delay)
+            attempt += 1
@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import httpx
+
+from typing import Any, Optional
+
+default_cache_dir = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'rflow', 'responses')
+
+# Seconds a cached GET is served without asking the server, by URL prefix.
+# Longest prefix wins.
+default_ttls: dict[str, float] = {
+    '/misc/lua_config': 24 * 60 * 60,
+    '/auth/me': 5 * 60,
+    '/flows/list': 30,
+    '/flows/my/': 60,
+    '/flows/flow/': 60,
+}
+
+
+class CachedResponse:
+    def __init__(self, key: str, meta: dict[str, Any], body: bytes) -> None:
+        self.key = key
+        self.meta = meta
+        self.body = body
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.meta.get('etag')
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.meta['stored_at'] + self.meta['ttl']
+
+    def to_response(self, method: str, url: str) -> httpx.Response:
+        return httpx.Response(
+            status_code=self.meta['status'],
+            headers=self.meta['headers'],
+            content=self.body,
+            request=httpx.Request(method, url)
+        )
+
+
+class ResponseCache:
+    """
+    On-disk cache for read-only API responses.
+
+    Entries are keyed by URL and credentials, served until their TTL runs out
+    and revalidated with If-None-Match afterwards. Each entry is one file
+    holding a line of JSON metadata and then the body, replaced atomically,
+    so processes sharing the cache never overwrite each other's entries.
+    The least recently used entries are evicted beyond `max_entries`.
+    """
+
+    def __init__(
+        self,
+        path: str = default_cache_dir,
+        ttls: Optional[dict[str, float]] = None,
+        max_entries: int = 256
+    ) -> None:
+        self.path = path
+        self.ttls = ttls if ttls is not None else default_ttls
+        self.max_entries = max_entries
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+
+    def ttl_for(self, url: str) -> float:
+        matches = [prefix for prefix in self.ttls if url.startswith(prefix)]
+        return self.ttls[max(matches, key=len)] if matches else 0
+
+    def key(self, url: str, auth: Optional[str]) -> str:
+        return hashlib.sha256(f'{auth or ""}\0{url}'.encode()).hexdigest()
+
+    def get(self, url: str, auth: Optional[str]) -> Optional[CachedResponse]:
+        key = self.key(url, auth)
+        entry = self._read(key)
+        if entry is None:
+            return None
+        try:
+            os.utime(self._entry_path(key))  # for eviction
+        except OSError:
+            pass
+        return entry
+
+    def put(self, url: str, auth: Optional[str], response: httpx.Response):
+        ttl = self.ttl_for(url)
+        etag = response.headers.get('ETag')
+        if not ttl and not etag:
+            return
+
+        key = self.key(url, auth)
+        meta = {
+            'url': url,
+            'status': response.status_code,
+            'headers': {'Content-Type': response.headers.get('Content-Type', 'application/json')},
+            'etag': etag,
+            'ttl': ttl,
+            'stored_at': time.time(),
+        }
+        with self._lock:
+            if not self._open_dir():
+                return
+            self._write(key, meta, response.content)
+            self._evict()
+
+    def refresh(self, entry: CachedResponse):
+        """Marks an entry the server confirmed with a 304 as fresh again."""
+        entry.meta['stored_at'] = time.time()
+        with self._lock:
+            if self._open_dir():
+                self._write(entry.key, entry.meta, entry.body)
+
+    def invalidate(self, urls: list[str], auth: Optional[str]):
+        """Drops entries for `urls`; a URL ending in '*' drops every entry starting with it."""
+        with self._lock:
+            prefixes = [url[:-1] for url in urls if url.endswith('*')]
+            for url in urls:
+                if not url.endswith('*'):
+                    self._drop(self.key(url, auth))
+            if not prefixes:
+                return
+            for key in self._keys():
+                entry = self._read(key)
+                if entry is None:
+                    continue
+                url = entry.meta['url']
+                if any(url.startswith(prefix) for prefix in prefixes) and key == self.key(url, auth):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            for key in self._keys():
+                self._drop(key)
+
+    def before(self, method: str, url: str, auth: Optional[str]) -> tuple[Optional[httpx.Response], Optional[CachedResponse], dict[str, str]]:
+        """
+        Looks a request up before it is sent. Returns a response to use as-is
+        (fresh hit), or the stale entry and the revalidation headers to send.
+        """
+        if method.lower() != 'get':
+            return None, None, {}
+        cached = self.get(url, auth)
+        if cached is None:
+            return None, None, {}
+        if cached.fresh:
+            self.hits += 1
+            return cached.to_response(method, url), cached, {}
+        return None, cached, {'If-None-Match': cached.etag} if cached.etag else {}
+
+    def after(
+        self,
+        method: str,
+        url: str,
+        json: Optional[dict[str, Any]],
+        auth: Optional[str],
+        response: httpx.Response,
+        cached: Optional[CachedResponse]
+    ) -> httpx.Response:
+        """Stores, revalidates or invalidates entries once the server answered."""
+        if method.lower() != 'get':
+            if response.is_success:
+                self.invalidate(invalidated_by(method, url, json), auth)
+            return response
+
+        if cached and response.status_code == 304:
+            self.revalidated += 1
+            self.refresh(cached)
+            return cached.to_response(method, url)
+
+        self.misses += 1
+        if response.status_code == 200:
+            self.put(url, auth, response)
+        return response
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, f'{key}.entry')
+
+    def _keys(self) -> list[str]:
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return []
+        return [name[:-len('.entry')] for name in names if name.endswith('.entry')]
+
+    def _read(self, key: str) -> Optional[CachedResponse]:
+        try:
+            with open(self._entry_path(key), 'rb') as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        return CachedResponse(key, meta, body)
+
+    def _drop(self, key: str):
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        keys = self._keys()
+        excess = len(keys) - self.max_entries
+        if excess <= 0:
+            return
+
+        def used_at(key: str) -> float:
+            try:
+                return os.stat(self._entry_path(key)).st_mtime
+            except OSError:
+                return 0
+        for key in sorted(keys, key=used_at)[:excess]:
+            self._drop(key)
+
+    def _open_dir(self) -> bool:
+        """Creates the cache directory private to this user. False if that can't be done."""
+        try:
+            os.makedirs(self.path, mode=0o700, exist_ok=True)
+            st = os.stat(self.path)
+            if st.st_uid != os.getuid():
+                return False
+            if st.st_mode & 0o077:
+                os.chmod(self.path, 0o700)
+        except OSError:
+            return False
+        return True
+
+    def _write(self, key: str, meta: dict[str, Any], body: bytes):
+        target = self._entry_path(key)
+        tmp = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(json.dumps(meta).encode() + b'\n')
+            f.write(body)
+        os.replace(tmp, target)
+
+
+def invalidated_by(method: str, url: str, json: Optional[dict[str, Any]]) -> list[str]:
+    """The cached URLs a write request makes stale."""
+    if url.startswith('/flows/update_info/'):
+        flow_id = url.rsplit('/', 1)[-1]
+        return ['/flows/list*', f'/flows/my/{flow_id}']
+    if url == '/flows/update' and json:
+        return ['/flows/list*', f'/flows/my/{json.get("id")}', f'/flows/my/{json.get("id")}/code']
+    if url == '/flows/new':
+        return ['/flows/list*']
+    return ['/flows/*']
@@ -0,0 +1,274 @@
+import os
+import time
+import contextlib
+import toml
+import httpx
+
+from typing import Any, Iterator, Optional
+from urllib.parse import urlencode
+
+from tracing import span
+from rflow._exceptions import AuthenticationError, PreconditionFailedError, RewriteFlowError
+from ._http import check_response, route_name
+from ._models import User, Flow, PublicFlow, flow_list
+from ._cache import ResponseCache
+from ._stream import iter_json_array
+from ._upload import CodeStore, code_uploads, encode_body
+from ._retry import RetryPolicy, hedged, is_idempotent
+
+
+class RewriteFlow:
+    client: httpx.Client
+    _auth: str | None
+    conf_path: str = os.path.expanduser('~/.rfconf.toml')
+
+    def __init__(self, api_base_url: str, cache: Optional[ResponseCache] = None,
+                 code_store: Optional[CodeStore] = None, policy: Optional[RetryPolicy] = None) -> None:
+        self.client = httpx.Client()
+        self.client.base_url = api_base_url
+        self._auth = None
+        self.cache = cache
+        self.code_store = code_store
+        self.policy = policy or RetryPolicy()
+        self._features: Optional[frozenset[str]] = None
+
+        self.load_config()
+
+    def load_config(self):
+        if not os.path.exists(self.conf_path):
+            return
+        with open(self.conf_path, 'r') as f:
+            config = toml.load(f)
+
+        if 'auth' in config:
+            self._auth = f"{config['auth']}"
+            self.client.headers['Authorization'] = config['auth']
+
+    def dump_config(self):
+        config_data: dict[str, Any] = {}
+        if self._auth:
+            config_data['auth'] = self._auth
+
+        with open(self.conf_path, 'w') as f:
+            toml.dump(config_data, f)
+
+    def me(self):
+        response = self._request('get', '/auth/me')
+        return User.model_validate(response.json())
+
+    def register(self, username: str, email: str):
+        response = self._request('post', '/auth/register', json={
+            'username': username,
+            'email': email
+        })
+        return User.model_validate(response.json())
+
+    def authenticate(self, token: str):
+        self._auth = f"{token}"
+        self.client.headers['Authorization'] = self._auth
+
+        try:
+            me = self.me()
+        except AuthenticationError as e:
+            self._auth = None
+            del self.client.headers['Authorization']
+
+            raise e
+
+        self.dump_config()
+        return me
+
+    def logout(self):
+        self._auth = None
+        del self.client.headers['Authorization']
+        self.dump_config()
+
+    def get_flow(self, flow_id: str):
+        response = self._request('get', f'/flows/flow/{flow_id}')
+        return PublicFlow.model_validate(response.json())
+
+    def get_my_flow(self, flow_id: str):
+        response = self._request('get', f'/flows/my/{flow_id}')
+        return Flow.model_validate(response.json())
+
+    def get_my_flows(self):
+        response = self._request('get', f'/flows/list')
+        return flow_list.validate_json(response.content)
+
+    def iter_my_flows(
+        self,
+        page_size: int = 500,
+        sort: Optional[str] = None,
+        descending: bool = False,
+        search: Optional[str] = None,
+        batch_size: int = 50
+    ) -> Iterator[Flow]:
+        """
+        Yields your flows page by page as the response is read, validating them
+        `batch_size` at a time. `sort`, `descending` and `search` are applied by
+        the server. Streamed pages skip the response cache.
+        """
+        params: dict[str, Any] = {'limit': page_size}
+        if sort:
+            params['sort'] = sort
+            params['order'] = 'desc' if descending else 'asc'
+        if search:
+            params['q'] = search
+
+        offset = 0
+        first_id = None
+        while True:
+            params['offset'] = offset
+            count = 0
+            batch: list[Any] = []
+            with self._stream('get', '/flows/list', params) as response:
+                for item in iter_json_array(response.iter_bytes()):
+                    # A server without pagination returns everything on each
+                    # page; stop as soon as a page starts over.
+                    if count == 0 and offset and item.get('id') == first_id:
+                        return
+                    if offset == 0 and count == 0:
+                        first_id = item.get('id')
+                    count += 1
+                    batch.append(item)
+                    if len(batch) >= batch_size:
+                        yield from flow_list.validate_python(batch)
+                        batch.clear()
+            yield from flow_list.validate_python(batch)
+
+            if count != page_size:
+                return  # the last page, or a server that ignored `limit`
+            offset += count
+
+    def get_my_code(self, flow_id: str):
+        response = self._request('get', f'/flows/my/{flow_id}/code')
+        code = response.json()
+        if self.code_store:
+            self.code_store.put(str(self.client.base_url), flow_id, code)
+        return code
+
+    def update_flow(self, flow: Flow):
+        self.update_flow_info(flow.id, flow.name, flow.env)
+
+    def update_flow_info(self, flow_id: str, name: str, env: dict[str, str]):
+        self._request('patch', f'/flows/update_info/{flow_id}', json={
+            'env': env.copy(),
+            'name': name
+        }, idempotent=True)
+
+    def set_my_code(self, flow_id: str, code: str) -> str:
+        """
+        Uploads `code`, sending only a hash or a delta when the server supports
+        it and the last known remote version allows. Returns how the code went
+        up: 'unchanged', 'delta' or 'full'.
+        """
+        base_url = str(self.client.base_url)
+        base = self.code_store.get(base_url, flow_id) if self.code_store else None
+        features = self.features()
+
+        for mode, data in code_uploads(flow_id, code, base, features):
+            try:
+                # Each upload replaces the code or checks it against a hash,
+                # so sending it twice is harmless.
+                self._request('patch', f'/flows/update', json=data, compress=True, idempotent=True)
+            except PreconditionFailedError:
+                if mode == 'full':
+                    raise
+                continue
+            if self.code_store:
+                self.code_store.put(base_url, flow_id, code)
+            return mode
+        raise AssertionError('code_uploads always ends with a full upload')
+
+    def create_flow(self, name: str, env: dict[str, str], code: str):
+        data = {'name': name, 'env': env, 'code': code}
+        response = self._request('post', '/flows/new', json=data, compress=True)
+        flow = Flow.model_validate(response.json())
+        if self.code_store:
+            self.code_store.put(str(self.client.base_url), flow.id, code)
+        return flow
+
+    def get_lua_config(self):
+        response = self._request('get', '/misc/lua_config')
+        return response.json()
+
+    def features(self) -> frozenset[str]:
+        """Optional protocol features the server advertises in its Lua config."""
+        if self._features is None:
+            try:
+                self._features = frozenset(self.get_lua_config().get('features', []))
+            except (httpx.HTTPError, RewriteFlowError, ValueError):
+                self._features = frozenset()
+        return self._features
+
+    def get_hook_url(self, flow_id: str):
+        return f"{self.client.base_url}/flows/call/{flow_id}"
+
+    def _request(self, method: str, url: str, json: Optional[dict[str, Any]] = None,
+                 params: Optional[dict[str, Any]] = None, compress: bool = False,
+                 idempotent: Optional[bool] = None):
+        if params:
+            url = f'{url}?{urlencode(params)}'
+        with span(route_name(method, url), 'api', url=url) as traced:
+            hit, cached, headers = self.cache.before(method, url, self._auth) if self.cache else (None, None, {})
+            if hit:
+                traced.set(cache='hit')
+                return hit
+
+            if compress and json is not None:
+                content, content_headers = encode_body(json, self.features())
+                kwargs: dict[str, Any] = {'content': content, 'headers': {**headers, **content_headers}}
+            else:
+                kwargs = {'json': json, 'headers': headers}
+            response = self._send(method, url, is_idempotent(method, idempotent), kwargs)
+            traced.set(status=response.status_code, bytes=len(response.content))
+            if self.cache:
+                response = self.cache.after(method, url, json, self._auth, response, cached)
+            check_response(response, method, url)
+            return response
+
+    def _send(self, method: str, url: str, idempotent: bool, kwargs: dict[str, Any]) -> httpx.Response:
+        """Sends a request as `self.policy` says: with its timeout, retried, hedged and through the breaker."""
+        policy = self.policy
+        policy.stats.requests += 1
+        kwargs['timeout'] = policy.timeout_for(url)
+        hedge = policy.hedge_delay(method)
+
+        def send() -> httpx.Response:
+            return self.client.request(method, url, **kwargs)
+
+        attempt = 0
+        while True:
+            policy.begin()
+            try:
+                with span('api.attempt', 'api', attempt=attempt):
+                    response = hedged(policy, send, hedge) if hedge is not None else send()
+            except httpx.HTTPError as e:
+                delay = policy.after(method, idempotent, attempt, error=e)
+                if delay is None:
+                    raise
+            else:
+                delay = policy.after(method, idempotent, attempt, response=response)
+                if delay is None:
+                    return response
+                response.close()
+            with span('api.backoff', 'api', seconds=round(delay, 3)):
+                time.sleep(delay)
+            attempt += 1
+
+    @contextlib.contextmanager
+    def _stream(self, method: str, url: str, params: Optional[dict[str, Any]] = None):
+        # Not retried: the caller may have used part of the body by the time it fails.
+        policy = self.policy
+        policy.stats.requests += 1
+        policy.begin()
+        try:
+            with self.client.stream(method, url, params=params, timeout=policy.timeout_for(url)) as response:
+                policy.record(response)
+                if response.status_code >= 400:
+                    response.read()
+                    check_response(response, method, url)
+                yield response
+        except httpx.TransportError as e:
+            policy.record(error=e)
+            raise
@@ -25,3 +25,15 @@ class NotFoundError(RewriteFlowError):
     def __init__(self, message: str) -> None:
         self.message = message
         super().__init__(message)
+
+
+class PreconditionFailedError(RewriteFlowError):
+    def __init__(self, message: str) -> None:
+        self.message = message
+        super().__init__(message)
+
+
+class CircuitOpenError(RewriteFlowError):
+    def __init__(self, message: str) -> None:
+        self.message = message
+        super().__init__(message)
@@ -0,0 +1,43 @@
+import re
+
+from typing import Any
+
+from rflow._exceptions import AuthenticationError, BadRequestError, NotFoundError, PreconditionFailedError
+
+
+_id_segment = re.compile(r'/[0-9a-fA-F-]{8,}(?=/|$)')
+
+
+def route_name(method: str, url: str) -> str:
+    """`GET /flows/my/{id}/code` for a request, so calls to the same endpoint trace under one name."""
+    path = _id_segment.sub('/{id}', url.split('?', 1)[0])
+    return f'{method.upper()} {path}'
+
+
+def check_response(response: Any, method: str, url: str):
+    """Maps API error responses to exceptions; shared by the sync and async clients."""
+    if response.status_code == 401:
+        data = response.json()
+        if 'detail' in data:
+            raise AuthenticationError(data['detail'])
+        raise AuthenticationError(
+            f'Unauthorized error when requesting {url} with {method}')
+    elif response.status_code == 400:
+        data = response.json()
+        if 'detail' in data:
+            raise BadRequestError(data['detail'])
+        raise BadRequestError(
+            f'Bad request error when requesting {url} with {method}: {data}')
+    elif response.status_code == 404:
+        data = response.json()
+        if 'detail' in data:
+            raise NotFoundError(data['detail'])
+        raise NotFoundError(
+            f'Not found error when requesting {url} with {method}: {data}')
+    elif response.status_code == 412:
+        data = response.json()
+        if 'detail' in data:
+            raise PreconditionFailedError(data['detail'])
+        raise PreconditionFailedError(
+            f'Precondition failed when requesting {url} with {method}: {data}')
+    response.raise_for_status()
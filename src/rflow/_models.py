@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 
 
 class FlowAnalytics(BaseModel):
@@ -16,6 +16,10 @@ class Flow(BaseModel):
     env: dict[str, str]
 
 
+# Validates a whole page of flows in one call instead of one model at a time.
+flow_list = TypeAdapter(list[Flow])
+
+
 class PublicFlow(BaseModel):
     id: str
     name: str
@@ -0,0 +1,287 @@
+import time
+import random
+import asyncio
+import threading
+import httpx
+
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Optional
+
+from ._exceptions import CircuitOpenError
+
+# Seconds a request may take, by URL prefix. Longest prefix wins.
+default_timeouts: dict[str, float] = {
+    '/misc/lua_config': 10,
+    '/auth/': 10,
+    '/flows/list': 60,
+    '/flows/update': 60,
+    '/flows/new': 60,
+}
+default_timeout = 30.0
+
+# Methods that can be replayed without changing the outcome. Calls with other
+# methods can say they're safe to replay with `idempotent=True`.
+idempotent_methods = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+# Responses that mean the server turned the request away without acting on it.
+rejected_statuses = frozenset({429, 503})
+# Responses worth another try when replaying the request is harmless.
+retry_statuses = frozenset({500, 502, 504}) | rejected_statuses
+
+# Errors raised before any of the request reached the server.
+_unsent_errors = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class RequestStats:
+    """Counters for what the request layer did, shared by every client using the same policy."""
+
+    def __init__(self) -> None:
+        self.requests = 0  # calls to `_request`
+        self.attempts = 0  # requests sent, counting retries but not hedges
+        self.retries = 0
+        self.hedges = 0  # second copies sent for slow GETs
+        self.hedge_wins = 0  # hedges that answered first
+        self.timeouts = 0
+        self.errors = 0  # transport errors and 5xx responses
+        self.breaker_trips = 0
+        self.short_circuited = 0  # requests refused while the breaker was open
+
+    def as_dict(self) -> dict[str, int]:
+        return dict(self.__dict__)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` failures in a row and refuses requests for
+    `reset_after` seconds. After that one request goes through as a probe; it
+    closes the breaker on success or opens it again on failure.
+    """
+
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0) -> None:
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return 'half-open'
+        return 'open'
+
+    def retry_in(self) -> float:
+        """Seconds until the open breaker lets a probe through."""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_after - time.monotonic())
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, ok: bool) -> bool:
+        """Records an outcome. Returns whether this opened the breaker."""
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return False
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                opened = self.opened_at is None or self.state == 'half-open'
+                self.opened_at = time.monotonic()
+                return opened
+            return False
+
+
+class RetryPolicy:
+    """
+    Decides timeouts, retries and hedging for API requests.
+
+    Failed requests are retried up to `attempts` times in total, with full
+    jitter exponential backoff starting at `backoff` seconds, or as long as
+    Retry-After asks. Only idempotent requests are retried after they may
+    have reached the server. GETs still running after `hedge_after` seconds
+    are sent a second time and the first answer wins. Timeouts come from
+    `timeouts` by URL prefix, falling back to `default_timeout`.
+    """
+
+    def __init__(
+        self,
+        attempts: int = 4,
+        backoff: float = 0.25,
+        max_backoff: float = 8.0,
+        timeouts: Optional[dict[str, float]] = None,
+        default_timeout: float = default_timeout,
+        hedge_after: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ) -> None:
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeouts = timeouts if timeouts is not None else default_timeouts
+        self.default_timeout = default_timeout
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = RequestStats()
+
+    def timeout_for(self, url: str) -> float:
+        path = url.split('?', 1)[0]
+        best = None
+        for prefix in self.timeouts:
+            if path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+                best = prefix
+        return self.timeouts[best] if best is not None else self.default_timeout
+
+    def hedge_delay(self, method: str) -> Optional[float]:
+        return self.hedge_after if method.upper() == 'GET' else None
+
+    def begin(self):
+        """Called before each attempt; raises `CircuitOpenError` while the breaker is open."""
+        if not self.breaker.allow():
+            self.stats.short_circuited += 1
+            raise CircuitOpenError(
+                f'The API failed {self.breaker.failures} times in a row; '
+                f'trying it again in {self.breaker.retry_in():.1f}s')
+        self.stats.attempts += 1
+
+    def record(self, response: Optional[httpx.Response] = None, error: Optional[Exception] = None):
+        failed = error is not None or (response is not None and response.status_code >= 500)
+        if isinstance(error, httpx.TimeoutException):
+            self.stats.timeouts += 1
+        if failed:
+            self.stats.errors += 1
+        if self.breaker.record(not failed):
+            self.stats.breaker_trips += 1
+
+    def after(
+        self,
+        method: str,
+        idempotent: bool,
+        attempt: int,
+        response: Optional[httpx.Response] = None,
+        error: Optional[Exception] = None
+    ) -> Optional[float]:
+        """
+        Records the outcome of attempt number `attempt` (from 0). Returns how
+        long to wait before retrying, or None to give up and return or raise.
+        """
+        self.record(response, error)
+        if attempt + 1 >= self.attempts:
+            return None
+        if error is not None:
+            if not isinstance(error, httpx.TransportError):
+                return None
+            if not idempotent and not isinstance(error, _unsent_errors):
+                return None
+        elif response is not None:
+            status = response.status_code
+            if status not in (retry_statuses if idempotent else rejected_statuses):
+                return None
+        else:
+            return None
+
+        self.stats.retries += 1
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.max_backoff))
+            except ValueError:
+                pass  # an HTTP date; the backoff will do
+        return delay
+
+
+def is_idempotent(method: str, idempotent: Optional[bool]) -> bool:
+    return idempotent if idempotent is not None else method.upper() in idempotent_methods
+
+
+def _close_later(future: 'Future[httpx.Response]'):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _start(send: Callable[[], httpx.Response]) -> 'Future[httpx.Response]':
+    """
+    Runs `send` on a daemon thread. Unlike a ThreadPoolExecutor's workers,
+    the thread of a losing hedge is not joined at exit, so a slow request
+    can't keep the CLI from quitting.
+    """
+    future: 'Future[httpx.Response]' = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(send())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name='rflow-hedge', daemon=True).start()
+    return future
+
+
+def hedged(policy: RetryPolicy, send: Callable[[], httpx.Response], delay: float) -> httpx.Response:
+    """Calls `send`, and again if the first call takes over `delay` seconds. Returns the first answer."""
+    first = _start(send)
+    try:
+        return first.result(timeout=delay)
+    except FutureTimeoutError:  # not the builtin TimeoutError before 3.11
+        pass
+
+    policy.stats.hedges += 1
+    second = _start(send)
+    pending = {first, second}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is second:
+                    policy.stats.hedge_wins += 1
+                for other in pending:
+                    other.add_done_callback(_close_later)
+                return future.result()
+            error = error or future.exception()
+    assert error is not None
+    raise error
+
+
+async def hedged_async(policy: RetryPolicy, send: Callable[[], Awaitable[httpx.Response]],
+                       delay: float) -> httpx.Response:
+    """Async `hedged`; the slower request is cancelled."""
+    first = asyncio.ensure_future(send())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    policy.stats.hedges += 1
+    second = asyncio.ensure_future(send())
+    pending: set['asyncio.Future[Any]'] = {first, second}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        policy.stats.hedge_wins += 1
+                    return task.result()
+                error = error or task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+    assert error is not None
+    raise error
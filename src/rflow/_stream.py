@@ -0,0 +1,51 @@
+import re
+import json
+import codecs
+
+from typing import Any, Iterable, Iterator
+
+_decoder = json.JSONDecoder()
+_separators = re.compile(r'[\s,]*')
+_space = re.compile(r'\s*')
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Yields the items of a JSON array as its bytes arrive, without holding the
+    whole document. Only the item being parsed is buffered.
+    """
+    text = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    started = False
+
+    for chunk in chunks:
+        buffer = buffer[pos:] + text.decode(chunk)
+        pos = _separators.match(buffer).end()
+        if not started:
+            if pos == len(buffer):
+                continue
+            if buffer[pos] != '[':
+                raise ValueError('Expected a JSON array')
+            started = True
+            pos += 1
+
+        while True:
+            pos = _separators.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            if buffer[pos] == ']':
+                return
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # the item continues in the next chunk
+            # A number cut short (`-0.` of `-0.5`) still decodes, so an item
+            # only counts once what follows it shows it ended.
+            after = _space.match(buffer, end).end()
+            if after == len(buffer) or buffer[after] not in ',]':
+                break
+            yield item
+            pos = after
+
+    raise ValueError('JSON array ended early')
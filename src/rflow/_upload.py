@@ -0,0 +1,136 @@
+import os
+import gzip
+import json
+import difflib
+import hashlib
+import importlib.util
+
+from typing import Any, Iterable, Optional
+
+default_store_dir = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'rflow', 'code')
+
+# Bodies smaller than this are sent as-is; compressing them costs more than it saves.
+compress_min_bytes = 1024
+
+# A delta is only sent when it is at most this fraction of the full source.
+max_delta_ratio = 0.8
+
+# Delta ops: copy n lines of the old source, skip n of them, or insert text.
+COPY, SKIP, INSERT = 0, 1, 2
+
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(code.encode()).hexdigest()
+
+
+def make_delta(old: str, new: str) -> list[list[Any]]:
+    """A line-based patch that turns `old` into `new`, for `apply_delta`."""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+
+    ops: list[list[Any]] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([COPY, i2 - i1])
+            continue
+        if i2 > i1:
+            ops.append([SKIP, i2 - i1])
+        if j2 > j1:
+            ops.append([INSERT, ''.join(new_lines[j1:j2])])
+    return ops
+
+
+def apply_delta(old: str, delta: list[list[Any]]) -> str:
+    lines = old.splitlines(keepends=True)
+    pos = 0
+    out: list[str] = []
+    for op, arg in delta:
+        if op == COPY:
+            out.extend(lines[pos:pos + arg])
+            pos += arg
+        elif op == SKIP:
+            pos += arg
+        elif op == INSERT:
+            out.append(arg)
+        else:
+            raise ValueError(f'Unknown delta op {op!r}')
+    return ''.join(out)
+
+
+def code_uploads(flow_id: str, code: str, base: Optional[str], features: Iterable[str]) -> list[tuple[str, dict[str, Any]]]:
+    """
+    The request bodies to try for a code upload, cheapest first. Each one but
+    the last is conditional and rejected with 412 when the server's copy is
+    not what `base` says it is.
+    """
+    features = set(features)
+    if 'code-hash' not in features:
+        return [('full', {'id': flow_id, 'code': code})]
+
+    digest = code_hash(code)
+    uploads: list[tuple[str, dict[str, Any]]] = []
+    if base is not None:
+        if base == code:
+            uploads.append(('unchanged', {'id': flow_id, 'hash': digest}))
+        elif 'code-delta' in features:
+            delta = make_delta(base, code)
+            if len(json.dumps(delta)) <= len(code) * max_delta_ratio:
+                uploads.append(('delta', {'id': flow_id, 'hash': digest,
+                                          'base_hash': code_hash(base), 'delta': delta}))
+    uploads.append(('full', {'id': flow_id, 'code': code, 'hash': digest}))
+    return uploads
+
+
+def encode_body(data: Any, features: Iterable[str]) -> tuple[bytes, dict[str, str]]:
+    """Serializes a JSON body, compressed with the best encoding the server accepts."""
+    body = json.dumps(data).encode()
+    headers = {'Content-Type': 'application/json'}
+    if len(body) < compress_min_bytes:
+        return body, headers
+
+    features = set(features)
+    if 'zstd' in features and importlib.util.find_spec('zstandard') is not None:
+        import zstandard  # type: ignore
+        headers['Content-Encoding'] = 'zstd'
+        return zstandard.ZstdCompressor(level=10).compress(body), headers
+    if 'gzip' in features:
+        headers['Content-Encoding'] = 'gzip'
+        return gzip.compress(body, compresslevel=6, mtime=0), headers
+    return body, headers
+
+
+class CodeStore:
+    """
+    The last code this machine uploaded to, or pulled from, each flow: the
+    base that deltas and unchanged checks are made against.
+    """
+
+    def __init__(self, path: str = default_store_dir) -> None:
+        self.path = path
+
+    def _file(self, base_url: str, flow_id: str) -> str:
+        key = hashlib.sha256(f'{base_url}\0{flow_id}'.encode()).hexdigest()
+        return os.path.join(self.path, f'{key}.lua')
+
+    def get(self, base_url: str, flow_id: str) -> Optional[str]:
+        try:
+            with open(self._file(base_url, flow_id), 'r', encoding='utf-8', newline='') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, base_url: str, flow_id: str, code: str):
+        os.makedirs(self.path, exist_ok=True)
+        file = self._file(base_url, flow_id)
+        tmp = f'{file}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8', newline='') as f:
+            f.write(code)
+        os.replace(tmp, file)
+
+    def drop(self, base_url: str, flow_id: str):
+        try:
+            os.remove(self._file(base_url, flow_id))
+        except OSError:
+            pass
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import toml
+
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+import luasb
+from luasb import SandboxPool, ForkServer
+from luasb.bytecode import ChunkCache
+from luasb._exceptions import LuaRuntimeError
+from luasb.sandbox import variable
+
+payload_extensions = ('.toml', '.json', '.jsonl')
+
+
+@dataclass
+class PayloadCase:
+    name: str
+    body: Any = field(default_factory=dict)
+    headers: Any = field(default_factory=dict)
+    params: Any = field(default_factory=dict)
+    expected: Optional[Any] = None
+
+
+@dataclass
+class CaseResult:
+    name: str
+    ok: bool
+    elapsed: float
+    result: Any = None
+    error: Optional[str] = None
+    diff: list[str] = field(default_factory=list)
+
+
+def build_payload(rpayload: dict[str, Any], env: dict[str, Any]) -> dict[str, variable]:
+    payload: dict[str, variable] = {}
+
+    payload['body'] = rpayload['body'] if 'body' in rpayload else {}
+    payload['headers'] = rpayload['headers'] if 'headers' in rpayload else {}
+    payload['params'] = rpayload['params'] if 'params' in rpayload else {}
+    payload['env'] = env
+
+    return payload
+
+
+def _case(name: str, data: dict[str, Any]) -> PayloadCase:
+    return PayloadCase(
+        name=name,
+        body=data.get('body', {}),
+        headers=data.get('headers', {}),
+        params=data.get('params', {}),
+        expected=data.get('expected')
+    )
+
+
+def load_cases(path: str) -> list[PayloadCase]:
+    """Reads payload cases from a payload file, a JSONL corpus or a directory of either."""
+    if os.path.isdir(path):
+        cases: list[PayloadCase] = []
+        for name in sorted(os.listdir(path)):
+            if name.endswith(payload_extensions):
+                cases.extend(load_cases(os.path.join(path, name)))
+        return cases
+
+    name = os.path.basename(path)
+    with open(path, 'r') as f:
+        if path.endswith('.toml'):
+            return [_case(name, toml.load(f))]
+        if path.endswith('.jsonl'):
+            return [_case(f'{name}:{lineno}', json.loads(line))
+                    for lineno, line in enumerate(f, 1) if line.strip()]
+        return [_case(name, json.load(f))]
+
+
+def diff_results(expected: Any, actual: Any, path: str = '') -> list[str]:
+    """Lists the differences between two results, one line per changed key."""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        lines: list[str] = []
+        for key in expected:
+            sub = f'{path}.{key}' if path else str(key)
+            if key not in actual:
+                lines.append(f'- {sub}: {json.dumps(expected[key])}')
+            else:
+                lines.extend(diff_results(expected[key], actual[key], sub))
+        for key in actual:
+            if key not in expected:
+                sub = f'{path}.{key}' if path else str(key)
+                lines.append(f'+ {sub}: {json.dumps(actual[key])}')
+        return lines
+
+    if isinstance(expected, list) and isinstance(actual, list) and len(expected) == len(actual):
+        lines = []
+        for index, (a, b) in enumerate(zip(expected, actual), 1):
+            lines.extend(diff_results(a, b, f'{path}[{index}]'))
+        return lines
+
+    if expected != actual:
+        return [f'~ {path or "Result"}: {json.dumps(expected)} -> {json.dumps(actual)}']
+    return []
+
+
+_pool: Optional[SandboxPool] = None
+_code: str = ''
+_env: dict[str, Any] = {}
+
+
+def _init_worker(
+    modules_dir: str,
+    code: str,
+    env: dict[str, Any],
+    cache_dir: Optional[str],
+    sandbox_options: dict[str, Any]
+):
+    global _pool, _code, _env
+    luasb.modules.modules_dir = modules_dir
+    _code = code
+    _env = env
+    _pool = SandboxPool(
+        size=1,
+        chunk_cache=ChunkCache(cache_dir) if cache_dir else None,
+        **sandbox_options
+    )
+
+
+def _run_case(case: PayloadCase) -> CaseResult:
+    start = time.perf_counter()
+    try:
+        with _pool.checkout(build_payload(case.__dict__, _env)) as sb:  # type: ignore
+            sb.execute(_code)
+            result = sb.Result
+        diff = diff_results(case.expected, result) if case.expected is not None else []
+    except LuaRuntimeError as e:
+        return CaseResult(case.name, False, time.perf_counter() - start, error=e.message)
+    except Exception as e:
+        # One bad case (a payload that can't be marshalled, say) shouldn't
+        # abort the whole batch.
+        return CaseResult(case.name, False, time.perf_counter() - start, error=f'Error running case: {e}')
+    return CaseResult(case.name, not diff, time.perf_counter() - start, result, diff=diff)
+
+
+def _run_forked(
+    cases: list[PayloadCase],
+    code: str,
+    env: dict[str, Any],
+    modules_dir: str,
+    workers: Optional[int],
+    cache_dir: Optional[str],
+    sandbox_options: dict[str, Any],
+    fork_options: dict[str, Any]
+) -> list[CaseResult]:
+    luasb.modules.modules_dir = modules_dir
+    server = ForkServer(
+        code,
+        chunk_cache=ChunkCache(cache_dir) if cache_dir else None,
+        **fork_options,
+        **sandbox_options
+    )
+    payloads = (build_payload(case.__dict__, env) for case in cases)
+    results: list[Optional[CaseResult]] = [None] * len(cases)
+    for index, run in server.map(payloads, workers or os.cpu_count() or 1):
+        case = cases[index]
+        if not run.ok:
+            results[index] = CaseResult(case.name, False, run.elapsed, error=run.error)
+            continue
+        diff = diff_results(case.expected, run.result) if case.expected is not None else []
+        results[index] = CaseResult(case.name, not diff, run.elapsed, run.result, diff=diff)
+    return results  # type: ignore
+
+
+def run_batch(
+    cases: list[PayloadCase],
+    code: str,
+    env: dict[str, Any],
+    modules_dir: str,
+    workers: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    sandbox_options: Optional[dict[str, Any]] = None,
+    fork_options: Optional[dict[str, Any]] = None
+) -> tuple[list[CaseResult], float]:
+    """
+    Runs every case across a process pool. Returns the results, in order, and
+    the wall time. With `fork_options` (see `ForkServer`), each case runs in
+    its own forked child instead of a reused worker sandbox.
+    """
+    start = time.perf_counter()
+    if fork_options is not None:
+        results = _run_forked(cases, code, env, modules_dir, workers, cache_dir,
+                              sandbox_options or {}, fork_options)
+        return results, time.perf_counter() - start
+
+    chunksize = max(1, len(cases) // ((workers or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(modules_dir, code, env, cache_dir, sandbox_options or {})
+    ) as executor:
+        results = list(executor.map(_run_case, cases, chunksize=chunksize))
+    return results, time.perf_counter() - start
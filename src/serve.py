@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import asyncio
+import click
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from http import HTTPStatus
+from typing import Any, Optional
+from urllib.parse import urlsplit, parse_qsl
+from rich.markup import escape
+
+from luasb import SandboxPool
+from luasb.bytecode import ChunkCache, default_cache_dir
+from luasb.limits import ExecutionMetrics
+from luasb._exceptions import LuaRuntimeError
+from flowconf import FlowConfigError, config_file, find_flow_dirs, parse_flow_config, read_flow_config, script_file
+from runner import build_payload
+from utils import get_console
+
+# Largest request body accepted, like the hosted API.
+max_body_bytes = 10 * 1024 * 1024
+
+
+@dataclass
+class LocalFlow:
+    id: str
+    name: str
+    path: str
+    code: str
+    env: dict[str, Any]
+
+
+def load_flows(root: str) -> tuple[dict[str, LocalFlow], list[str]]:
+    """
+    Reads every flow under `root`. A published flow is served under its ID,
+    anything else under its directory name. Returns the flows and the
+    problems found on the way.
+    """
+    flows: dict[str, LocalFlow] = {}
+    problems: list[str] = []
+    for path in find_flow_dirs(root):
+        try:
+            name, env, flow_id = parse_flow_config(read_flow_config(path))
+            with open(os.path.join(path, script_file), 'r') as f:
+                code = f.read()
+        except FlowConfigError as e:
+            problems.append(f'{path}: {e.message}')
+            continue
+        except OSError as e:
+            problems.append(f'{path}: {e}')
+            continue
+
+        flow_id = flow_id or os.path.basename(os.path.abspath(path))
+        if flow_id in flows:
+            problems.append(f'{path}: ID {flow_id} is already served from {flows[flow_id].path}')
+            continue
+        flows[flow_id] = LocalFlow(flow_id, name, path, code, env)
+    return flows, problems
+
+
+# Worker process state: one warm sandbox pool per flow, and why the flows
+# without one couldn't be set up.
+_flows: dict[str, tuple[SandboxPool, LocalFlow]] = {}
+_broken: dict[str, str] = {}
+
+
+def _init_worker(flows: dict[str, LocalFlow], sandbox_options: dict[str, Any]):
+    for flow in flows.values():
+        modules_dir = os.path.join(flow.path, 'lua_modules')
+        try:
+            os.makedirs(modules_dir, exist_ok=True)
+            pool = SandboxPool(
+                size=1,
+                modules_dir=modules_dir,
+                chunk_cache=ChunkCache(default_cache_dir),
+                **sandbox_options
+            )
+        except Exception as e:
+            # One flow's broken module shouldn't take the others down with it.
+            _broken[flow.id] = f'Error loading modules: {getattr(e, "message", e)}'
+            continue
+        _flows[flow.id] = (pool, flow)
+
+
+def _call_flow(flow_id: str, request: dict[str, Any]) -> tuple[bool, Any, dict[str, Any]]:
+    """Runs one request in a worker. Returns whether it succeeded, the Result or error, and metrics."""
+    if flow_id in _broken:
+        return False, _broken[flow_id], ExecutionMetrics().as_dict()
+    pool, flow = _flows[flow_id]
+    try:
+        with pool.checkout(build_payload(request, flow.env)) as sb:
+            try:
+                sb.execute(flow.code)
+            except LuaRuntimeError as e:
+                return False, e.message, sb.metrics.as_dict()
+            return True, sb.Result, sb.metrics.as_dict()
+    except Exception as e:
+        # Anything else (a payload the sandbox can't take, a sandbox that
+        # won't reset) is still this request's error, not the worker's.
+        return False, f'Error running flow: {getattr(e, "message", e)}', ExecutionMetrics().as_dict()
+
+
+def _warm(_: int) -> int:
+    return os.getpid()
+
+
+class FlowServer:
+    """
+    Serves local flows at /flows/call/{id}, like the hosted hook URLs.
+
+    Connections are handled on an asyncio loop; scripts run on `workers`
+    processes that each keep a warm sandbox per flow.
+    """
+
+    def __init__(self, flows: dict[str, LocalFlow], workers: Optional[int] = None,
+                 sandbox_options: Optional[dict[str, Any]] = None, log: bool = True) -> None:
+        self.flows = flows
+        self.workers = workers or os.cpu_count() or 1
+        self.sandbox_options = sandbox_options or {}
+        self.log = log
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.console = get_console(stderr=True)
+
+    async def start(self, host: str, port: int) -> asyncio.Server:
+        self.executor = self._new_executor()
+        # Start every worker now so the first requests don't pay for it.
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _warm, i)
+                               for i in range(self.workers)))
+        return await asyncio.start_server(self._handle, host, port)
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(cancel_futures=True)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.flows, self.sandbox_options)
+        )
+
+    def _restart_executor(self, broken: ProcessPoolExecutor):
+        """Replaces `broken` unless a request that failed alongside it already did."""
+        if self.executor is not broken:
+            return
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.executor = self._new_executor()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                keep_alive = await self._handle_one(reader, writer)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_one(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                raise
+            return False  # the client closed an idle connection
+        except asyncio.LimitOverrunError:
+            await self._respond(writer, 431, {'detail': 'Request headers too large'}, False)
+            return False
+
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ', 2)
+        except ValueError:
+            await self._respond(writer, 400, {'detail': 'Malformed request line'}, False)
+            return False
+        headers: dict[str, str] = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+
+        keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            await self._respond(writer, 400, {'detail': 'Invalid Content-Length'}, False)
+            return False
+        if length > max_body_bytes:
+            await self._respond(writer, 413, {'detail': 'Request body too large'}, False)
+            return False
+        body = await reader.readexactly(length) if length else b''
+
+        start = time.perf_counter()
+        status, data, extra = await self._dispatch(method, target, headers, body)
+        await self._respond(writer, status, data, keep_alive, extra)
+        if self.log:
+            self.console.print(f"{escape(method)} {escape(target)} [bold]{status}[/bold] "
+                               f"[dim]{(time.perf_counter() - start) * 1000:.1f} ms[/dim]",
+                               highlight=False, markup=True)
+        return keep_alive
+
+    async def _dispatch(self, method: str, target: str, headers: dict[str, str],
+                        body: bytes) -> tuple[int, Any, dict[str, str]]:
+        url = urlsplit(target)
+        parts = url.path.strip('/').split('/')
+        if len(parts) != 3 or parts[:2] != ['flows', 'call']:
+            return 404, {'detail': 'Not Found'}, {}
+        flow_id = parts[2]
+        if flow_id not in self.flows:
+            return 404, {'detail': 'Flow not found'}, {}
+
+        text = body.decode(errors='replace')
+        try:
+            payload_body = json.loads(text) if text else {}
+        except ValueError:
+            payload_body = text
+        request = {
+            'body': payload_body,
+            'headers': headers,
+            'params': dict(parse_qsl(url.query)),
+        }
+
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            ok, result, metrics = await loop.run_in_executor(executor, _call_flow, flow_id, request)
+        except BrokenProcessPool:
+            # A worker died (OOM killer, a crash in C); every later request
+            # would fail the same way until the pool is rebuilt.
+            self._restart_executor(executor)  # type: ignore
+            return 500, {'detail': 'Worker process died, restarting workers'}, {}
+        except Exception as e:
+            return 500, {'detail': f'Error running flow: {e}'}, {}
+        extra = {
+            'X-Rflow-Instructions': str(metrics['instructions']),
+            'X-Rflow-Time': f"{metrics['wall_time'] * 1000:.3f}",
+        }
+        if not ok:
+            return 500, {'detail': result}, extra
+        return 200, result, extra
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, data: Any,
+                       keep_alive: bool, headers: Optional[dict[str, str]] = None):
+        body = json.dumps(data).encode()
+        head = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}',
+                'Content-Type: application/json',
+                f'Content-Length: {len(body)}',
+                f'Connection: {"keep-alive" if keep_alive else "close"}']
+        head.extend(f'{key}: {value}' for key, value in (headers or {}).items())
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+        await writer.drain()
+
+
+@click.command()
+@click.argument('root', default='.', type=click.Path(exists=True, file_okay=False))
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('-p', '--port', type=int, default=8000, show_default=True)
+@click.option('--workers', type=int, default=None,
+              help="Worker processes running scripts (defaults to the CPU count)")
+@click.option('--max-instructions', type=int, default=None,
+              help="Stop a script after this many Lua instructions")
+@click.option('--timeout', type=float, default=10.0, show_default=True,
+              help="Stop a script after this many seconds")
+@click.option('-q', '--quiet', is_flag=True, help="Don't log requests")
+def serve(root: str, host: str, port: int, workers: int | None,
+          max_instructions: int | None, timeout: float, quiet: bool):
+    """Serve the flows under ROOT at hook-compatible /flows/call/{id} URLs."""
+    from rich.table import Table
+
+    console = get_console(stderr=True)
+    flows, problems = load_flows(root)
+    for problem in problems:
+        console.print(f"[yellow]Skipping {escape(problem)}[/yellow]")
+    if not flows:
+        console.print(f"No flows found under '{root}' (looking for {config_file})")
+        exit(1)
+
+    server = FlowServer(flows, workers, {'max_instructions': max_instructions, 'timeout': timeout},
+                        log=not quiet)
+
+    async def main():
+        listener = await server.start(host, port)
+        bound = listener.sockets[0].getsockname()
+        base = f'http://{bound[0]}:{bound[1]}'
+
+        table = Table(title=f"Serving {len(flows)} flows with {server.workers} workers")
+        table.add_column('Flow')
+        table.add_column('Path')
+        table.add_column('Hook URL')
+        for flow in flows.values():
+            table.add_row(escape(flow.name), escape(flow.path), f'{base}/flows/call/{flow.id}')
+        console.print(table)
+
+        async with listener:
+            await listener.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -0,0 +1,159 @@
+import os
+import csv
+import json
+import hashlib
+
+from dataclasses import dataclass, asdict
+from typing import Any, Iterable, Optional, TextIO
+
+from rflow._models import Flow
+
+default_stats_dir = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'rflow', 'stats')
+
+# Snapshots kept per API, oldest dropped first.
+max_snapshots = 100
+
+
+@dataclass
+class FlowStats:
+    id: str
+    name: str
+    calls: int
+    success: int
+    failure: int
+    # Since the previous snapshot, when there is one.
+    new_calls: Optional[int] = None
+    new_failures: Optional[int] = None
+    calls_per_minute: Optional[float] = None
+
+    @property
+    def success_rate(self) -> Optional[float]:
+        return self.success / self.calls if self.calls else None
+
+    @property
+    def failure_rate(self) -> Optional[float]:
+        return self.failure / self.calls if self.calls else None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {**asdict(self), 'success_rate': self.success_rate,
+                'failure_rate': self.failure_rate}
+
+
+@dataclass
+class Totals:
+    flows: int = 0
+    calls: int = 0
+    success: int = 0
+    failure: int = 0
+    new_calls: Optional[int] = None
+    new_failures: Optional[int] = None
+    since: Optional[float] = None
+
+    @property
+    def success_rate(self) -> Optional[float]:
+        return self.success / self.calls if self.calls else None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {**asdict(self), 'success_rate': self.success_rate}
+
+
+class SnapshotStore:
+    """Analytics snapshots as JSON files, one directory per API base URL."""
+
+    def __init__(self, base_url: str, path: str = default_stats_dir) -> None:
+        self.path = os.path.join(path, hashlib.sha256(base_url.encode()).hexdigest()[:16])
+
+    def _files(self) -> list[str]:
+        try:
+            names = sorted(n for n in os.listdir(self.path) if n.endswith('.json'))
+        except OSError:
+            return []
+        return [os.path.join(self.path, n) for n in names]
+
+    def latest(self) -> Optional[dict[str, Any]]:
+        for file in reversed(self._files()):
+            try:
+                with open(file, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                continue
+        return None
+
+    def save(self, stats: list[FlowStats], taken_at: float):
+        os.makedirs(self.path, exist_ok=True)
+        snapshot = {
+            'taken_at': taken_at,
+            'flows': {s.id: [s.calls, s.success, s.failure] for s in stats}
+        }
+        file = os.path.join(self.path, f'{int(taken_at * 1000):015d}.json')
+        tmp = f'{file}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, file)
+
+        for old in self._files()[:-max_snapshots]:
+            os.remove(old)
+
+
+def collect(flows: Iterable[Flow], previous: Optional[dict[str, Any]], now: float) -> tuple[list[FlowStats], Totals]:
+    """Builds per-flow stats and totals, with deltas against `previous` when given."""
+    before: dict[str, list[int]] = previous['flows'] if previous else {}
+    elapsed = now - previous['taken_at'] if previous else 0
+
+    stats: list[FlowStats] = []
+    totals = Totals(since=previous['taken_at'] if previous else None)
+    if previous:
+        totals.new_calls = totals.new_failures = 0
+
+    for flow in flows:
+        a = flow.analytics
+        s = FlowStats(flow.id, flow.name, a.calls, a.success, a.failure)
+        if previous:
+            # Flows created since the last snapshot count from zero.
+            calls, _, failure = before.get(flow.id, (0, 0, 0))
+            s.new_calls = max(a.calls - calls, 0)
+            s.new_failures = max(a.failure - failure, 0)
+            s.calls_per_minute = s.new_calls / elapsed * 60 if elapsed > 0 else None
+            totals.new_calls += s.new_calls  # type: ignore
+            totals.new_failures += s.new_failures  # type: ignore
+        stats.append(s)
+
+        totals.flows += 1
+        totals.calls += a.calls
+        totals.success += a.success
+        totals.failure += a.failure
+    return stats, totals
+
+
+def rank(stats: list[FlowStats], by: str, top: Optional[int], min_calls: int = 0) -> list[FlowStats]:
+    """The `top` flows by `by`. Failure rates only rank flows with `min_calls` calls."""
+    keys = {
+        'calls': lambda s: s.calls,
+        'failures': lambda s: s.failure,
+        'failure-rate': lambda s: s.failure_rate or 0,
+        'new-calls': lambda s: s.new_calls or 0,
+        'new-failures': lambda s: s.new_failures or 0,
+    }
+    if by == 'failure-rate':
+        stats = [s for s in stats if s.calls >= min_calls]
+    ranked = sorted(stats, key=keys[by], reverse=True)
+    return ranked[:top] if top else ranked
+
+
+def write_json(stats: list[FlowStats], totals: Totals, fp: TextIO):
+    json.dump({'totals': totals.as_dict(), 'flows': [s.as_dict() for s in stats]}, fp, indent=2)
+    fp.write('\n')
+
+
+def write_csv(stats: list[FlowStats], fp: TextIO):
+    fields = list(FlowStats.__dataclass_fields__) + ['success_rate', 'failure_rate']
+    writer = csv.DictWriter(fp, fieldnames=fields)
+    writer.writeheader()
+    for s in stats:
+        writer.writerow(s.as_dict())
+
+
+def percent(rate: Optional[float]) -> str:
+    return '-' if rate is None else f'{rate * 100:.1f}%'
+
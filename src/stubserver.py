@@ -0,0 +1,302 @@
+import re
+import gzip
+import json
+import time
+import random
+import threading
+
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Optional
+from urllib.parse import urlsplit, parse_qsl
+
+from rflow._upload import apply_delta, code_hash
+
+# (status, headers, body)
+Response = tuple[int, dict[str, str], bytes]
+
+
+class StubRequest:
+    def __init__(self, method: str, path: str, query: dict[str, str],
+                 headers: dict[str, str], body: bytes, match: re.Match[str]) -> None:
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.match = match
+
+    def json(self) -> Any:
+        return json.loads(self.body or b'null')
+
+
+Handler = Callable[[StubRequest], Response]
+
+
+def decode_body(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'zstd':
+        import zstandard  # type: ignore
+        return zstandard.ZstdDecompressor().decompress(body)
+    return body
+
+
+def json_response(data: Any, status: int = 200, headers: Optional[dict[str, str]] = None) -> Response:
+    return status, {'Content-Type': 'application/json', **(headers or {})}, json.dumps(data).encode()
+
+
+@dataclass
+class Fault:
+    """A failure injected into requests matching `method` and `pattern`; see `StubServer.inject`."""
+    method: str
+    pattern: re.Pattern[str]
+    status: Optional[int] = None  # answer with this status instead of routing
+    delay: float = 0.0  # seconds to wait before answering
+    drop: bool = False  # close the connection without answering
+    retry_after: Optional[float] = None  # sent as Retry-After with `status`
+    times: Optional[int] = None  # stop after this many hits; None for no limit
+    rate: float = 1.0  # chance of hitting a matching request
+    hits: int = 0
+
+    def active(self) -> bool:
+        return self.times is None or self.hits < self.times
+
+
+class StubServer:
+    """
+    A local HTTP server with pluggable routes, for benchmarks and for trying
+    the client against something other than the real API. Faults can be
+    injected to see how the client copes with a slow or failing server.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, seed: Optional[int] = None) -> None:
+        self.routes: list[tuple[str, re.Pattern[str], Handler]] = []
+        self.faults: list[Fault] = []
+        self.requests = 0
+        self.bytes_received = 0
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, format: str, *args: Any):
+                pass
+
+            def _dispatch(self):
+                stub.requests += 1
+                url = urlsplit(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                stub.bytes_received += len(body)
+                body = decode_body(body, self.headers.get('Content-Encoding'))
+
+                fault = stub._fault(self.command, url.path)
+                if fault and fault.delay:
+                    time.sleep(fault.delay)
+                if fault and fault.drop:
+                    self.close_connection = True
+                    return
+
+                status, headers, data = 404, {}, b'{"detail": "Not Found"}'
+                if fault and fault.status:
+                    extra = {'Retry-After': f'{fault.retry_after:g}'} if fault.retry_after is not None else {}
+                    status, headers, data = json_response({'detail': 'Injected fault'}, fault.status, extra)
+                else:
+                    for method, pattern, handler in stub.routes:
+                        match = pattern.fullmatch(url.path)
+                        if match and method in (self.command, '*'):
+                            request = StubRequest(self.command, url.path, dict(parse_qsl(url.query)),
+                                                  dict(self.headers.items()), body, match)
+                            status, headers, data = handler(request)
+                            break
+
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except ConnectionError:
+                    self.close_connection = True  # the client gave up, e.g. after a timeout
+
+            do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = do_HEAD = _dispatch
+
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def route(self, method: str, pattern: str, handler: Handler):
+        self.routes.append((method, re.compile(pattern), handler))
+
+    def inject(self, method: str, pattern: str, **options: Any) -> Fault:
+        """
+        Makes requests matching `method` ('*' for any) and the path regex
+        `pattern` fail as `options` say (see `Fault`). Faults are checked in the
+        order they were added; the first active match applies.
+        """
+        fault = Fault(method, re.compile(pattern), **options)
+        self.faults.append(fault)
+        return fault
+
+    def clear_faults(self):
+        self.faults.clear()
+
+    def _fault(self, method: str, path: str) -> Optional[Fault]:
+        with self._lock:
+            for fault in self.faults:
+                if fault.method not in (method, '*') or not fault.pattern.fullmatch(path):
+                    continue
+                if not fault.active() or self.random.random() >= fault.rate:
+                    continue
+                fault.hits += 1
+                return fault
+        return None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_: Any):
+        self.stop()
+
+
+# Sort keys /flows/list accepts besides plain flow fields.
+sort_fields: dict[str, Any] = {
+    'created': 'created_at',
+    'modified': 'last_modified',
+    'calls': lambda flow: flow['analytics']['calls'],
+}
+
+
+class FakeAPI:
+    """
+    An in-memory stand-in for the flows API, mounted on a `StubServer`.
+    `features` is what it advertises in /misc/lua_config and honours.
+    """
+
+    def __init__(self, server: StubServer, flow_count: int = 10,
+                 features: tuple[str, ...] = ('gzip', 'zstd', 'code-hash', 'code-delta'),
+                 call_latency: float = 0.0) -> None:
+        self.server = server
+        self.features = list(features)
+        # Seconds each hook call takes, to stand in for a flow's run time.
+        self.call_latency = call_latency
+        self.user = {'id': 'user', 'username': 'stub', 'created_at': int(time.time())}
+        self.flows: dict[str, dict[str, Any]] = {}
+        self.code: dict[str, str] = {}
+        for i in range(flow_count):
+            self.add_flow(f'flow {i}', {}, 'print("Hello, World!")')
+
+        server.route('GET', r'/auth/me', lambda _: json_response(self.user))
+        server.route('GET', r'/flows/list', self._list_flows)
+        server.route('GET', r'/flows/my/([^/]+)', self._get_flow)
+        server.route('GET', r'/flows/my/([^/]+)/code', self._get_code)
+        server.route('PATCH', r'/flows/update_info/([^/]+)', self._update_info)
+        server.route('PATCH', r'/flows/update', self._update_code)
+        server.route('POST', r'/flows/new', self._new_flow)
+        server.route('GET', r'/misc/lua_config',
+                     lambda _: json_response({'modules': [], 'features': self.features}))
+        server.route('*', r'/flows/call/([^/]+)', self._call)
+
+    def _list_flows(self, request: StubRequest) -> Response:
+        flows = list(self.flows.values())
+        query = request.query
+        if 'q' in query:
+            flows = [f for f in flows if query['q'].lower() in f['name'].lower()]
+        if 'sort' in query:
+            field = sort_fields.get(query['sort'], query['sort'])
+            flows.sort(key=lambda f: field(f) if callable(field) else f.get(field),
+                       reverse=query.get('order') == 'desc')
+        if 'limit' in query:
+            offset = int(query.get('offset', 0))
+            flows = flows[offset:offset + int(query['limit'])]
+        return json_response(flows)
+
+    def add_flow(self, name: str, env: dict[str, str], code: str) -> dict[str, Any]:
+        now = int(time.time())
+        flow_id = f'{len(self.flows):08x}'
+        flow = {
+            'id': flow_id, 'name': name, 'author': self.user['id'],
+            'created_at': now, 'last_modified': now, 'env': env,
+            'analytics': {'calls': 0, 'success': 0, 'failure': 0}
+        }
+        self.flows[flow_id] = flow
+        self.code[flow_id] = code
+        return flow
+
+    def _not_found(self) -> Response:
+        return json_response({'detail': 'Flow not found'}, 404)
+
+    def _get_flow(self, request: StubRequest) -> Response:
+        flow = self.flows.get(request.match.group(1))
+        return json_response(flow) if flow else self._not_found()
+
+    def _get_code(self, request: StubRequest) -> Response:
+        flow_id = request.match.group(1)
+        return json_response(self.code[flow_id]) if flow_id in self.code else self._not_found()
+
+    def _update_info(self, request: StubRequest) -> Response:
+        flow = self.flows.get(request.match.group(1))
+        if not flow:
+            return self._not_found()
+        data = request.json()
+        flow.update(name=data['name'], env=data['env'], last_modified=int(time.time()))
+        return json_response(flow)
+
+    def _update_code(self, request: StubRequest) -> Response:
+        data = request.json()
+        flow = self.flows.get(data['id'])
+        if not flow:
+            return self._not_found()
+        current = self.code[data['id']]
+        if 'code' in data:
+            code = data['code']
+        elif 'delta' in data and 'code-delta' in self.features:
+            if code_hash(current) != data['base_hash']:
+                return json_response({'detail': 'Base version does not match'}, 412)
+            code = apply_delta(current, data['delta'])
+        elif 'hash' in data and 'code-hash' in self.features:
+            if code_hash(current) != data['hash']:
+                return json_response({'detail': 'Code does not match'}, 412)
+            return json_response(flow)
+        else:
+            return json_response({'detail': 'Missing code'}, 400)
+
+        if 'hash' in data and code_hash(code) != data['hash']:
+            return json_response({'detail': 'Code does not match its hash'}, 412)
+        self.code[data['id']] = code
+        flow['last_modified'] = int(time.time())
+        return json_response(flow)
+
+    def _new_flow(self, request: StubRequest) -> Response:
+        data = request.json()
+        return json_response(self.add_flow(data['name'], data['env'], data['code']))
+
+    def _call(self, request: StubRequest) -> Response:
+        flow = self.flows.get(request.match.group(1))
+        if not flow:
+            return self._not_found()
+        if self.call_latency:
+            time.sleep(self.call_latency)
+        flow['analytics']['calls'] += 1
+        flow['analytics']['success'] += 1
+        return json_response({'ok': True})
@@ -0,0 +1,221 @@
+import os
+import sys
+import time
+import atexit
+import threading
+import functools
+import contextvars
+
+from typing import Any, Callable, Optional
+
+
+default_trace_file = os.path.join('.rflow', 'trace.json')
+
+
+class _NullSpan:
+    """What `span` returns while tracing is off: does nothing, as cheaply as possible."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_: Any):
+        return None
+
+    def set(self, **args: Any):
+        pass
+
+
+_null = _NullSpan()
+_tracer: Optional['Tracer'] = None
+_parent: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('rflow_span', default=None)
+
+
+class SpanStats:
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0  # nanoseconds
+        self.own = 0  # nanoseconds not spent in child spans
+        self.max = 0
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'category', 'args', 'start', 'children', 'parent', '_token')
+
+    def __init__(self, tracer: 'Tracer', name: str, category: str, args: dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.children = 0
+
+    def set(self, **args: Any):
+        """Attaches more arguments, like a status only known at the end."""
+        self.args.update(args)
+
+    def __enter__(self):
+        self.parent = _parent.get()
+        self._token = _parent.set(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type: Any, *_: Any):
+        end = time.perf_counter_ns()
+        _parent.reset(self._token)
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        if self.parent is not None:
+            self.parent.children += end - self.start
+        self.tracer.record(self, end)
+        return None
+
+
+class Tracer:
+    """Collects finished spans as Chrome trace events and per-name totals."""
+
+    def __init__(self) -> None:
+        self.origin = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.events: list[dict[str, Any]] = []
+        self.stats: dict[str, SpanStats] = {}
+        self._tracks: dict[Any, int] = {}
+        self._lock = threading.Lock()
+
+    def _track(self) -> int:
+        # Concurrent asyncio tasks overlap, so each gets its own track.
+        key: Any = threading.get_ident()
+        if 'asyncio' in sys.modules:
+            import asyncio
+            try:
+                task = asyncio.current_task()
+            except RuntimeError:
+                task = None
+            if task is not None:
+                key = (key, id(task))
+        track = self._tracks.get(key)
+        if track is None:
+            track = self._tracks[key] = len(self._tracks) + 1
+        return track
+
+    def record(self, span: Span, end: int):
+        duration = end - span.start
+        with self._lock:
+            self.events.append({
+                'name': span.name,
+                'cat': span.category,
+                'ph': 'X',
+                'ts': (span.start - self.origin) / 1000,
+                'dur': duration / 1000,
+                'pid': self.pid,
+                'tid': self._track(),
+                'args': span.args,
+            })
+            stats = self.stats.get(span.name)
+            if stats is None:
+                stats = self.stats[span.name] = SpanStats()
+            stats.count += 1
+            stats.total += duration
+            stats.own += max(0, duration - span.children)
+            stats.max = max(stats.max, duration)
+
+    def write(self, path: str):
+        """Writes the Chrome trace format, which chrome://tracing, Perfetto and speedscope open."""
+        import json
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f, default=str)
+
+
+def span(name: str, category: str = 'cli', **args: Any) -> Any:
+    """
+    A context manager timing the block as `name`. Spans nest by context, so
+    a span opened inside another becomes its child. Returns a shared no-op
+    while tracing is off.
+    """
+    if _tracer is None:
+        return _null
+    return Span(_tracer, name, category, args)
+
+
+def _wrap(fn: Callable[..., Any], name: str, category: str) -> Callable[..., Any]:
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if _tracer is None:
+            return fn(*args, **kwargs)
+        with Span(_tracer, name, category, {}):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+# (owner, attribute, span name, category) for everything `instrument` was asked to wrap.
+_instrumented: list[tuple[Any, str, str, str]] = []
+
+
+def instrument(owner: Any, methods: dict[str, str], category: str = 'cli'):
+    """
+    Makes each call to `owner.<attribute>` a span named `methods[attribute]`.
+    The methods are only replaced once tracing is enabled, so code called for
+    every script run costs nothing extra while it's off.
+    """
+    for attribute, name in methods.items():
+        _instrumented.append((owner, attribute, name, category))
+        if _tracer is not None:
+            setattr(owner, attribute, _wrap(getattr(owner, attribute), name, category))
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def enable(path: str = default_trace_file, summary: bool = True) -> 'Tracer':
+    """Starts tracing. At exit the trace is written to `path` and, with `summary`, a table printed to stderr."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+        for owner, attribute, name, category in _instrumented:
+            setattr(owner, attribute, _wrap(getattr(owner, attribute), name, category))
+        atexit.register(_finish, _tracer, path, summary)
+        if hasattr(os, 'register_at_fork'):
+            # Worker processes would only collect spans nobody writes out.
+            os.register_at_fork(after_in_child=disable)
+    return _tracer
+
+
+def disable():
+    global _tracer
+    _tracer = None
+
+
+def _finish(tracer: Tracer, path: str, summary: bool):
+    if os.getpid() != tracer.pid:
+        return  # a forked child; the parent writes the trace
+    tracer.write(path)
+    if summary:
+        print_summary(tracer, path)
+
+
+def print_summary(tracer: Tracer, path: str, top: int = 20):
+    from rich.table import Table
+    from rich.markup import escape
+    from utils import get_console
+
+    elapsed = time.perf_counter_ns() - tracer.origin
+    table = Table(title=f"Trace ({elapsed / 1e6:.1f} ms)")
+    table.add_column('Span', no_wrap=True)
+    table.add_column('Calls', justify='right')
+    table.add_column('Total ms', justify='right')
+    table.add_column('Self ms', justify='right')
+    table.add_column('Max ms', justify='right')
+    table.add_column('% of run', justify='right')
+    ranked = sorted(tracer.stats.items(), key=lambda item: item[1].own, reverse=True)
+    for name, stats in ranked[:top]:
+        table.add_row(escape(name), str(stats.count), f"{stats.total / 1e6:.2f}",
+                      f"{stats.own / 1e6:.2f}", f"{stats.max / 1e6:.2f}",
+                      f"{stats.total / elapsed * 100:.1f}%" if elapsed else '-')
+
+    console = get_console(stderr=True)
+    console.print(table)
+    console.print(f"[dim]{len(tracer.events)} spans written to {escape(path)}[/dim]")
@@ -1,6 +1,19 @@
 from datetime import datetime
+from typing import Any
 
-import httpx
+_consoles: dict[bool, Any] = {}
+
+
+def get_console(stderr: bool = False):
+    """The shared rich console, created (and rich imported) on first use."""
+    if stderr not in _consoles:
+        from rich.console import Console
+        _consoles[stderr] = Console(stderr=stderr)
+    return _consoles[stderr]
+
+
+def print(*objects: Any, **kwargs: Any):
+    get_console().print(*objects, **kwargs)
 
 
 def readable_time(timestamp: int):
@@ -31,8 +44,11 @@ readme = [
 def get_readme():
     return dict_to_markdown(readme)
 
+rewrite_helper_url = "https://raw.githubusercontent.com/dragsbruh/rewrite-cli/main/src/custom_lmods/rewrite.lua"
+
+
 def get_rewrite_helper_code():
-    url = "https://raw.githubusercontent.com/dragsbruh/rewrite-cli/main/src/custom_lmods/rewrite.lua"
-    response = httpx.get(url)
+    import httpx
+    response = httpx.get(rewrite_helper_url)
     response.raise_for_status()
     return response.text
@@ -0,0 +1,163 @@
+import os
+import time
+
+from typing import Any, Callable, Optional
+
+import toml
+import lupa  # type: ignore
+
+from luasb import LuaSandbox
+from luasb.bytecode import ChunkCache, default_cache_dir
+from luasb.marshal import to_lua
+from luasb._exceptions import LuaRuntimeError
+from flowconf import FlowConfigError, parse_flow_config, read_flow_config
+from runner import build_payload, diff_results
+
+# What each watched file feeds, in the order a change has to be applied.
+watched_files = {
+    'rflow.config.toml': 'env',
+    'payload.toml': 'payload',
+    'main.lua': 'script',
+}
+
+# Copies a converted payload table for one run, so the script can't change
+# the copy later runs start from. Cheaper than converting from Python again.
+_copy_code = """
+local next, type = next, type
+local function copy(v)
+    if type(v) ~= 'table' then return v end
+    local c = {}
+    for k, x in next, v do c[k] = copy(x) end
+    return c
+end
+return copy
+"""
+
+
+class FlowWatcher:
+    """Polls a flow directory and reports which kinds of input changed since the last poll."""
+
+    def __init__(self, path: str = '.') -> None:
+        self.path = path
+        self._seen: dict[str, tuple[int, int]] = {}
+
+    def _snapshot(self) -> dict[str, tuple[int, int]]:
+        files = [os.path.join(self.path, name) for name in watched_files]
+        modules = os.path.join(self.path, 'lua_modules')
+        if os.path.isdir(modules):
+            files.extend(os.path.join(modules, name) for name in os.listdir(modules))
+
+        snapshot: dict[str, tuple[int, int]] = {}
+        for file in files:
+            try:
+                st = os.stat(file)
+            except OSError:
+                continue
+            snapshot[file] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def poll(self) -> set[str]:
+        current = self._snapshot()
+        changed = {file for file in current.keys() | self._seen.keys()
+                   if current.get(file) != self._seen.get(file)}
+        self._seen = current
+
+        kinds: set[str] = set()
+        for file in changed:
+            if os.path.basename(os.path.dirname(file)) == 'lua_modules':
+                kinds.add('modules')
+            else:
+                kinds.add(watched_files[os.path.basename(file)])
+        return kinds
+
+
+class WatchSession:
+    """
+    Keeps one warm sandbox for a flow directory and, on each change, redoes
+    only the affected work: re-reading the script, the payload or the env, or
+    rebuilding the sandbox when lua_modules changed. Only payload values that
+    differ from the last run are converted to Lua again.
+    """
+
+    def __init__(self, path: str = '.', sandbox_options: Optional[dict[str, Any]] = None,
+                 print_fn: Optional[Callable[[str], None]] = None) -> None:
+        self.path = path
+        self.sandbox_options = sandbox_options or {}
+        self.print_fn = print_fn
+        self.chunk_cache = ChunkCache(default_cache_dir)
+
+        self.sandbox: Optional[LuaSandbox] = None
+        self.code = ''
+        self.env: dict[str, Any] = {}
+        self.rpayload: dict[str, Any] = {}
+        self.previous: Optional[Any] = None
+        # Changes not applied yet because applying an earlier one failed.
+        self.pending: set[str] = set()
+
+        self.values: dict[str, Any] = {}  # the payload globals, as Python values
+        self.converted: list[str] = []  # the globals converted again by the last apply
+        self._lua_values: dict[str, Any] = {}
+        self._copy: Any = None
+
+    def apply(self, changes: set[str]):
+        self.pending |= changes
+        if 'modules' in self.pending or self.sandbox is None:
+            self.sandbox = None  # so a broken module is retried on the next change
+            self._lua_values = {}
+            self.sandbox = LuaSandbox(modules_dir=os.path.join(self.path, 'lua_modules'),
+                                      chunk_cache=self.chunk_cache, preload_modules=True,
+                                      print_fn=self.print_fn, **self.sandbox_options)
+            self._copy = self.sandbox.runtime.execute(_copy_code)
+            self.pending.discard('modules')
+        if 'env' in self.pending:
+            _, self.env, _ = parse_flow_config(read_flow_config(self.path))
+            self.pending.discard('env')
+        if 'payload' in self.pending:
+            payload_path = os.path.join(self.path, 'payload.toml')
+            self.rpayload = {}
+            if os.path.exists(payload_path):
+                with open(payload_path, 'r') as f:
+                    self.rpayload = toml.load(f)
+            self.pending.discard('payload')
+        if 'script' in self.pending:
+            with open(os.path.join(self.path, 'main.lua'), 'r') as f:
+                self.code = f.read()
+            self.pending.discard('script')
+        self._convert_values()
+
+    def _convert_values(self):
+        values = build_payload(self.rpayload, self.env)
+        self.converted = [name for name, value in values.items()
+                          if name not in self._lua_values or self.values.get(name) != value]
+        for name in self.converted:
+            self._lua_values[name] = to_lua(self.sandbox.runtime, values[name])  # type: ignore
+        self.values = values
+
+    def _inject_values(self, sb: LuaSandbox):
+        for name, value in self._lua_values.items():
+            sb.lua_globals[name] = self._copy(value)
+
+    def run(self, changes: set[str]) -> tuple[Optional[Any], list[str], float, Optional[str]]:
+        """Applies `changes` and runs once. Returns the Result, its diff against the last run, the time and any error."""
+        start = time.perf_counter()
+        try:
+            self.apply(changes)
+        except LuaRuntimeError as e:
+            return None, [], time.perf_counter() - start, f'Error loading modules: {e.message}'
+        except lupa.LuaError as e:
+            return None, [], time.perf_counter() - start, f'Error loading modules: {e}'
+        except (OSError, FlowConfigError, toml.TomlDecodeError) as e:
+            return None, [], time.perf_counter() - start, getattr(e, 'message', str(e))
+
+        sb: LuaSandbox = self.sandbox  # type: ignore
+        sb.reset()
+        self._inject_values(sb)
+        try:
+            sb.execute(self.code)
+        except LuaRuntimeError as e:
+            return None, [], time.perf_counter() - start, e.message
+        elapsed = time.perf_counter() - start
+
+        diff = diff_results(self.previous, sb.Result) if self.previous is not None else []
+        self.previous = sb.Result
+        return sb.Result, diff, elapsed, None
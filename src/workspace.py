@@ -0,0 +1,138 @@
+import os
+import json
+import asyncio
+import toml
+
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from rflow import AsyncRewriteFlow
+from rflow._exceptions import RewriteFlowError
+from bundle import BundleError, bundle
+from flowconf import (FlowConfigError, digest, find_flow_dirs, parse_flow_config,
+                      read_flow_config, script_file, validate_env)
+
+state_file = os.path.join('.rflow', 'publish-state.json')
+
+
+@dataclass
+class FlowPlan:
+    path: str
+    name: str
+    id: Optional[str]
+    env: dict[str, str]
+    code: str
+    code_hash: str
+    info_hash: str
+    actions: list[str] = field(default_factory=list)
+    error: Optional[str] = None
+    warnings: list[str] = field(default_factory=list)
+    done: bool = False  # every action went through
+
+
+def load_state(root: str) -> dict[str, dict[str, Any]]:
+    try:
+        with open(os.path.join(root, state_file), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(root: str, state: dict[str, dict[str, Any]]):
+    path = os.path.join(root, state_file)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def plan_workspace(root: str, force: bool = False, bundled: Optional[bool] = None) -> tuple[list[FlowPlan], dict[str, dict[str, Any]]]:
+    """
+    Reads every flow under `root` and works out which API calls each one needs.
+    Flows are bundled when `bundled` says so, or their config does when it is None.
+    """
+    state = load_state(root)
+    plans: list[FlowPlan] = []
+    for path in find_flow_dirs(root):
+        key = os.path.relpath(path, root)
+        try:
+            fconf = read_flow_config(path)
+            name, renv, id = parse_flow_config(fconf)
+            env, warnings = validate_env(renv)
+            with open(os.path.join(path, script_file), 'r') as f:
+                code = f.read()
+            if fconf.get('bundle', False) if bundled is None else bundled:
+                code = bundle(code, os.path.join(path, 'lua_modules')).code
+        except (FlowConfigError, BundleError, OSError) as e:
+            plans.append(FlowPlan(key, key, None, {}, '', '', '',
+                                  error=getattr(e, 'message', str(e))))
+            continue
+
+        plan = FlowPlan(key, name, id, env, code, digest(code),
+                        digest({'name': name, 'env': env}), warnings=warnings)
+        previous = state.get(key, {})
+        if not id:
+            plan.actions.append('create')
+        else:
+            if force or previous.get('id') != id or previous.get('info') != plan.info_hash:
+                plan.actions.append('update info')
+            if force or previous.get('id') != id or previous.get('code') != plan.code_hash:
+                plan.actions.append('update code')
+        plans.append(plan)
+    return plans, state
+
+
+async def _publish(arf: AsyncRewriteFlow, root: str, plan: FlowPlan):
+    try:
+        if 'create' in plan.actions:
+            flow = await arf.create_flow(plan.name, plan.env, plan.code)
+            plan.id = flow.id
+
+            path = os.path.join(root, plan.path)
+            fconf = read_flow_config(path)
+            fconf['_rf'] = {
+                'id': flow.id
+            }
+            with open(os.path.join(path, 'rflow.config.toml'), 'w') as f:
+                toml.dump(fconf, f)
+        else:
+            if 'update info' in plan.actions:
+                await arf.update_flow_info(plan.id, plan.name, plan.env)  # type: ignore
+            if 'update code' in plan.actions:
+                await arf.set_my_code(plan.id, plan.code)  # type: ignore
+        plan.done = True
+    except RewriteFlowError as e:
+        plan.error = getattr(e, 'message', str(e))
+    except Exception as e:
+        plan.error = f'{type(e).__name__}: {e}'
+
+
+async def publish_workspace(
+    arf: AsyncRewriteFlow,
+    root: str,
+    plans: list[FlowPlan],
+    state: dict[str, dict[str, Any]]
+):
+    """
+    Publishes the flows that changed and records what was published in the
+    state file. Only flows whose every call finished are recorded, so an
+    interrupted run leaves the rest to be published next time.
+    """
+    pending = [plan for plan in plans if plan.actions and not plan.error]
+    try:
+        await arf.map(lambda plan: _publish(arf, root, plan), pending)
+    finally:
+        for plan in pending:
+            if plan.done:
+                state[plan.path] = {'id': plan.id, 'code': plan.code_hash,
+                                    'info': plan.info_hash}
+        save_state(root, state)
+
+
+def run_publish_workspace(arf: AsyncRewriteFlow, root: str, plans: list[FlowPlan],
+                          state: dict[str, dict[str, Any]]):
+    async def run():
+        async with arf:
+            await publish_workspace(arf, root, plans, state)
+    asyncio.run(run())
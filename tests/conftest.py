@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+# Cache directories are read at import time; keep test runs out of the real ones.
+os.environ['XDG_CACHE_HOME'] = tempfile.mkdtemp(prefix='rflow-tests-')
+
+
+@pytest.fixture
+def modules_dir(tmp_path):
+    path = tmp_path / 'lua_modules'
+    path.mkdir()
+    return str(path)
+
+
+@pytest.fixture
+def stub():
+    from stubserver import StubServer
+
+    server = StubServer(seed=0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def api(stub):
+    from stubserver import FakeAPI
+
+    return FakeAPI(stub, flow_count=5)
+
+
+@pytest.fixture
+def rflow_cli(stub, tmp_path, monkeypatch):
+    """Points the shared client the commands use at the stub and returns a function running `rflow ...`."""
+    import rflow
+    from click.testing import CliRunner
+    from rflow._client import RewriteFlow
+    from main import cli
+
+    monkeypatch.setattr(RewriteFlow, 'conf_path', str(tmp_path / 'rfconf.toml'))
+    monkeypatch.setenv('RFLOW_NO_CACHE', '1')
+    base_url = object.__getattribute__(rflow.rf, '_base_url')
+    object.__setattr__(rflow.rf, '_base_url', stub.url)
+    object.__setattr__(rflow.rf, '_client', None)
+
+    def invoke(*args: str):
+        return CliRunner().invoke(cli, list(args), catch_exceptions=False)
+
+    yield invoke
+    object.__setattr__(rflow.rf, '_base_url', base_url)
+    object.__setattr__(rflow.rf, '_client', None)
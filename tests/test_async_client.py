@@ -0,0 +1,99 @@
+import time
+import asyncio
+import threading
+import importlib.util
+
+import pytest
+
+from rflow._async import AsyncRewriteFlow
+from rflow._cache import ResponseCache
+from rflow._client import RewriteFlow
+from rflow._exceptions import NotFoundError
+from rflow._retry import RetryPolicy
+from stubserver import FakeAPI, json_response
+
+
+@pytest.fixture(autouse=True)
+def no_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(RewriteFlow, 'conf_path', str(tmp_path / 'rfconf.toml'))
+
+
+def test_map_keeps_order_and_bounds_concurrency(stub):
+    lock = threading.Lock()
+    in_flight = {'now': 0, 'max': 0}
+    api: FakeAPI
+
+    def slow_flow(request):
+        with lock:
+            in_flight['now'] += 1
+            in_flight['max'] = max(in_flight['max'], in_flight['now'])
+        time.sleep(0.05)
+        with lock:
+            in_flight['now'] -= 1
+        flow = api.flows.get(request.match.group(1))
+        return json_response(flow) if flow else json_response({'detail': 'Flow not found'}, 404)
+
+    # Registered first, so it wins over FakeAPI's own route.
+    stub.route('GET', r'/flows/my/([^/]+)', slow_flow)
+    api = FakeAPI(stub, 6)
+
+    async def main():
+        async with AsyncRewriteFlow(stub.url, max_concurrency=2) as arf:
+            ids = [f'{i:08x}' for i in reversed(range(6))]
+            flows = await arf.map(arf.get_my_flow, ids)
+            missing = await arf.map(arf.get_my_flow, ['00000000', 'ffffffff'], return_exceptions=True)
+            return ids, flows, missing
+
+    ids, flows, missing = asyncio.run(main())
+    assert [f.id for f in flows] == ids
+    assert in_flight['max'] == 2
+    assert missing[0].id == '00000000'  # type: ignore
+    assert isinstance(missing[1], NotFoundError)
+
+
+def test_from_client_shares_credentials_caches_and_policy(stub, tmp_path):
+    seen: list[str] = []
+
+    def me(request):
+        seen.append(request.headers.get('Authorization'))
+        return json_response(api.user)
+
+    stub.route('GET', r'/auth/me', me)
+    api = FakeAPI(stub, 1)
+    rf = RewriteFlow(stub.url, cache=ResponseCache(str(tmp_path / 'responses')),
+                     policy=RetryPolicy(attempts=2))
+    rf._auth = 'token'
+
+    async def main():
+        async with AsyncRewriteFlow.from_client(rf, max_concurrency=3) as arf:
+            assert arf.cache is rf.cache and arf.policy is rf.policy
+            assert arf.code_store is rf.code_store
+            assert arf.semaphore._value == 3
+            await arf.me()
+            # /auth/me is cached for a while, so the second call doesn't go out.
+            return await arf.me()
+
+    user = asyncio.run(main())
+    assert user.username == 'stub'
+    assert seen == ['token']
+    assert rf.cache.hits == 1  # type: ignore
+    assert rf.policy.stats.requests == 1
+
+
+def test_writes_go_through(stub, api):
+    async def main():
+        async with AsyncRewriteFlow(stub.url) as arf:
+            created = await arf.create_flow('new', {'k': 'v'}, 'Result = {}')
+            await arf.update_flow_info(created.id, 'renamed', {})
+            return created, await arf.get_my_flows()
+
+    created, flows = asyncio.run(main())
+    assert api.flows[created.id]['name'] == 'renamed'
+    assert api.code[created.id] == 'Result = {}'
+    assert created.id in [f.id for f in flows]
+
+
+@pytest.mark.skipif(importlib.util.find_spec('h2') is not None, reason='h2 is installed')
+def test_http2_needs_h2():
+    with pytest.raises(ImportError, match='h2'):
+        AsyncRewriteFlow('http://127.0.0.1:1', http2=True)
@@ -0,0 +1,25 @@
+import json
+
+from click.testing import CliRunner
+
+import bench
+
+
+def test_filter_builds_only_selected_benchmarks(tmp_path, monkeypatch):
+    import luasb
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(luasb.modules, 'modules_dir', '')
+    def no_payloads(*_):
+        raise AssertionError('payload built for a benchmark that was filtered out')
+
+    monkeypatch.setattr(bench, 'synthetic_payload', no_payloads)
+    result = CliRunner().invoke(bench.bench, ['run', '-k', 'sandbox.execute', '-n', '3'])
+    assert result.exit_code == 0, result.output
+    report = json.loads(result.stdout[result.stdout.index('{'):])
+    assert list(report['results']) == ['sandbox.execute']
+
+
+def test_synthetic_payload_is_roughly_the_asked_size():
+    body = bench.synthetic_payload(64 * 1024)
+    assert 64 * 1024 <= len(json.dumps(body)) < 70 * 1024
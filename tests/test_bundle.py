@@ -0,0 +1,145 @@
+import os
+
+import pytest
+
+from bundle import (COMMENT, NAME, NUMBER, OP, SPACE, STRING, BundleError, _needs_space,
+                    _string_value, bundle, find_requires, minify, module_file, tokenize)
+from luasb import LuaSandbox
+
+
+def write_modules(modules_dir: str, modules: dict[str, str]):
+    for name, source in modules.items():
+        path = module_file(modules_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(source)
+
+
+def run(modules_dir: str, code: str):
+    sb = LuaSandbox(modules_dir=modules_dir)
+    sb.execute(code)
+    return sb.Result
+
+
+def test_tokenize_round_trips():
+    source = '#!/usr/bin/lua\nlocal s = [==[a]]b]==] --[[ c ]] x = 0x1p4 .. "q\\"" -- end\n'
+    tokens = tokenize(source)
+    assert ''.join(text for _, text in tokens) == source
+    assert (COMMENT, '#!/usr/bin/lua') == tokens[0]
+    assert (STRING, '[==[a]]b]==]') in tokens
+    assert (COMMENT, '--[[ c ]]') in tokens
+    assert (NUMBER, '0x1p4') in tokens
+    assert (OP, '..') in tokens
+    assert (STRING, '"q\\""') in tokens
+    assert (COMMENT, '-- end') in tokens
+    assert (NAME, 'local') in tokens and (SPACE, ' ') in tokens
+
+
+@pytest.mark.parametrize('source', ['x = "abc', 'x = [[abc', '--[==[ abc ]]'])
+def test_tokenize_rejects_unfinished(source):
+    with pytest.raises(BundleError):
+        tokenize(source)
+
+
+@pytest.mark.parametrize('left, right, needed', [
+    ('local', 'x', True),
+    ('1', 'end', True),
+    ('a', '-', False),
+    ('-', '-', True),
+    ('1', '..', True),
+    ('x', '..', False),
+    ('[', '[', True),
+    ('(', 'x', False),
+    ('x', ')', False),
+    ('"a"', 'x', False),
+    ('=', '=', True),
+])
+def test_needs_space(left, right, needed):
+    assert _needs_space(left, right) == needed
+
+
+def test_minify():
+    assert minify('local  x = 1 -- one\n--[[ block ]]\nreturn x\n') == 'local x=1 return x'
+    assert minify('return a - -b') == 'return a- -b'
+    assert minify('return 1 .. 2') == 'return 1 ..2'
+
+
+@pytest.mark.parametrize('token, value', [
+    ('"plain"', 'plain'),
+    ("'single'", 'single'),
+    ('"esc\\n"', None),
+    ('[[long]]', 'long'),
+    ('[==[\nfirst newline dropped]==]', 'first newline dropped'),
+])
+def test_string_value(token, value):
+    assert _string_value(token) == value
+
+
+def test_find_requires():
+    source = '''
+        local a = require 'a'
+        local b = require("b.c")
+        local c = require [[d]]
+        local again = require('a')
+        local dyn = require(name)
+        local field = x.require('not-a-module')
+        -- require 'commented'
+        local esc = require "e\\x66"
+    '''
+    assert find_requires(source) == (['a', 'b.c', 'd'], 2)
+
+
+def test_module_file():
+    assert module_file('lua_modules', 'a.b') == os.path.join('lua_modules', 'a', 'b.lua')
+
+
+def test_bundle_inlines_in_dependency_order(modules_dir):
+    write_modules(modules_dir, {
+        'a': 'local b = require("b") return { v = b.v + 1 }',
+        'b': 'return { v = 1 }',
+        'spare': 'return {}',
+    })
+    result = bundle('local a = require("a")\nlocal m = require("math")\nResult.v = a.v', modules_dir)
+    assert result.modules == ['b', 'a']
+    assert result.external == ['math']
+    assert result.unused == ['spare']
+    assert result.warnings == []
+    assert result.source_bytes > len('local a')
+    assert result.modules_bytes == sum(
+        os.path.getsize(os.path.join(modules_dir, f)) for f in os.listdir(modules_dir))
+
+
+def test_dynamic_require_warns_and_skips_unused(modules_dir):
+    write_modules(modules_dir, {'a': 'return 1', 'spare': 'return 2'})
+    result = bundle('local name = "a" local a = require(name)', modules_dir)
+    assert len(result.warnings) == 1
+    assert 'main.lua' in result.warnings[0]
+    assert result.unused == []
+
+
+def test_bundle_reports_parse_errors(modules_dir):
+    with pytest.raises(BundleError, match='Could not parse'):
+        bundle('x = "unfinished', modules_dir)
+
+
+@pytest.mark.parametrize('code', [
+    'local a, b = 5, 3 Result.v = a- -b',
+    'Result.v = [==[x]]y]==]',
+    'Result.v = "a\\z\n          b"',
+    'Result.v = 1 ..2',
+    'Result.v = 0x10 + 1e1 + .5',
+    'local t = { [ [[k]] ] = 1 } Result.v = t.k',
+])
+def test_bundled_and_unbundled_results_match(modules_dir, code):
+    assert run(modules_dir, bundle(code, modules_dir).code) == run(modules_dir, code)
+
+
+def test_bundled_modules_run_once(modules_dir):
+    write_modules(modules_dir, {
+        'counter': 'count = (count or 0) + 1 return { n = count }',
+        'user': 'return require("counter").n',
+    })
+    code = 'local a = require("counter") local b = require("user") Result.v = { a.n, b, count }'
+    bundled = bundle(code, modules_dir)
+    assert bundled.modules == ['counter', 'user']
+    assert run(modules_dir, bundled.code) == {'v': [1, 1, 1]}
@@ -0,0 +1,120 @@
+import os
+import stat
+
+import pytest
+
+from luasb import LuaSandbox
+from luasb.bytecode import ChunkCache
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / 'bytecode')
+
+
+def entries(path: str) -> list[str]:
+    return sorted(name for name in os.listdir(path) if name.endswith('.luac'))
+
+
+def test_memory_hits_and_misses():
+    cache = ChunkCache()
+    key, chunk = cache.get('return 1', '=main.lua')
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert cache.get('return 1', '=main.lua') == (key, chunk)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.get('return 2', '=main.lua')[0] != key
+
+
+def test_disk_cache_warms_the_next_process(cache_dir):
+    key, chunk = ChunkCache(cache_dir).get('return 1', '=main.lua')
+    assert entries(cache_dir) == [f'{key}.luac']
+
+    cache = ChunkCache(cache_dir)
+    assert cache.get('return 1', '=main.lua') == (key, chunk)
+    assert (cache.hits, cache.misses, cache.rejected) == (1, 0, 0)
+
+
+def test_keys_depend_on_lua_version_and_chunkname():
+    cache = ChunkCache()
+    key = cache.key('return 1', '=main.lua')
+    assert cache.key('return 1', '=other.lua') != key
+    cache._version = b'Lua 5.1'
+    assert cache.key('return 1', '=main.lua') != key
+
+
+def test_store_is_private(cache_dir):
+    key, _ = ChunkCache(cache_dir).get('return 1', '=main.lua')
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(os.path.join(cache_dir, f'{key}.luac')).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(os.path.join(cache_dir, 'key')).st_mode) == 0o600
+
+
+def test_loose_permissions_are_tightened(cache_dir):
+    os.makedirs(cache_dir)
+    os.chmod(cache_dir, 0o777)
+    ChunkCache(cache_dir)
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+
+
+def test_tampered_entry_is_rejected(cache_dir):
+    key, chunk = ChunkCache(cache_dir).get('Result.x = 1', '=main.lua')
+    file = os.path.join(cache_dir, f'{key}.luac')
+    with open(file, 'rb') as f:
+        data = bytearray(f.read())
+    data[-1] ^= 0xff
+    with open(file, 'wb') as f:
+        f.write(data)
+
+    cache = ChunkCache(cache_dir)
+    assert cache.get('Result.x = 1', '=main.lua') == (key, chunk)
+    assert (cache.rejected, cache.misses) == (1, 1)
+
+
+def test_planted_bytecode_is_not_loaded(cache_dir, modules_dir):
+    # Bytecode compiled elsewhere (here: a different script) under the key of the real one.
+    cache = ChunkCache(cache_dir)
+    key = cache.key('Result.x = 1', '=main.lua')
+    _, evil = ChunkCache().get('Result.x = "planted"', '=main.lua')
+    with open(os.path.join(cache_dir, f'{key}.luac'), 'wb') as f:
+        f.write(evil)
+
+    sb = LuaSandbox(modules_dir=modules_dir, chunk_cache=ChunkCache(cache_dir))
+    sb.execute('Result.x = 1')
+    assert sb.Result == {'x': 1}
+    assert sb.chunk_cache.rejected == 1
+
+
+def test_renamed_entry_is_rejected(cache_dir):
+    cache = ChunkCache(cache_dir)
+    key_a, _ = cache.get('Result.x = 1', '=main.lua')
+    key_b = cache.key('Result.x = 2', '=main.lua')
+    os.replace(os.path.join(cache_dir, f'{key_a}.luac'), os.path.join(cache_dir, f'{key_b}.luac'))
+
+    fresh = ChunkCache(cache_dir)
+    fresh.get('Result.x = 2', '=main.lua')
+    assert fresh.rejected == 1
+
+
+def test_entries_signed_with_another_key_are_rejected(tmp_path):
+    first, second = str(tmp_path / 'a'), str(tmp_path / 'b')
+    key, _ = ChunkCache(first).get('return 1', '=main.lua')
+    os.makedirs(second, mode=0o700)
+    os.replace(os.path.join(first, f'{key}.luac'), os.path.join(second, f'{key}.luac'))
+    cache = ChunkCache(second)
+    cache.get('return 1', '=main.lua')
+    assert cache.rejected == 1
+
+
+def test_least_recently_used_entries_are_pruned(cache_dir):
+    cache = ChunkCache(cache_dir, max_entries=5)
+    for i in range(60):
+        cache.get(f'return {i}', '=main.lua')
+    assert len(entries(cache_dir)) <= 5 + 49  # pruned every 50 writes
+    for i in range(60):
+        file = os.path.join(cache_dir, f'{cache.key(f"return {i}", "=main.lua")}.luac')
+        if os.path.exists(file):
+            os.utime(file, ns=(i * 10**9, i * 10**9))
+    ChunkCache(cache_dir, max_entries=5)
+    kept = entries(cache_dir)
+    assert len(kept) == 5
+    assert f'{cache.key("return 59", "=main.lua")}.luac' in kept
@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+from stubserver import FakeAPI, json_response
+from rflow._client import RewriteFlow
+
+
+def strict_json(text: str):
+    def reject(constant: str):
+        raise ValueError(f'{constant} is not JSON')
+    return json.loads(text, parse_constant=reject)
+
+
+@pytest.fixture(autouse=True)
+def no_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(RewriteFlow, 'conf_path', str(tmp_path / 'rfconf.toml'))
+
+
+def test_listing_pages_through_every_flow(stub):
+    FakeAPI(stub, 7)
+    rf = RewriteFlow(stub.url)
+    before = stub.requests
+    flows = list(rf.iter_my_flows(page_size=3, batch_size=2))
+    assert [f.id for f in flows] == [f'{i:08x}' for i in range(7)]
+    assert stub.requests - before == 3
+
+    flows = list(rf.iter_my_flows(page_size=3, sort='name', descending=True, search='flow 1'))
+    assert [f.name for f in flows] == ['flow 1']
+
+
+def test_listing_stops_when_the_server_ignores_limit(stub):
+    api = FakeAPI(stub, 5)
+    stub.route('GET', r'/flows/list', lambda _: json_response(list(api.flows.values())))
+    rf = RewriteFlow(stub.url)
+    assert len(list(rf.iter_my_flows(page_size=2))) == 5
+
+
+def test_show_ids(stub, rflow_cli):
+    FakeAPI(stub, 4)
+    result = rflow_cli('flows', 'show', '--ids-only')
+    assert result.exit_code == 0, result.output
+    assert result.output.split() == [f'{i:08x}' for i in range(4)]
+
+
+def test_stats_ranks_and_compares_with_the_last_snapshot(stub, rflow_cli):
+    api = FakeAPI(stub, 4)
+    api.flows['00000002']['analytics'].update(calls=50, success=40, failure=10)
+    result = rflow_cli('flows', 'stats', '--top', '2', '--format', 'json')
+    assert result.exit_code == 0, result.output
+    report = strict_json(result.output)
+    assert report['totals']['calls'] == 50
+    assert report['totals']['since'] is None
+    assert [f['id'] for f in report['flows']] == ['00000002', '00000000']
+
+    api.flows['00000003']['analytics'].update(calls=20, success=20)
+    report = strict_json(rflow_cli('flows', 'stats', '--by', 'new-calls', '--top', '1',
+                                   '--format', 'json').output)
+    assert report['totals']['new_calls'] == 20
+    assert report['flows'][0]['id'] == '00000003'
+
+    result = rflow_cli('flows', 'stats', '--format', 'csv', '--no-snapshot')
+    assert result.output.splitlines()[0].startswith('id,name,calls')
+
+
+def test_pull_all_mirrors_incrementally(stub, rflow_cli, tmp_path):
+    api = FakeAPI(stub, 6)
+    root = tmp_path / 'mirror'
+
+    result = rflow_cli('flows', 'pull', '--all', '--into', str(root))
+    assert result.exit_code == 0, result.output
+    assert '6 new' in result.output
+    assert (root / 'flow-3' / 'main.lua').read_text() == api.code['00000003']
+
+    before = stub.requests
+    result = rflow_cli('flows', 'pull', '--all', '--into', str(root))
+    assert '6 unchanged' in result.output
+    assert stub.requests - before == 1  # just the listing
+
+    api.code['00000001'] = 'print("changed")'
+    api.flows['00000001']['last_modified'] += 1
+    (root / 'flow-2' / 'main.lua').write_text('local edit')
+    api.flows['00000002']['last_modified'] += 1
+    del api.flows['00000004']
+    result = rflow_cli('flows', 'pull', '--all', '--into', str(root))
+    assert '1 conflict, 3 unchanged, 1 updated' in result.output
+    assert 'no longer exist remotely' in result.output
+    assert (root / 'flow-1' / 'main.lua').read_text() == 'print("changed")'
+    assert (root / 'flow-2' / 'main.lua').read_text() == 'local edit'
+    assert (root / 'flow-4').is_dir()
+
+    result = rflow_cli('flows', 'pull', '--all', '--into', str(root), '--force')
+    assert result.exit_code == 0, result.output
+    assert (root / 'flow-2' / 'main.lua').read_text() == api.code['00000002']
+
+
+def test_loadtest_against_the_stub(stub, rflow_cli):
+    api = FakeAPI(stub, 2)
+    result = rflow_cli('flows', 'loadtest', '--url', f'{stub.url}/flows/call/00000001',
+                       '-n', '40', '-c', '4', '--json')
+    assert result.exit_code == 0, result.output
+    report = strict_json(result.output)
+    assert report['sent'] == 40 and report['ok'] == 40 and report['failed'] == 0
+    assert sum(count for _, count in report['histogram']) == 40
+    assert report['histogram'][-1][0] is None
+    assert api.flows['00000001']['analytics']['calls'] == 40
+
+
+def test_loadtest_reports_errors(stub, rflow_cli):
+    FakeAPI(stub, 1)
+    result = rflow_cli('flows', 'loadtest', '--url', f'{stub.url}/flows/call/missing', '-n', '5', '--json')
+    report = strict_json(result.output)
+    assert report['ok'] == 0
+    assert report['errors'] == {'HTTP 404': 5}
+
+
+def test_loadtest_rate(stub, rflow_cli):
+    FakeAPI(stub, 1)
+    result = rflow_cli('flows', 'loadtest', '--url', f'{stub.url}/flows/call/00000000',
+                       '--rate', '100', '-d', '0.5', '--json')
+    report = strict_json(result.output)
+    assert 40 <= report['sent'] <= 55
@@ -0,0 +1,25 @@
+import pytest
+
+from rflow import _LazyClient
+from rflow._cache import ResponseCache
+from rflow._client import RewriteFlow
+from rflow._upload import CodeStore
+
+
+@pytest.fixture(autouse=True)
+def no_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(RewriteFlow, 'conf_path', str(tmp_path / 'rfconf.toml'))
+
+
+def test_no_cache_keeps_the_code_store(monkeypatch):
+    monkeypatch.setenv('RFLOW_NO_CACHE', '1')
+    client = _LazyClient('http://127.0.0.1:1')._get()
+    assert client.cache is None
+    assert isinstance(client.code_store, CodeStore)
+
+
+def test_default_client_caches_responses(monkeypatch):
+    monkeypatch.delenv('RFLOW_NO_CACHE', raising=False)
+    client = _LazyClient('http://127.0.0.1:1')._get()
+    assert isinstance(client.cache, ResponseCache)
+    assert isinstance(client.code_store, CodeStore)
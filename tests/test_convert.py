@@ -0,0 +1,103 @@
+import io
+import json
+
+import pytest
+from lupa import LuaRuntime  # type: ignore
+
+from luasb import convert
+from luasb.convert import ResultLimits, lua_to_python, write_json
+from luasb._exceptions import ResultTooLargeError
+
+
+@pytest.fixture
+def lua():
+    return LuaRuntime(unpack_returned_tuples=True)
+
+
+def nested(lua, levels: int):
+    return lua.execute(f'''
+        local t = {{ leaf = true }}
+        for i = 1, {levels} do t = {{ child = t }} end
+        return t
+    ''')
+
+
+def dump(table, limits=None, buffer_size=64 * 1024) -> str:
+    fp = io.StringIO()
+    written = write_json(table, fp, limits, buffer_size=buffer_size)
+    assert written == len(fp.getvalue())
+    return fp.getvalue()
+
+
+def test_shapes(lua):
+    table = lua.execute('''
+        return { list = {1, 2, 'x'}, empty = {}, map = { a = 1, [2] = true },
+                 holes = { [1] = 1, [3] = 3 }, nested = { { id = 1 }, { id = 2 } } }
+    ''')
+    expected = {'list': [1, 2, 'x'], 'empty': {}, 'map': {'a': 1, '2': True},
+                'holes': {'1': 1, '3': 3}, 'nested': [{'id': 1}, {'id': 2}]}
+    result = lua_to_python(table)
+    # lua_to_python keeps integer keys of non-sequences as ints
+    assert result['map'] == {'a': 1, 2: True}
+    assert json.loads(json.dumps(result)) == expected
+    assert json.loads(dump(table)) == expected
+
+
+def test_write_json_buffers(lua):
+    table = lua.execute('local t = {} for i = 1, 500 do t[i] = "value " .. i end return t')
+    text = dump(table, buffer_size=64)
+    assert json.loads(text) == [f'value {i}' for i in range(1, 501)]
+
+
+def test_non_tables_become_empty_objects():
+    assert lua_to_python(None) == {}
+    assert dump(None) == '{}'
+
+
+@pytest.mark.parametrize('convert_fn', [lua_to_python, dump])
+def test_depth_limit(lua, convert_fn):
+    limits = ResultLimits(max_depth=10)
+    convert_fn(nested(lua, 8), limits)
+    with pytest.raises(ResultTooLargeError, match='deeper than 10'):
+        convert_fn(nested(lua, 20), limits)
+
+
+@pytest.mark.parametrize('convert_fn', [lua_to_python, dump])
+def test_node_limit(lua, convert_fn):
+    limits = ResultLimits(max_nodes=100)
+    convert_fn(lua.execute('local t = {} for i = 1, 90 do t[i] = i end return t'), limits)
+    with pytest.raises(ResultTooLargeError, match='more than 100 values'):
+        convert_fn(lua.execute('local t = {} for i = 1, 101 do t[i] = i end return t'), limits)
+    with pytest.raises(ResultTooLargeError, match='more than 100 values'):
+        convert_fn(lua.execute('local t = {} for i = 1, 60 do t[i] = {i} end return t'), limits)
+
+
+@pytest.mark.parametrize('convert_fn', [lua_to_python, dump])
+def test_byte_limit(lua, convert_fn):
+    limits = ResultLimits(max_bytes=1000)
+    convert_fn(lua.execute('return { s = string.rep("x", 900) }'), limits)
+    with pytest.raises(ResultTooLargeError, match='larger than 1000 bytes'):
+        convert_fn(lua.execute('return { s = string.rep("x", 1001) }'), limits)
+    with pytest.raises(ResultTooLargeError, match='larger than 1000 bytes'):
+        convert_fn(lua.execute('local t = {} for i = 1, 20 do t[i] = string.rep("x", 60) end return t'), limits)
+
+
+@pytest.mark.parametrize('convert_fn', [lua_to_python, dump])
+def test_huge_children_are_not_listed_whole(lua, monkeypatch, convert_fn):
+    listed: list[int] = []
+    islice = convert.islice
+
+    def counting_islice(iterable, stop):
+        items = list(islice(iterable, stop))
+        listed.append(len(items))
+        return items
+
+    monkeypatch.setattr(convert, 'islice', counting_islice)
+    table = lua.execute('''
+        local big = {}
+        for i = 1, 100000 do big[i] = i end
+        return { a = big, b = big, c = big }
+    ''')
+    with pytest.raises(ResultTooLargeError):
+        convert_fn(table, ResultLimits(max_nodes=50))
+    assert max(listed) <= 51
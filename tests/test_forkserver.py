@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from luasb import ForkServer
+from runner import PayloadCase, run_batch
+
+LOOP = 'while true do end'
+
+
+def test_runs_script_with_values(modules_dir):
+    server = ForkServer('print("hi " .. body.name) Result.greeting = "hi " .. body.name',
+                        modules_dir=modules_dir)
+    result = server.run({'body': {'name': 'x'}})
+    assert result.ok
+    assert result.result == {'greeting': 'hi x'}
+    assert result.output == ['hi x']
+    assert result.elapsed > 0
+    assert server.forks == 1
+
+
+def test_runs_share_no_state(modules_dir):
+    code = '''
+        count = (count or 0) + 1
+        Result.count = count
+        Result.leaked = string.leak
+        string.leak = true
+    '''
+    server = ForkServer(code, modules_dir=modules_dir)
+    results = [result for _, result in server.map([{}] * 4, 2)]
+    assert [r.result for r in results] == [{'count': 1}] * 4
+    # The template itself never ran the script.
+    assert server.template.lua_globals.count is None
+
+
+def test_script_errors_are_results(modules_dir):
+    result = ForkServer('error("nope")', modules_dir=modules_dir).run({})
+    assert not result.ok
+    assert 'nope' in result.error
+
+
+def test_cpu_limit(modules_dir):
+    result = ForkServer(LOOP, cpu_seconds=0.5, modules_dir=modules_dir).run({})
+    assert not result.ok
+    assert result.error == 'Script stopped: CPU time limit exceeded'
+
+
+def test_memory_limit(modules_dir):
+    code = '''
+        local t = {}
+        for i = 1, 1e9 do t[i] = string.rep("x", 1024) .. i end
+    '''
+    server = ForkServer(code, memory_bytes=64 * 1024 * 1024, max_memory=0,
+                        modules_dir=modules_dir)
+    result = server.run({})
+    assert not result.ok
+    assert result.error == 'Script stopped: memory limit exceeded'
+
+
+def test_kill_after(modules_dir):
+    start = time.perf_counter()
+    result = ForkServer(LOOP, kill_after=0.3, modules_dir=modules_dir).run({})
+    assert not result.ok
+    assert result.error == 'Script stopped: wall time limit exceeded'
+    assert time.perf_counter() - start < 5
+
+
+@pytest.mark.parametrize('concurrency', [1, 3])
+def test_map_yields_every_index(modules_dir, concurrency):
+    server = ForkServer('Result.n = body.n * 2', modules_dir=modules_dir)
+    results = dict(server.map(({'body': {'n': n}} for n in range(6)), concurrency))
+    assert {index: r.result['n'] for index, r in results.items()} == {n: n * 2 for n in range(6)}
+
+
+def test_run_batch_fork_matches_pool(modules_dir):
+    code = '''
+        if body.fail then error("asked to fail") end
+        Result.doubled = body.n * 2
+    '''
+    cases = [
+        PayloadCase('a', body={'n': 1}, expected={'doubled': 2}),
+        PayloadCase('b', body={'n': 2}, expected={'doubled': 5}),
+        PayloadCase('c', body={'fail': True}),
+    ]
+    pooled, _ = run_batch(cases, code, {}, modules_dir, workers=1)
+    forked, _ = run_batch(cases, code, {}, modules_dir, workers=2, fork_options={})
+
+    def summary(results):
+        return [(r.name, r.ok, r.result, r.error, r.diff) for r in results]
+
+    assert summary(forked) == summary(pooled)
+    assert [r.ok for r in forked] == [True, False, False]
@@ -0,0 +1,38 @@
+import pytest
+
+from luasb import LuaSandbox
+from luasb.limits import ExecutionMetrics
+from luasb._exceptions import ExecutionLimitError
+
+
+def test_short_script_is_shown_below_one_step(modules_dir):
+    sb = LuaSandbox(modules_dir=modules_dir)
+    sb.execute('Result.x = 1')
+    assert sb.metrics.instructions == 0
+    assert sb.metrics.instruction_step == 1000
+    assert sb.metrics.instructions_label == '<1000'
+
+
+def test_count_is_a_lower_bound(modules_dir):
+    sb = LuaSandbox(modules_dir=modules_dir)
+    sb.execute('local x = 0 for i = 1, 5000 do x = x + i end Result.x = x')
+    count = sb.metrics.instructions
+    assert count > 0 and count % 1000 == 0
+    assert sb.metrics.instructions_label == f'≥{count}'
+
+
+def test_step_follows_the_profile_interval(modules_dir):
+    sb = LuaSandbox(modules_dir=modules_dir, profile=True, profile_interval=100)
+    sb.execute('local x = 0 for i = 1, 500 do x = x + i end')
+    assert sb.metrics.instruction_step == 100
+    assert sb.metrics.instructions > 0
+
+
+def test_instruction_limit(modules_dir):
+    sb = LuaSandbox(modules_dir=modules_dir, max_instructions=10_000)
+    with pytest.raises(ExecutionLimitError, match='instruction limit'):
+        sb.execute('while true do end')
+
+
+def test_label_without_a_step():
+    assert ExecutionMetrics().instructions_label == '0'
@@ -0,0 +1,135 @@
+import pytest
+
+from luasb import LuaSandbox
+
+
+# A cut-down JSON encoder in the style of the usual Lua libraries: it tells
+# arrays from objects with next/rawget/#, which is what lazy proxies used to
+# get wrong.
+ENCODER = '''
+local function encode(v)
+    if type(v) ~= 'table' then
+        return type(v) == 'string' and string.format('%q', v) or tostring(v)
+    end
+    if next(v) == nil then return '{}' end
+    if rawget(v, 1) ~= nil or #v > 0 then
+        local out = {}
+        for i = 1, #v do out[#out + 1] = encode(v[i]) end
+        return '[' .. table.concat(out, ',') .. ']'
+    end
+    local keys = {}
+    for k in pairs(v) do keys[#keys + 1] = tostring(k) end
+    table.sort(keys)
+    local out = {}
+    for _, k in ipairs(keys) do out[#out + 1] = k .. '=' .. encode(v[k]) end
+    return '{' .. table.concat(out, ',') .. '}'
+end
+'''
+
+BODY = {
+    'name': 'a]]b',
+    'code': 'x = [[nested]] ]]',
+    'items': [{'id': 1, 'tags': ['x', ']]']}, {'id': 2, 'tags': []}],
+    'empty': {},
+    'nested': {'a': {'b': {'c': 'd'}}},
+}
+
+
+def deep(levels: int) -> dict:
+    tree: dict = {'leaf': ']]'}
+    for i in range(levels):
+        tree = {'level': i, 'child': tree}
+    return tree
+
+
+def run(modules_dir: str, lazy: bool, code: str, **values):
+    sb = LuaSandbox(modules_dir=modules_dir, lazy_values=lazy)
+    sb.inject_values(values)
+    sb.execute(ENCODER + code)
+    return sb.Result
+
+
+def both(modules_dir: str, code: str, **values):
+    eager = run(modules_dir, False, code, **values)
+    lazy = run(modules_dir, True, code, **values)
+    assert lazy == eager
+    return eager
+
+
+def test_next_and_len_on_untouched_tables(modules_dir):
+    result = both(modules_dir, '''
+        Result.has_key = next(body) ~= nil
+        Result.dict_len = #body
+        Result.items_len = #body.items
+        Result.empty_next = next(body.empty) == nil
+        Result.empty_len = #body.empty
+    ''', body=BODY)
+    assert result == {'has_key': True, 'dict_len': 0, 'items_len': 2,
+                      'empty_next': True, 'empty_len': 0}
+
+
+def test_raw_access_on_untouched_tables(modules_dir):
+    result = both(modules_dir, '''
+        Result.name = rawget(body, 'name')
+        Result.first_id = rawget(body.items, 1).id
+        Result.rawlen = rawlen(body.items)
+        Result.dict_rawlen = rawlen(body.nested)
+    ''', body=BODY)
+    assert result == {'name': 'a]]b', 'first_id': 1, 'rawlen': 2, 'dict_rawlen': 0}
+
+
+def test_encoding_whole_payload(modules_dir):
+    result = both(modules_dir, 'Result.json = encode(body)', body=BODY)
+    assert ']]' in result['json']
+
+
+def test_bodies_with_long_bracket_terminators(modules_dir):
+    result = both(modules_dir, '''
+        Result.name = body.name
+        Result.code = body.code
+        Result.tag = body.items[1].tags[2]
+    ''', body=BODY)
+    assert result == {'name': 'a]]b', 'code': 'x = [[nested]] ]]', 'tag': ']]'}
+
+
+def test_deep_trees(modules_dir):
+    result = both(modules_dir, '''
+        local node, depth = body, 0
+        while node.child do node, depth = node.child, depth + 1 end
+        Result.depth = depth
+        Result.leaf = node.leaf
+        Result.json = #encode(body)
+    ''', body=deep(150))
+    assert result['depth'] == 150
+    assert result['leaf'] == ']]'
+
+
+def test_iteration_and_mutation(modules_dir):
+    both(modules_dir, '''
+        local n = 0
+        for _ in pairs(body) do n = n + 1 end
+        Result.keys = n
+        local ids = {}
+        for _, item in ipairs(body.items) do ids[#ids + 1] = item.id end
+        Result.ids = ids
+        table.insert(body.items, { id = 3 })
+        Result.after = #body.items
+        body.extra = true
+        rawset(body.nested, 'x', 1)
+        body.items[2] = nil
+        Result.shrunk = #body.items
+        Result.json = encode(body)
+    ''', body=BODY)
+
+
+def test_lists_with_holes(modules_dir):
+    both(modules_dir, '''
+        Result.second = values[2] == nil
+        Result.third = values[3]
+    ''', values=[1, None, 3])
+
+
+def test_lazy_needs_a_lazy_sandbox(modules_dir):
+    sb = LuaSandbox(modules_dir=modules_dir)
+    with pytest.raises(ValueError):
+        sb.inject_values({'body': BODY}, lazy=True)
@@ -0,0 +1,50 @@
+import pytest
+
+from stubserver import FakeAPI
+from rflow._client import RewriteFlow
+from rflow._models import Flow
+from mirror import load_manifest, plan_mirror
+
+
+@pytest.fixture(autouse=True)
+def no_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(RewriteFlow, 'conf_path', str(tmp_path / 'rfconf.toml'))
+
+
+def flow(flow_id: str, name: str, last_modified: int = 1) -> Flow:
+    return Flow.model_validate({
+        'id': flow_id, 'name': name, 'author': 'user', 'created_at': 1,
+        'last_modified': last_modified, 'env': {},
+        'analytics': {'calls': 0, 'success': 0, 'failure': 0}
+    })
+
+
+def test_new_flows_never_reuse_existing_directories(tmp_path):
+    (tmp_path / 'foo').mkdir()
+    (tmp_path / 'foo-00000002').write_text('a file')
+    entries = plan_mirror(str(tmp_path), [flow('00000001', 'foo'), flow('00000002', 'foo'),
+                                          flow('00000003', 'bar'), flow('00000004', 'bar')], {})
+    assert [e.path for e in entries] == ['foo-00000001', 'foo-00000002-2', 'bar', 'bar-00000004']
+    assert all(e.status == 'new' for e in entries)
+
+
+def test_unsafe_names(tmp_path):
+    entries = plan_mirror(str(tmp_path), [flow('00000001', '../.rflow'), flow('00000002', '///')], {})
+    assert [e.path for e in entries] == ['rflow', '00000002']
+
+
+def test_pull_all_keeps_local_directories(stub, rflow_cli, tmp_path):
+    api = FakeAPI(stub, 2)
+    api.flows['00000001']['name'] = 'foo'
+    root = tmp_path / 'mirror'
+    local = root / 'foo'
+    local.mkdir(parents=True)
+    (local / 'main.lua').write_text('local work')
+    (local / 'rflow.config.toml').write_text('name = "foo"\n\n[_rf]\nid = "elsewhere"\n')
+
+    result = rflow_cli('flows', 'pull', '--all', '--into', str(root))
+    assert result.exit_code == 0, result.output
+    assert (local / 'main.lua').read_text() == 'local work'
+    assert 'elsewhere' in (local / 'rflow.config.toml').read_text()
+    assert (root / 'foo-00000001' / 'main.lua').read_text() == api.code['00000001']
+    assert load_manifest(str(root))['00000001']['path'] == 'foo-00000001'
@@ -0,0 +1,108 @@
+import os
+
+import httpx
+import pytest
+
+import modcache
+from modcache import ModuleCache, fetch_modules, link_or_copy
+
+SOURCE = b'return { version = 1 }\n'
+
+
+@pytest.fixture
+def module_server(stub):
+    """Serves SOURCE at /mods/m.lua with validators, recording conditional headers."""
+    seen: list[dict[str, str]] = []
+
+    def module(request):
+        seen.append(request.headers)
+        if request.headers.get('If-None-Match') == '"v1"':
+            return 304, {'ETag': '"v1"'}, b''
+        return 200, {'ETag': '"v1"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}, SOURCE
+
+    stub.route('GET', '/mods/m.lua', module)
+    return stub, seen
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ModuleCache(str(tmp_path / 'modules'))
+
+
+def test_revalidates_with_etag_and_last_modified(module_server, cache):
+    stub, seen = module_server
+    url = f'{stub.url}/mods/m.lua'
+    with httpx.Client() as client:
+        path = cache.fetch(client, url)
+        assert open(path, 'rb').read() == SOURCE
+        assert 'If-None-Match' not in seen[0]
+
+        assert cache.fetch(client, url) == path
+    assert seen[1]['If-None-Match'] == '"v1"'
+    assert seen[1]['If-Modified-Since'] == 'Mon, 01 Jan 2024 00:00:00 GMT'
+
+    cache.save()
+    reloaded = ModuleCache(cache.path)
+    assert reloaded.index[url]['etag'] == '"v1"'
+
+
+def test_damaged_blob_is_downloaded_again(module_server, cache):
+    stub, seen = module_server
+    url = f'{stub.url}/mods/m.lua'
+    with httpx.Client() as client:
+        path = cache.fetch(client, url)
+        os.chmod(path, 0o644)
+        with open(path, 'wb') as f:
+            f.write(b'tampered')
+
+        assert cache.fetch(client, url) == path
+    assert 'If-None-Match' not in seen[1]
+    assert open(path, 'rb').read() == SOURCE
+
+
+def test_blobs_are_read_only(module_server, cache):
+    stub, _ = module_server
+    with httpx.Client() as client:
+        path = cache.fetch(client, f'{stub.url}/mods/m.lua')
+    assert os.stat(path).st_mode & 0o222 == 0
+
+
+def test_cached_copy_is_used_offline(module_server, cache):
+    stub, _ = module_server
+    url = f'{stub.url}/mods/m.lua'
+    with httpx.Client() as client:
+        path = cache.fetch(client, url)
+        stub.inject('GET', '/mods/m.lua', drop=True)
+        assert cache.fetch(client, url) == path
+
+
+def test_link_or_copy_falls_back_to_copying(tmp_path, monkeypatch):
+    source = tmp_path / 'blob'
+    source.write_bytes(SOURCE)
+    linked = tmp_path / 'linked.lua'
+    link_or_copy(str(source), str(linked))
+    assert os.path.samefile(source, linked)
+
+    def cross_device(*_):
+        raise OSError(18, 'Invalid cross-device link')
+
+    monkeypatch.setattr(modcache.os, 'link', cross_device)
+    copied = tmp_path / 'copied.lua'
+    copied.write_bytes(b'old')
+    link_or_copy(str(source), str(copied))
+    assert copied.read_bytes() == SOURCE
+    assert not os.path.samefile(source, copied)
+
+
+def test_fetch_modules_places_files_and_reports_errors(module_server, cache, tmp_path):
+    stub, _ = module_server
+    good = f'{stub.url}/mods/m.lua'
+    missing = f'{stub.url}/mods/missing.lua'
+    targets = {good: str(tmp_path / 'm.lua'), missing: str(tmp_path / 'missing.lua')}
+
+    errors = fetch_modules(targets, cache, workers=2)
+    assert list(errors) == [missing]
+    assert '404' in errors[missing]
+    assert open(targets[good], 'rb').read() == SOURCE
+    assert not os.path.exists(targets[missing])
+    assert good in ModuleCache(cache.path).index
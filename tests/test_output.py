@@ -0,0 +1,92 @@
+import io
+
+import pytest
+
+from luasb import LuaSandbox
+from luasb._exceptions import LuaRuntimeError
+from luasb.output import (CallbackSink, OutputCapture, OutputSink, RingBufferSink, StreamSink,
+                          truncation_marker)
+
+
+class CountingStream(io.StringIO):
+    def __init__(self) -> None:
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text: str) -> int:
+        self.writes += 1
+        return super().write(text)
+
+
+def test_sinks_must_implement_write():
+    with pytest.raises(TypeError):
+        OutputSink()  # type: ignore
+
+    class Incomplete(OutputSink):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()  # type: ignore
+
+
+def test_ring_buffer_keeps_the_last_lines():
+    sink = RingBufferSink(max_lines=3)
+    for i in range(5):
+        sink.write(str(i))
+    assert sink.lines == ['2', '3', '4']
+    sink.clear()
+    assert sink.lines == []
+
+
+def test_stream_sink_batches_writes():
+    fp = CountingStream()
+    sink = StreamSink(fp, flush_bytes=10)
+    sink.write('abc')
+    sink.write('def')
+    assert fp.getvalue() == ''
+    sink.write('ghi')  # 12 bytes with newlines
+    assert fp.getvalue() == 'abc\ndef\nghi\n'
+    assert fp.writes == 1
+
+    sink.write('x')
+    sink.close()
+    assert fp.getvalue().endswith('ghi\nx\n')
+
+
+def test_capture_truncates_with_a_marker():
+    lines: list[str] = []
+    capture = OutputCapture([CallbackSink(lines.append)], max_bytes=10, max_lines=100)
+    assert capture.write('12345') == '12345'
+    assert capture.write('67890') == truncation_marker(10)
+    assert capture.write('more') is None
+    assert lines == ['12345', truncation_marker(10)]
+    assert capture.buffer.lines == lines
+    assert capture.truncated and capture.written == 17
+
+    capture.reset()
+    assert not capture.truncated and capture.written == 0 and capture.buffer.lines == []
+
+
+def test_sandbox_output_limit(modules_dir):
+    sb = LuaSandbox(modules_dir=modules_dir, max_output_bytes=20)
+    sb.execute('for i = 1, 100 do print("line " .. i) end')
+    assert sb.output == ['line 1', 'line 2', truncation_marker(20)]
+    assert sb.output_truncated
+    # Counts what the script tried to print, not just what was kept.
+    assert sb.metrics.output_bytes == sum(len(f'line {i}') + 1 for i in range(1, 101))
+
+    sb.reset()
+    sb.execute('print("again")')
+    assert sb.output == ['again']
+    assert not sb.output_truncated
+
+
+def test_stream_sinks_are_flushed_after_each_run(modules_dir):
+    fp = io.StringIO()
+    sb = LuaSandbox(modules_dir=modules_dir, output_sinks=[StreamSink(fp, flush_bytes=1 << 20)])
+    sb.execute('print("one") print("two")')
+    assert fp.getvalue() == 'one\ntwo\n'
+
+    with pytest.raises(LuaRuntimeError):
+        sb.execute('print("before error") error("x")')
+    assert fp.getvalue().endswith('before error\n')
@@ -0,0 +1,34 @@
+from luasb import SandboxPool
+
+
+def run(pool: SandboxPool, code: str):
+    with pool.checkout({}) as sb:
+        sb.execute(code)
+        return sb.Result
+
+
+def test_reset_restores_library_metatables(modules_dir):
+    pool = SandboxPool(size=1, modules_dir=modules_dir)
+    run(pool, """
+        setmetatable(math, { __index = function() return 7 end })
+        setmetatable(table, { __metatable = 'locked' })
+        setmetatable(_G, { __index = function() return 1 end })
+    """)
+    result = run(pool, """
+        Result.math = math.nope
+        Result.table = getmetatable(table)
+        Result.global = not_defined
+    """)
+    assert result == {}
+
+
+def test_reset_restores_string_metatable(modules_dir):
+    pool = SandboxPool(size=1, modules_dir=modules_dir)
+    run(pool, "getmetatable('').__index = { upper = function() return 'hijacked' end }")
+    assert run(pool, "Result.s = ('x'):upper()") == {'s': 'X'}
+
+
+def test_reset_restores_globals_and_library_fields(modules_dir):
+    pool = SandboxPool(size=1, modules_dir=modules_dir)
+    run(pool, "leaked = 1 math.floor = nil string.extra = true")
+    assert run(pool, "Result.leaked = leaked Result.floor = math.floor(1.5) Result.extra = string.extra") == {'floor': 1}
@@ -0,0 +1,73 @@
+import io
+
+import pytest
+
+from luasb import LuaSandbox
+from luasb._exceptions import ExecutionLimitError
+
+NESTED = '''
+local function inner(n) local s = 0 for i = 1, n do s = s + i end return s end
+local function outer() local t = 0 for i = 1, 200 do t = t + inner(100) end return t end
+Result.v = outer()
+'''
+
+
+def folded(sb: LuaSandbox) -> dict[str, int]:
+    fp = io.StringIO()
+    sb.last_profile().write_folded(fp)  # type: ignore
+    weights = {}
+    for line in fp.getvalue().splitlines():
+        stack, weight = line.rsplit(' ', 1)
+        weights[stack] = int(weight)
+    return weights
+
+
+def test_folded_stacks_have_the_call_chain(modules_dir):
+    sb = LuaSandbox(modules_dir=modules_dir, profile=True, profile_interval=100)
+    sb.execute(NESTED)
+    stacks = folded(sb)
+    chain = 'main chunk (main.lua);outer (main.lua:3);inner (main.lua:2)'
+    assert chain in stacks
+    assert stacks[chain] == max(stacks.values())
+    assert all(stack.startswith('main chunk (main.lua)') for stack in stacks)
+    assert all(weight % 100 == 0 for weight in stacks.values())
+    assert sum(stacks.values()) == sb.metrics.instructions
+
+    profile = sb.last_profile()
+    assert profile.functions[0].site == 'inner (main.lua:2)'  # type: ignore
+    outer = next(f for f in profile.functions if f.site == 'outer (main.lua:3)')  # type: ignore
+    assert outer.total >= profile.functions[0].samples  # type: ignore
+    assert profile.lines[0].site == 'main.lua:2'  # type: ignore
+
+
+def test_each_run_starts_a_new_profile(modules_dir):
+    sb = LuaSandbox(modules_dir=modules_dir, profile=True, profile_interval=100)
+    sb.execute(NESTED)
+    first = sb.last_profile().samples  # type: ignore
+    sb.reset()
+    sb.execute('local x = 0 for i = 1, 1000 do x = x + i end')
+    assert 0 < sb.last_profile().samples < first  # type: ignore
+    assert not any('inner' in stack for stack in folded(sb))
+
+
+def test_no_profile_unless_asked(modules_dir):
+    sb = LuaSandbox(modules_dir=modules_dir)
+    sb.execute(NESTED)
+    assert sb.last_profile() is None
+
+
+def test_instruction_limit_still_trips(modules_dir):
+    sb = LuaSandbox(modules_dir=modules_dir, profile=True, profile_interval=100,
+                    max_instructions=5000)
+    with pytest.raises(ExecutionLimitError):
+        sb.execute('while true do end')
+    assert sb.metrics.instructions >= 5000
+    assert sb.last_profile().samples > 0  # type: ignore
+
+
+def test_timeout_still_trips(modules_dir):
+    sb = LuaSandbox(modules_dir=modules_dir, profile=True, profile_interval=100, timeout=0.2)
+    with pytest.raises(ExecutionLimitError):
+        sb.execute('local function spin() while true do end end spin()')
+    assert sb.metrics.wall_time < 5
+    assert any('spin' in stack for stack in folded(sb))
@@ -0,0 +1,128 @@
+import os
+import stat
+
+import httpx
+import pytest
+
+from rflow._cache import ResponseCache
+from rflow._client import RewriteFlow
+from stubserver import json_response
+
+
+@pytest.fixture(autouse=True)
+def no_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(RewriteFlow, 'conf_path', str(tmp_path / 'rfconf.toml'))
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / 'responses')
+
+
+def response(data: bytes = b'{"ok": true}', etag=None) -> httpx.Response:
+    headers = {'Content-Type': 'application/json', **({'ETag': etag} if etag else {})}
+    return httpx.Response(200, headers=headers, content=data)
+
+
+def test_entries_are_private(cache_dir):
+    cache = ResponseCache(cache_dir, ttls={'/': 60})
+    cache.put('/flows/list', 'token', response())
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+    for name in os.listdir(cache_dir):
+        assert stat.S_IMODE(os.stat(os.path.join(cache_dir, name)).st_mode) == 0o600
+
+
+def test_loose_directory_is_tightened(cache_dir):
+    os.makedirs(cache_dir, mode=0o755)
+    os.chmod(cache_dir, 0o755)
+    ResponseCache(cache_dir, ttls={'/': 60}).put('/flows/list', None, response())
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+
+
+def test_fresh_stale_and_credentials(cache_dir):
+    cache = ResponseCache(cache_dir, ttls={'/flows/list': 60})
+    cache.put('/flows/list', 'a', response(b'[1]'))
+
+    hit, _, headers = cache.before('get', '/flows/list', 'a')
+    assert hit is not None and hit.content == b'[1]' and headers == {}
+    assert cache.before('get', '/flows/list', 'b') == (None, None, {})
+    assert cache.before('post', '/flows/list', 'a') == (None, None, {})
+
+    cache.ttls = {}
+    cache.put('/flows/my/1', 'a', response(b'{}', etag='"v1"'))
+    hit, cached, headers = cache.before('get', '/flows/my/1', 'a')
+    assert hit is None and cached is not None
+    assert headers == {'If-None-Match': '"v1"'}
+
+
+def test_304_refreshes_the_entry(cache_dir):
+    cache = ResponseCache(cache_dir, ttls={})
+    cache.put('/flows/my/1', None, response(b'{"v": 1}', etag='"v1"'))
+    _, cached, _ = cache.before('get', '/flows/my/1', None)
+    served = cache.after('get', '/flows/my/1', None, None, httpx.Response(304), cached)
+    assert served.status_code == 200 and served.content == b'{"v": 1}'
+    assert cache.revalidated == 1
+    assert cache.get('/flows/my/1', None).meta['stored_at'] >= cached.meta['stored_at']  # type: ignore
+
+
+def test_processes_sharing_a_cache_keep_each_others_entries(cache_dir):
+    first = ResponseCache(cache_dir, ttls={'/': 60})
+    second = ResponseCache(cache_dir, ttls={'/': 60})
+    first.put('/flows/my/1', None, response(b'1'))
+    second.put('/flows/my/2', None, response(b'2'))
+    first.put('/flows/my/3', None, response(b'3'))
+
+    for url, body in [('/flows/my/1', b'1'), ('/flows/my/2', b'2'), ('/flows/my/3', b'3')]:
+        assert second.get(url, None).body == body  # type: ignore
+        assert first.get(url, None).body == body  # type: ignore
+
+
+def test_invalidation(cache_dir):
+    cache = ResponseCache(cache_dir, ttls={'/': 60})
+    for url in ['/flows/list', '/flows/list?offset=5', '/flows/my/1', '/flows/my/2']:
+        cache.put(url, 'a', response())
+    cache.put('/flows/list', 'b', response())
+
+    cache.after('patch', '/flows/update_info/1', {}, 'a', httpx.Response(200), None)
+    assert cache.get('/flows/list', 'a') is None
+    assert cache.get('/flows/list?offset=5', 'a') is None
+    assert cache.get('/flows/my/1', 'a') is None
+    assert cache.get('/flows/my/2', 'a') is not None
+    assert cache.get('/flows/list', 'b') is not None
+
+    cache.clear()
+    assert cache.get('/flows/list', 'b') is None
+
+
+def test_least_recently_used_are_evicted(cache_dir):
+    cache = ResponseCache(cache_dir, ttls={'/': 60}, max_entries=2)
+    cache.put('/a', None, response())
+    cache.put('/b', None, response())
+    os.utime(cache._entry_path(cache.key('/a', None)), (1, 1))
+    os.utime(cache._entry_path(cache.key('/b', None)), (2, 2))
+    cache.get('/a', None)
+    cache.put('/c', None, response())
+    assert cache.get('/b', None) is None
+    assert cache.get('/a', None) is not None and cache.get('/c', None) is not None
+
+
+def test_client_revalidates_with_etag(stub, cache_dir):
+    version = {'etag': '"v1"', 'conditional': 0}
+
+    def lua_config(request):
+        if request.headers.get('If-None-Match') == version['etag']:
+            version['conditional'] += 1
+            return 304, {'ETag': version['etag']}, b''
+        return json_response({'etag': version['etag']}, headers={'ETag': version['etag']})
+
+    stub.route('GET', '/misc/lua_config', lua_config)
+    client = RewriteFlow(stub.url, cache=ResponseCache(cache_dir, ttls={}))
+    assert client.get_lua_config() == {'etag': '"v1"'}
+    assert client.get_lua_config() == {'etag': '"v1"'}
+    assert version['conditional'] == 1
+    assert client.cache.revalidated == 1  # type: ignore
+
+    version['etag'] = '"v2"'
+    assert client.get_lua_config() == {'etag': '"v2"'}
+    assert client.get_lua_config() == {'etag': '"v2"'}
+    assert version['conditional'] == 2
@@ -0,0 +1,207 @@
+import time
+import asyncio
+
+import httpx
+import pytest
+
+from rflow._async import AsyncRewriteFlow
+from rflow._client import RewriteFlow
+from rflow._exceptions import CircuitOpenError
+from rflow._retry import CircuitBreaker, RetryPolicy
+
+
+@pytest.fixture(autouse=True)
+def no_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(RewriteFlow, 'conf_path', str(tmp_path / 'rfconf.toml'))
+
+
+def client(stub, **options) -> RewriteFlow:
+    options.setdefault('backoff', 0.01)
+    return RewriteFlow(stub.url, policy=RetryPolicy(**options))
+
+
+def test_get_retried_through_503s(stub, api):
+    rf = client(stub)
+    stub.inject('GET', r'/flows/my/.*', status=503, times=2)
+    assert rf.get_my_flow('00000000').id == '00000000'
+    assert rf.policy.stats.retries == 2
+    assert rf.policy.stats.attempts == 3
+
+
+def test_retries_honour_retry_after(stub, api):
+    rf = client(stub)
+    stub.inject('GET', r'/auth/me', status=429, retry_after=0.2, times=1)
+    start = time.perf_counter()
+    rf.me()
+    assert time.perf_counter() - start >= 0.2
+
+
+def test_gives_up_after_attempts(stub, api):
+    rf = client(stub, attempts=3)
+    stub.inject('GET', r'/auth/me', status=502)
+    with pytest.raises(httpx.HTTPStatusError):
+        rf.me()
+    assert rf.policy.stats.attempts == 3
+
+
+def test_idempotent_patch_retried_after_dropped_connection(stub, api):
+    rf = client(stub)
+    stub.inject('PATCH', r'/flows/update_info/.*', drop=True, times=1)
+    rf.update_flow_info('00000000', 'renamed', {})
+    assert api.flows['00000000']['name'] == 'renamed'
+    assert rf.policy.stats.retries == 1
+
+
+def test_create_not_retried_when_it_may_have_reached_the_server(stub, api):
+    rf = client(stub)
+    before = len(api.flows)
+    stub.inject('POST', r'/flows/new', status=500, times=1)
+    with pytest.raises(httpx.HTTPStatusError):
+        rf.create_flow('new', {}, 'x = 1')
+    stub.inject('POST', r'/flows/new', drop=True, times=1)
+    with pytest.raises(httpx.HTTPError):
+        rf.create_flow('new', {}, 'x = 1')
+    assert rf.policy.stats.retries == 0
+    assert len(api.flows) == before
+
+
+def test_create_retried_when_rejected(stub, api):
+    rf = client(stub)
+    stub.inject('POST', r'/flows/new', status=429, times=1)
+    rf.create_flow('new', {}, 'x = 1')
+    assert rf.policy.stats.retries == 1
+    assert [f['name'] for f in api.flows.values()].count('new') == 1
+
+
+def test_per_endpoint_timeout(stub, api):
+    rf = client(stub, attempts=2, timeouts={'/flows/my/': 0.2})
+    stub.inject('GET', r'/flows/my/.*', delay=0.5)
+    with pytest.raises(httpx.TimeoutException):
+        rf.get_my_flow('00000000')
+    assert rf.policy.stats.timeouts == 2
+    rf.me()  # other endpoints keep the default
+
+
+def test_hedge_answers_slow_get(stub, api):
+    rf = client(stub, hedge_after=0.05)
+    stub.inject('GET', r'/flows/my/.*', delay=1.0, times=1)
+    start = time.perf_counter()
+    assert rf.get_my_flow('00000000').id == '00000000'
+    assert time.perf_counter() - start < 0.8
+    assert rf.policy.stats.hedges == 1
+    assert rf.policy.stats.hedge_wins == 1
+
+
+def test_no_hedge_for_fast_get_or_patch(stub, api):
+    rf = client(stub, hedge_after=0.05)
+    rf.get_my_flow('00000000')
+    stub.inject('PATCH', r'/flows/update_info/.*', delay=0.2, times=1)
+    rf.update_flow_info('00000000', 'slow', {})
+    assert rf.policy.stats.hedges == 0
+
+
+def test_breaker_opens_and_recovers(stub, api):
+    breaker = CircuitBreaker(threshold=3, reset_after=0.3)
+    rf = client(stub, attempts=2, breaker=breaker)
+    stub.inject('*', r'.*', status=502)
+    with pytest.raises(httpx.HTTPStatusError):
+        rf.me()
+    with pytest.raises(CircuitOpenError):
+        rf.me()  # the third failure opens it mid-retry
+    requests = stub.requests
+    with pytest.raises(CircuitOpenError):
+        rf.me()
+    assert stub.requests == requests
+    assert breaker.state == 'open'
+    assert rf.policy.stats.breaker_trips == 1
+
+    stub.clear_faults()
+    time.sleep(0.35)
+    assert breaker.state == 'half-open'
+    assert rf.me().username == 'stub'
+    assert breaker.state == 'closed'
+
+
+def test_breaker_reopens_when_probe_fails(stub, api):
+    breaker = CircuitBreaker(threshold=1, reset_after=0.1)
+    rf = client(stub, attempts=1, breaker=breaker)
+    stub.inject('GET', r'/auth/me', status=503)
+    with pytest.raises(httpx.HTTPStatusError):
+        rf.me()
+    time.sleep(0.15)
+    with pytest.raises(httpx.HTTPStatusError):
+        rf.me()  # the probe
+    assert breaker.state == 'open'
+    assert rf.policy.stats.breaker_trips == 2
+
+
+def test_async_retries_and_hedges(stub, api):
+    async def main():
+        async with AsyncRewriteFlow(stub.url, policy=RetryPolicy(backoff=0.01, hedge_after=0.3)) as arf:
+            stub.inject('GET', r'/flows/my/[^/]+', status=503, times=3)
+            flows = await arf.map(lambda i: arf.get_my_flow(f'{i:08x}'), range(3))
+            stub.inject('GET', r'/flows/my/.*/code', delay=2.0, times=1)
+            start = time.perf_counter()
+            await arf.get_my_code('00000001')
+            return flows, time.perf_counter() - start, arf.policy.stats
+
+    flows, elapsed, stats = asyncio.run(main())
+    assert [f.id for f in flows] == ['00000000', '00000001', '00000002']
+    assert stats.retries == 3
+    assert stats.hedges == 1 and stats.hedge_wins == 1
+    assert elapsed < 1.5
+
+
+def test_hedge_catches_future_timeout(monkeypatch):
+    # Before 3.11 the futures timeout isn't the builtin TimeoutError.
+    import concurrent.futures
+    from rflow import _retry
+
+    class LegacyTimeout(Exception):
+        pass
+
+    monkeypatch.setattr(_retry, 'FutureTimeoutError', LegacyTimeout)
+    monkeypatch.setattr(concurrent.futures.Future, 'result', _legacy_result(LegacyTimeout))
+    policy = RetryPolicy(hedge_after=0.01)
+    calls = []
+
+    def send():
+        calls.append(1)
+        time.sleep(0.2 if len(calls) == 1 else 0)
+        return httpx.Response(200)
+
+    assert _retry.hedged(policy, send, 0.01).status_code == 200
+    assert policy.stats.hedges == 1
+
+
+def _legacy_result(error):
+    original = __import__('concurrent.futures').futures.Future.result
+
+    def result(self, timeout=None):
+        try:
+            return original(self, timeout)
+        except TimeoutError:
+            raise error()
+    return result
+
+
+def test_losing_hedge_does_not_delay_exit():
+    import os
+    import subprocess
+    import sys
+
+    script = '''
+import time, httpx
+from rflow import _retry
+calls = []
+def send():
+    calls.append(1)
+    time.sleep(30 if len(calls) == 1 else 0)
+    return httpx.Response(200)
+assert _retry.hedged(_retry.RetryPolicy(), send, 0.05).status_code == 200
+'''
+    src = os.path.join(os.path.dirname(__file__), '..', 'src')
+    start = time.monotonic()
+    subprocess.run([sys.executable, '-c', script], check=True, timeout=20,
+                   env={**os.environ, 'PYTHONPATH': src})
+    assert time.monotonic() - start < 10
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+import luasb
+import runner
+from runner import PayloadCase, diff_results, load_cases, run_batch
+
+ECHO = '''
+if body.fail then error('asked to fail') end
+Result = { doubled = (body.n or 0) * 2, name = params.name }
+'''
+
+
+def test_load_toml_json_and_jsonl(tmp_path):
+    (tmp_path / 'a.toml').write_text('[body]\nn = 1\n[expected]\ndoubled = 2\n')
+    (tmp_path / 'b.json').write_text(json.dumps({'body': {'n': 2}, 'params': {'name': 'x'}}))
+    (tmp_path / 'c.jsonl').write_text('{"body": {"n": 3}}\n\n{"headers": {"h": "v"}}\n')
+    (tmp_path / 'notes.txt').write_text('ignored')
+
+    cases = load_cases(str(tmp_path))
+    assert [case.name for case in cases] == ['a.toml', 'b.json', 'c.jsonl:1', 'c.jsonl:3']
+    assert cases[0] == PayloadCase('a.toml', {'n': 1}, {}, {}, {'doubled': 2})
+    assert cases[1].params == {'name': 'x'} and cases[1].expected is None
+    assert cases[3].body == {} and cases[3].headers == {'h': 'v'}
+
+    assert load_cases(str(tmp_path / 'b.json')) == [cases[1]]
+
+
+def test_diff_results():
+    assert diff_results({'a': 1, 'b': [1, 2]}, {'a': 1, 'b': [1, 2]}) == []
+    assert diff_results({'a': 1, 'b': {'c': 2}, 'gone': True}, {'a': 2, 'b': {'c': 2}, 'new': 'x'}) == [
+        '~ a: 1 -> 2',
+        '- gone: true',
+        '+ new: "x"',
+    ]
+    assert diff_results({'l': [1, {'x': 1}]}, {'l': [1, {'x': 2}]}) == ['~ l[2].x: 1 -> 2']
+    assert diff_results([1, 2], [1]) == ['~ Result: [1, 2] -> [1]']
+
+
+def test_run_batch_checks_expected_and_reports_errors(modules_dir):
+    cases = [
+        PayloadCase('pass', body={'n': 2}, expected={'doubled': 4}),
+        PayloadCase('differs', body={'n': 2}, params={'name': 'x'}, expected={'doubled': 5}),
+        PayloadCase('no-expected', body={'n': 1}),
+        PayloadCase('fails', body={'fail': True}),
+    ]
+    results, elapsed = run_batch(cases, ECHO, {}, modules_dir, workers=1)
+    assert elapsed > 0
+    by_name = {result.name: result for result in results}
+    assert [result.name for result in results] == [case.name for case in cases]
+
+    assert by_name['pass'].ok and by_name['pass'].result == {'doubled': 4}
+    assert not by_name['differs'].ok
+    assert by_name['differs'].diff == ['~ doubled: 5 -> 4', '+ name: "x"']
+    assert by_name['no-expected'].ok and by_name['no-expected'].diff == []
+    assert not by_name['fails'].ok
+    assert 'asked to fail' in by_name['fails'].error
+
+
+@pytest.fixture
+def worker(modules_dir, monkeypatch):
+    monkeypatch.setattr(luasb.modules, 'modules_dir', luasb.modules.modules_dir)
+    monkeypatch.setattr(runner, '_pool', None)
+    runner._init_worker(modules_dir, ECHO, {}, None, {})
+
+
+def test_unexpected_errors_become_case_errors(worker, monkeypatch):
+    build_payload = runner.build_payload
+
+    def broken_payload(*_):
+        raise TypeError('cannot marshal')
+
+    monkeypatch.setattr(runner, 'build_payload', broken_payload)
+    result = runner._run_case(PayloadCase('bad'))
+    assert not result.ok
+    assert result.error == 'Error running case: cannot marshal'
+
+    monkeypatch.setattr(runner, 'build_payload', build_payload)
+    assert runner._run_case(PayloadCase('good', body={'n': 1})).result == {'doubled': 2}
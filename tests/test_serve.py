@@ -0,0 +1,131 @@
+import io
+import json
+import asyncio
+from concurrent.futures import Executor, Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import serve
+from serve import FlowServer, LocalFlow
+
+
+def make_flow(tmp_path, flow_id, code, modules=None) -> LocalFlow:
+    path = tmp_path / flow_id
+    (path / 'lua_modules').mkdir(parents=True)
+    for name, source in (modules or {}).items():
+        (path / 'lua_modules' / f'{name}.lua').write_text(source)
+    return LocalFlow(flow_id, flow_id, str(path), code, {})
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    monkeypatch.setattr(serve, '_flows', {})
+    monkeypatch.setattr(serve, '_broken', {})
+
+
+def test_broken_module_only_fails_its_flow(tmp_path, worker):
+    good = make_flow(tmp_path, 'good', 'Result = {ok = true}')
+    bad = make_flow(tmp_path, 'bad', 'Result = {}', {'broken': 'return {'})
+    serve._init_worker({'good': good, 'bad': bad}, {})
+
+    ok, error, metrics = serve._call_flow('bad', {'body': {}, 'headers': {}, 'params': {}})
+    assert not ok
+    assert 'broken' in error
+    assert metrics['instructions'] == 0
+    assert serve._call_flow('good', {'body': {}, 'headers': {}, 'params': {}})[:2] == (True, {'ok': True})
+
+
+async def exchange(server: FlowServer, raw: bytes) -> tuple[int, dict]:
+    reader = asyncio.StreamReader()
+    reader.feed_data(raw)
+    reader.feed_eof()
+    writer = FakeWriter()
+    await server._handle_one(reader, writer)  # type: ignore
+    head, body = writer.data.split(b'\r\n\r\n', 1)
+    return int(head.split(b' ')[1]), json.loads(body)
+
+
+class FakeWriter:
+    def __init__(self) -> None:
+        self.data = b''
+
+    def write(self, data: bytes):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+
+@pytest.mark.parametrize('length', ['abc', '-5', '1.5'])
+def test_bad_content_length_is_400(length):
+    server = FlowServer({}, 1, log=False)
+    raw = f'POST /flows/call/x HTTP/1.1\r\nContent-Length: {length}\r\n\r\n'.encode()
+    status, data = asyncio.run(exchange(server, raw))
+    assert status == 400
+    assert data == {'detail': 'Invalid Content-Length'}
+
+
+def test_log_line_escapes_target():
+    from rich.console import Console
+
+    server = FlowServer({}, 1)
+    server.console = Console(file=io.StringIO(), width=200)
+    raw = b'GET /flows/call/[/]x[bold] HTTP/1.1\r\nConnection: close\r\n\r\n'
+    status, _ = asyncio.run(exchange(server, raw))
+    assert status == 404
+    assert '/flows/call/[/]x[bold]' in server.console.file.getvalue()  # type: ignore
+
+
+def test_payload_errors_are_the_requests_error(tmp_path, worker, monkeypatch):
+    flow = make_flow(tmp_path, 'good', 'Result = {ok = true}')
+    serve._init_worker({'good': flow}, {})
+
+    def broken_payload(*_):
+        raise TypeError('cannot marshal')
+
+    monkeypatch.setattr(serve, 'build_payload', broken_payload)
+    ok, error, metrics = serve._call_flow('good', {'body': {}, 'headers': {}, 'params': {}})
+    assert not ok
+    assert error == 'Error running flow: cannot marshal'
+    assert metrics['instructions'] == 0
+
+
+class FailingExecutor(Executor):
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+        self.shut_down = False
+
+    def submit(self, *_, **__):  # type: ignore
+        future: Future = Future()
+        future.set_exception(self.error)
+        return future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self.shut_down = True
+
+
+def test_executor_errors_are_500(tmp_path):
+    flow = make_flow(tmp_path, 'good', 'Result = {ok = true}')
+    server = FlowServer({'good': flow}, 1, log=False)
+    server.executor = FailingExecutor(RuntimeError('boom'))  # type: ignore
+    raw = b'POST /flows/call/good HTTP/1.1\r\nConnection: close\r\n\r\n'
+    assert asyncio.run(exchange(server, raw)) == (500, {'detail': 'Error running flow: boom'})
+
+
+def test_broken_pool_is_rebuilt(tmp_path):
+    flow = make_flow(tmp_path, 'good', 'Result = {ok = true}')
+    server = FlowServer({'good': flow}, 1, log=False)
+    broken = FailingExecutor(BrokenProcessPool('worker died'))
+    server.executor = broken  # type: ignore
+    raw = b'POST /flows/call/good HTTP/1.1\r\nConnection: close\r\n\r\n'
+    try:
+        status, data = asyncio.run(exchange(server, raw))
+        assert status == 500
+        assert 'Worker process died' in data['detail']
+        assert broken.shut_down
+        assert server.executor is not broken
+
+        assert asyncio.run(exchange(server, raw)) == (200, {'ok': True})
+    finally:
+        server.close()
@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from bench import _startup_probe, heavy_modules, startup_commands
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+
+@pytest.mark.parametrize('args', startup_commands, ids=' '.join)
+def test_short_commands_import_nothing_heavy(args, tmp_path):
+    probe = _startup_probe.format(heavy=heavy_modules)
+    env = {**os.environ, 'PYTHONPATH': SRC, 'HOME': str(tmp_path)}
+    proc = subprocess.run([sys.executable, '-c', probe, *args], env=env,
+                          capture_output=True, text=True, timeout=60)
+    assert 'RFLOW_HEAVY=' in proc.stderr, proc.stderr
+    heavy = proc.stderr.rsplit('RFLOW_HEAVY=', 1)[-1].strip()
+    assert heavy == '', f"'rflow {' '.join(args)}' imported {heavy}"
@@ -0,0 +1,90 @@
+import io
+import csv
+import json
+import os
+
+import stats
+from rflow._models import Flow
+from stats import SnapshotStore, collect, percent, rank, write_csv, write_json
+
+
+def flow(flow_id: str, calls: int, success: int, failure: int) -> Flow:
+    return Flow.model_validate({
+        'id': flow_id, 'name': f'flow {flow_id}', 'author': 'user', 'created_at': 0,
+        'last_modified': 0, 'env': {},
+        'analytics': {'calls': calls, 'success': success, 'failure': failure},
+    })
+
+
+FLOWS = [flow('a', 100, 90, 10), flow('b', 10, 2, 8), flow('c', 0, 0, 0)]
+
+
+def test_collect_without_a_snapshot():
+    flow_stats, totals = collect(FLOWS, None, 1000.0)
+    assert [s.id for s in flow_stats] == ['a', 'b', 'c']
+    assert flow_stats[0].success_rate == 0.9 and flow_stats[0].failure_rate == 0.1
+    assert flow_stats[2].success_rate is None
+    assert all(s.new_calls is None and s.calls_per_minute is None for s in flow_stats)
+    assert (totals.flows, totals.calls, totals.success, totals.failure) == (3, 110, 92, 18)
+    assert totals.new_calls is None and totals.since is None
+
+
+def test_collect_against_a_snapshot():
+    previous = {'taken_at': 880.0, 'flows': {'a': [40, 36, 4], 'b': [20, 10, 10]}}
+    flow_stats, totals = collect(FLOWS, previous, 1000.0)
+    a, b, c = flow_stats
+    assert (a.new_calls, a.new_failures) == (60, 6)
+    assert a.calls_per_minute == 30.0
+    # Counters that went backwards (a reset flow) don't go negative.
+    assert (b.new_calls, b.new_failures) == (0, 0)
+    # A flow missing from the snapshot counts from zero.
+    assert (c.new_calls, c.calls_per_minute) == (0, 0.0)
+    assert (totals.new_calls, totals.new_failures, totals.since) == (60, 6, 880.0)
+
+
+def test_rank():
+    flow_stats, _ = collect(FLOWS, None, 0)
+    assert [s.id for s in rank(flow_stats, 'calls', None)] == ['a', 'b', 'c']
+    assert [s.id for s in rank(flow_stats, 'failures', 1)] == ['a']
+    assert [s.id for s in rank(flow_stats, 'failure-rate', None)] == ['b', 'a', 'c']
+    assert [s.id for s in rank(flow_stats, 'failure-rate', None, min_calls=50)] == ['a']
+
+
+def test_snapshots_are_per_api_and_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(stats, 'max_snapshots', 3)
+    store = SnapshotStore('https://api.example', str(tmp_path))
+    other = SnapshotStore('https://other.example', str(tmp_path))
+    assert store.latest() is None
+
+    flow_stats, _ = collect(FLOWS, None, 0)
+    for taken_at in range(5):
+        store.save(flow_stats, float(taken_at))
+    assert len(os.listdir(store.path)) == 3
+    assert store.latest() == {'taken_at': 4.0, 'flows': {'a': [100, 90, 10], 'b': [10, 2, 8], 'c': [0, 0, 0]}}
+    assert other.latest() is None
+
+    # A damaged newest snapshot falls back to the one before it.
+    with open(os.path.join(store.path, f'{5000:015d}.json'), 'w') as f:
+        f.write('{')
+    assert store.latest()['taken_at'] == 4.0  # type: ignore
+
+
+def test_exports():
+    flow_stats, totals = collect(FLOWS, None, 0)
+    fp = io.StringIO()
+    write_json(flow_stats, totals, fp)
+    report = json.loads(fp.getvalue())
+    assert report['totals']['calls'] == 110
+    assert report['flows'][1] == {
+        'id': 'b', 'name': 'flow b', 'calls': 10, 'success': 2, 'failure': 8,
+        'new_calls': None, 'new_failures': None, 'calls_per_minute': None,
+        'success_rate': 0.2, 'failure_rate': 0.8,
+    }
+
+    fp = io.StringIO()
+    write_csv(flow_stats, fp)
+    rows = list(csv.DictReader(io.StringIO(fp.getvalue())))
+    assert [row['id'] for row in rows] == ['a', 'b', 'c']
+    assert rows[0]['failure_rate'] == '0.1' and rows[2]['failure_rate'] == ''
+
+    assert percent(None) == '-' and percent(0.1234) == '12.3%'
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from rflow._stream import iter_json_array
+
+document = b'[-0.5e10, {"a": "x,]", "b": [1, 2]} ,1E+2,\n true, null, "\\u00e9\xc3\xa9", -12 ]'
+expected = json.loads(document)
+
+
+@pytest.mark.parametrize('split', range(1, len(document)))
+def test_split_at_every_offset(split):
+    assert list(iter_json_array([document[:split], document[split:]])) == expected
+
+
+def test_one_byte_at_a_time():
+    chunks = [document[i:i + 1] for i in range(len(document))]
+    assert list(iter_json_array(chunks)) == expected
+
+
+def test_empty_array():
+    assert list(iter_json_array([b' [', b' ]'])) == []
+
+
+@pytest.mark.parametrize('data', [b'[1, 2', b'[-0.', b''])
+def test_truncated_array(data):
+    with pytest.raises(ValueError, match='ended early'):
+        list(iter_json_array([data]))
+
+
+def test_not_an_array():
+    with pytest.raises(ValueError, match='Expected a JSON array'):
+        list(iter_json_array([b'{"a": 1}']))
@@ -0,0 +1,119 @@
+import json
+import time
+import asyncio
+
+import pytest
+
+import tracing
+from tracing import Tracer, instrument, span
+
+
+@pytest.fixture
+def tracer(monkeypatch):
+    tracer = Tracer()
+    monkeypatch.setattr(tracing, '_tracer', tracer)
+    return tracer
+
+
+def by_name(tracer: Tracer) -> dict[str, dict]:
+    return {event['name']: event for event in tracer.events}
+
+
+def test_span_is_a_shared_no_op_while_off(monkeypatch):
+    monkeypatch.setattr(tracing, '_tracer', None)
+    assert span('x') is span('y') is tracing._null
+    with span('x') as traced:
+        traced.set(status=200)
+    assert not tracing.enabled()
+
+
+def test_spans_nest_by_context(tracer):
+    with span('outer', 'api', url='/x'):
+        time.sleep(0.01)
+        with span('inner') as inner:
+            time.sleep(0.02)
+            inner.set(status=200)
+
+    events = by_name(tracer)
+    outer, inner = events['outer'], events['inner']
+    assert [e['name'] for e in tracer.events] == ['inner', 'outer']
+    assert outer['ts'] <= inner['ts']
+    assert inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
+    assert outer['cat'] == 'api' and outer['args'] == {'url': '/x'}
+    assert inner['args'] == {'status': 200}
+
+    stats = tracer.stats['outer']
+    assert stats.count == 1
+    assert stats.own < stats.total
+    assert stats.total - stats.own >= tracer.stats['inner'].total
+    assert tracing._parent.get() is None
+
+
+def test_errors_are_recorded(tracer):
+    with pytest.raises(ValueError):
+        with span('failing'):
+            raise ValueError('x')
+    assert by_name(tracer)['failing']['args'] == {'error': 'ValueError'}
+
+
+def test_concurrent_tasks_get_their_own_tracks(tracer):
+    async def request(name: str):
+        with span(name):
+            await asyncio.sleep(0.02)
+            with span(f'{name}.child'):
+                await asyncio.sleep(0)
+
+    async def main():
+        with span('main'):
+            await asyncio.gather(request('a'), request('b'))
+
+    asyncio.run(main())
+    events = by_name(tracer)
+    assert events['a']['tid'] != events['b']['tid']
+    assert events['a']['tid'] == events['a.child']['tid']
+    assert events['b']['tid'] == events['b.child']['tid']
+    assert events['main']['tid'] not in (events['a']['tid'], events['b']['tid'])
+    # Children were charged to their own task's span, not to a sibling's.
+    assert tracer.stats['a'].own < tracer.stats['a'].total
+    assert tracer.stats['main'].own < tracer.stats['main'].total
+
+
+def test_writes_chrome_trace_json(tracer, tmp_path):
+    with span('outer', url=object()):
+        with span('inner'):
+            pass
+    path = tmp_path / 'nested' / 'trace.json'
+    tracer.write(str(path))
+
+    trace = json.loads(path.read_text())
+    assert trace['displayTimeUnit'] == 'ms'
+    assert len(trace['traceEvents']) == 2
+    for event in trace['traceEvents']:
+        assert event['ph'] == 'X'
+        assert set(event) == {'name', 'cat', 'ph', 'ts', 'dur', 'pid', 'tid', 'args'}
+        assert isinstance(event['ts'], (int, float)) and event['dur'] >= 0
+    assert isinstance(trace['traceEvents'][1]['args']['url'], str)
+
+
+class Service:
+    def work(self, n: int) -> int:
+        return n * 2
+
+
+def test_instrument_only_wraps_once_tracing_is_on(monkeypatch, tmp_path):
+    original = Service.work
+    monkeypatch.setattr(tracing, '_tracer', None)
+    monkeypatch.setattr(tracing, '_instrumented', [])
+    monkeypatch.setattr(Service, 'work', original)
+    registered = []
+    monkeypatch.setattr(tracing.atexit, 'register', lambda *args: registered.append(args))
+
+    instrument(Service, {'work': 'service.work'}, 'test')
+    assert Service.work is original
+    assert Service().work(2) == 4
+
+    tracer = tracing.enable(str(tmp_path / 'trace.json'))
+    assert Service.work is not original
+    assert Service().work(3) == 6
+    assert [(e['name'], e['cat']) for e in tracer.events] == [('service.work', 'test')]
+    assert registered and registered[0][0] is tracing._finish
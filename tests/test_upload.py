@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from stubserver import FakeAPI
+from rflow._async import AsyncRewriteFlow
+from rflow._client import RewriteFlow
+from rflow._upload import CodeStore, apply_delta, make_delta
+
+big = ''.join(f'local x{i} = {i} -- a line of a bundled flow\n' for i in range(2000))
+
+
+@pytest.fixture(autouse=True)
+def no_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(RewriteFlow, 'conf_path', str(tmp_path / 'rfconf.toml'))
+
+
+def client(stub, tmp_path) -> RewriteFlow:
+    return RewriteFlow(stub.url, code_store=CodeStore(str(tmp_path / 'code')))
+
+
+@pytest.mark.parametrize('old,new', [
+    ('a\nb\nc\n', 'a\nB\nc\nd'),
+    ('', 'x\n'),
+    ('x\ny\n', ''),
+    (big, big.replace('x100 ', 'y100 ') + 'print(1)\n'),
+])
+def test_delta_round_trip(old, new):
+    assert apply_delta(old, make_delta(old, new)) == new
+
+
+def test_uploads_send_hashes_and_deltas(stub, tmp_path):
+    api = FakeAPI(stub, 0)
+    rf = client(stub, tmp_path)
+    flow = rf.create_flow('big', {}, big)
+    assert stub.bytes_received < len(big)  # compressed
+
+    assert rf.set_my_code(flow.id, big) == 'unchanged'
+    edited = big.replace('x100 ', 'y100 ')
+    stub.bytes_received = 0
+    assert rf.set_my_code(flow.id, edited) == 'delta'
+    assert api.code[flow.id] == edited
+    assert stub.bytes_received < 1024
+
+
+def test_stale_base_falls_back_to_full_upload(stub, tmp_path):
+    api = FakeAPI(stub, 0)
+    rf = client(stub, tmp_path)
+    flow = rf.create_flow('big', {}, big)
+    api.code[flow.id] = 'edited elsewhere\n'
+    assert rf.set_my_code(flow.id, big + '--\n') == 'full'
+    assert api.code[flow.id] == big + '--\n'
+
+
+@pytest.mark.parametrize('features', [('gzip',), ()])
+def test_servers_without_code_features_get_full_uploads(stub, tmp_path, features):
+    api = FakeAPI(stub, 0, features=features)
+    rf = client(stub, tmp_path)
+    flow = rf.create_flow('big', {}, big)
+    assert rf.set_my_code(flow.id, big) == 'full'
+    assert rf.set_my_code(flow.id, big + '--\n') == 'full'
+    assert api.code[flow.id] == big + '--\n'
+
+
+def test_pull_records_the_base(stub, tmp_path):
+    api = FakeAPI(stub, 1)
+    rf = client(stub, tmp_path)
+    code = rf.get_my_code('00000000')
+    assert rf.set_my_code('00000000', code) == 'unchanged'
+    assert api.code['00000000'] == code
+
+
+def test_async_upload(stub, tmp_path):
+    api = FakeAPI(stub, 0)
+    rf = client(stub, tmp_path)
+    flow = rf.create_flow('big', {}, big)
+
+    async def main():
+        async with AsyncRewriteFlow.from_client(rf) as arf:
+            return await arf.set_my_code(flow.id, big + '--\n')
+
+    assert asyncio.run(main()) == 'delta'
+    assert api.code[flow.id] == big + '--\n'
+
+
+def write_flow(root, name: str, code: str):
+    path = root / name
+    path.mkdir()
+    (path / 'rflow.config.toml').write_text(f'name = "{name}"\n[env]\nK = "v"\n')
+    (path / 'main.lua').write_text(code)
+    return path
+
+
+def test_workspace_publish_skips_unchanged_flows(stub, rflow_cli, tmp_path):
+    api = FakeAPI(stub, 0)
+    root = tmp_path / 'workspace'
+    root.mkdir()
+    for i in range(3):
+        write_flow(root, f'flow{i}', f'print({i})')
+
+    result = rflow_cli('flows', 'publish', '--workspace', str(root))
+    assert result.exit_code == 0, result.output
+    assert 'Found 3 flows, 3 to publish' in result.output
+    assert sorted(api.code.values()) == ['print(0)', 'print(1)', 'print(2)']
+    assert 'id = "' in (root / 'flow1' / 'rflow.config.toml').read_text()
+
+    before = stub.requests
+    result = rflow_cli('flows', 'publish', '--workspace', str(root))
+    assert 'Found 3 flows, 0 to publish' in result.output
+    assert stub.requests == before
+
+    (root / 'flow1' / 'main.lua').write_text('print("changed")')
+    result = rflow_cli('flows', 'publish', '--workspace', str(root))
+    assert result.exit_code == 0, result.output
+    assert 'Found 3 flows, 1 to publish' in result.output
+    assert sorted(api.code.values()) == ['print("changed")', 'print(0)', 'print(2)']
+    assert len(api.flows) == 3
@@ -0,0 +1,54 @@
+import pytest
+
+from watch import FlowWatcher, WatchSession
+
+
+@pytest.fixture
+def flow(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'lua_modules').mkdir()
+    (tmp_path / 'rflow.config.toml').write_text('name = "watched"\n[env]\nKEY = "k"\n')
+    (tmp_path / 'payload.toml').write_text('[body]\nitems = [1, 2, 3]\n[headers]\nh = "x"\n')
+    (tmp_path / 'main.lua').write_text('table.insert(body.items, 4)\nResult = {n = #body.items, key = env.KEY}\n')
+    return tmp_path
+
+
+def test_payload_edit_converts_only_changed_values(flow):
+    session = WatchSession('.')
+    result, _, _, error = session.run(FlowWatcher('.').poll())
+    assert error is None
+    assert result == {'n': 4, 'key': 'k'}
+    assert sorted(session.converted) == ['body', 'env', 'headers', 'params']
+
+    (flow / 'payload.toml').write_text('[body]\nitems = [1]\n[headers]\nh = "x"\n')
+    result, diff, _, error = session.run({'payload'})
+    assert error is None
+    assert result == {'n': 2, 'key': 'k'}
+    assert diff == ['~ n: 4 -> 2']
+    assert session.converted == ['body']
+
+
+def test_runs_dont_see_each_others_changes_to_the_payload(flow):
+    session = WatchSession('.')
+    session.run(FlowWatcher('.').poll())
+    for _ in range(3):
+        result, _, _, error = session.run({'script'})
+        assert error is None
+        assert result['n'] == 4
+
+
+def test_broken_module_is_reported_and_watching_continues(flow):
+    session = WatchSession('.')
+    watcher = FlowWatcher('.')
+    session.run(watcher.poll())
+
+    (flow / 'lua_modules' / 'util.lua').write_text('return {')
+    (flow / 'main.lua').write_text('Result = {v = require("util").v}\n')
+    result, _, _, error = session.run(watcher.poll())
+    assert result is None
+    assert error.startswith('Error loading modules')
+
+    (flow / 'lua_modules' / 'util.lua').write_text('return {v = 7}')
+    result, _, _, error = session.run(watcher.poll())
+    assert error is None
+    assert result == {'v': 7}  # the script edit made while the module was broken still applies
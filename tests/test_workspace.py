@@ -0,0 +1,73 @@
+import json
+import asyncio
+
+import pytest
+
+from stubserver import FakeAPI
+from rflow import AsyncRewriteFlow
+from rflow._client import RewriteFlow
+from rflow._retry import RetryPolicy
+from workspace import load_state, plan_workspace, publish_workspace, state_file
+
+
+@pytest.fixture(autouse=True)
+def no_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(RewriteFlow, 'conf_path', str(tmp_path / 'rfconf.toml'))
+
+
+def make_workspace(root, api: FakeAPI):
+    for flow_id in api.flows:
+        path = root / f'flow-{flow_id}'
+        path.mkdir(parents=True)
+        (path / 'rflow.config.toml').write_text(f'name = "flow {flow_id}"\n\n[_rf]\nid = "{flow_id}"\n')
+        (path / 'main.lua').write_text(f'print("{flow_id}")')
+
+
+def publish(stub, root, timeout=None):
+    plans, state = plan_workspace(str(root))
+
+    async def main():
+        async with AsyncRewriteFlow(stub.url, policy=RetryPolicy(backoff=0.01)) as arf:
+            await asyncio.wait_for(publish_workspace(arf, str(root), plans, state), timeout)
+
+    asyncio.run(main())
+    return plans
+
+
+def test_publishes_then_skips_unchanged_flows(stub, tmp_path):
+    api = FakeAPI(stub, 3)
+    make_workspace(tmp_path, api)
+    plans = publish(stub, tmp_path)
+    assert all(plan.done and plan.actions == ['update info', 'update code'] for plan in plans)
+    assert api.code['00000001'] == 'print("00000001")'
+    assert len(load_state(str(tmp_path))) == 3
+
+    plans, _ = plan_workspace(str(tmp_path))
+    assert [plan.actions for plan in plans] == [[], [], []]
+
+
+def test_interrupted_publish_only_records_finished_flows(stub, tmp_path):
+    api = FakeAPI(stub, 3)
+    make_workspace(tmp_path, api)
+    stub.inject('PATCH', r'/flows/update_info/00000001', delay=1.0)
+
+    with pytest.raises(asyncio.TimeoutError):
+        publish(stub, tmp_path, timeout=0.5)
+
+    with open(tmp_path / state_file) as f:
+        state = json.load(f)
+    assert sorted(state) == ['flow-00000000', 'flow-00000002']
+
+    stub.clear_faults()
+    plans, _ = plan_workspace(str(tmp_path))
+    assert {plan.path: plan.actions for plan in plans if plan.actions} == {
+        'flow-00000001': ['update info', 'update code']}
+
+
+def test_failed_flow_is_published_again(stub, tmp_path):
+    api = FakeAPI(stub, 2)
+    make_workspace(tmp_path, api)
+    stub.inject('PATCH', r'/flows/update', status=400)
+    plans = publish(stub, tmp_path)
+    assert all(plan.error and not plan.done for plan in plans)
+    assert load_state(str(tmp_path)) == {}